@@ -1,8 +1,45 @@
-from .domains.registry.handlers.PythonHandler import primaryAdaptor as registry
-from .domains.space.handlers.PythonHandler import primaryAdaptor as space
-from .domains.secret.handlers.PythonHandler import primaryAdaptor as secret
-from .domains.asset.handlers.PythonHandler import primaryAdaptor as asset
-from .domains.storage.handlers.PythonHandler import primaryAdaptor as storage
-from .utils.log import initialize_logging
-
-logger = initialize_logging()
+import importlib
+from typing import TYPE_CHECKING
+
+# SDK domains, by attribute: the Python handler building them. Handlers build their
+# adaptors and domain on import, so a domain is only imported on first access.
+_DOMAIN_HANDLERS = {
+    "registry": "naas_python.domains.registry.handlers.PythonHandler",
+    "space": "naas_python.domains.space.handlers.PythonHandler",
+    "secret": "naas_python.domains.secret.handlers.PythonHandler",
+    "asset": "naas_python.domains.asset.handlers.PythonHandler",
+    "storage": "naas_python.domains.storage.handlers.PythonHandler",
+}
+
+__all__ = [*_DOMAIN_HANDLERS, "logger"]
+
+if TYPE_CHECKING:
+    from .domains.registry.handlers.PythonHandler import primaryAdaptor as registry
+    from .domains.space.handlers.PythonHandler import primaryAdaptor as space
+    from .domains.secret.handlers.PythonHandler import primaryAdaptor as secret
+    from .domains.asset.handlers.PythonHandler import primaryAdaptor as asset
+    from .domains.storage.handlers.PythonHandler import primaryAdaptor as storage
+    from logging import Logger
+
+    logger: Logger
+
+
+def __getattr__(name: str):
+    if name == "logger":
+        from .utils.log import initialize_logging
+
+        value = initialize_logging()
+    elif name in _DOMAIN_HANDLERS:
+        # The first domain used sets up the SDK logging, as importing the package used to
+        __getattr__("logger")
+        value = importlib.import_module(_DOMAIN_HANDLERS[name]).primaryAdaptor
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # Later lookups find the attribute without going through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
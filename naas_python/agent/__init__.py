@@ -0,0 +1,90 @@
+"""
+Client of the naas-python background agent.
+
+The agent is a long-lived process, started with `naas-python agent start`, that
+keeps the CLI imports, adaptors, credentials and caches warm. CLI commands are
+forwarded to it over a Unix socket and run in-process when it is not running.
+This module only depends on the standard library, so that forwarding a command
+costs no more than connecting to the socket.
+"""
+import json
+import os
+import socket
+import sys
+from typing import Iterator, List, Optional, TextIO
+
+# Environment variables the commands depend on, the agent only runs commands sharing its values
+AGENT_ENVIRONMENT_PREFIXES = ("NAAS_", "AWS_", "JUPYTERHUB_")
+
+
+def socket_path() -> str:
+    return os.path.expanduser(os.environ.get("NAAS_AGENT_SOCKET") or "~/.naas/agent.sock")
+
+
+def agent_environment(environ=None) -> dict:
+    environ = os.environ if environ is None else environ
+    return {
+        key: value
+        for key, value in environ.items()
+        if key.startswith(AGENT_ENVIRONMENT_PREFIXES) and not key.startswith("NAAS_AGENT")
+    }
+
+
+def request(message: dict, timeout: Optional[float] = None) -> Iterator[dict]:
+    """Sends `message` to the agent and yields the frames of its reply, raises OSError when it is not running"""
+    if not hasattr(socket, "AF_UNIX"):
+        raise OSError("Unix sockets are not available on this platform.")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path())
+        client.sendall(json.dumps(message).encode() + b"\n")
+        with client.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                yield json.loads(line)
+
+
+def ping(timeout: float = 2) -> Optional[dict]:
+    """Returns the status of the agent, None when it is not running"""
+    try:
+        return next(request({"type": "ping"}, timeout=timeout), None)
+    except (OSError, ValueError):
+        return None
+
+
+def forward_command(argv: List[str], stdout: TextIO = None, stderr: TextIO = None) -> Optional[int]:
+    """
+    Runs a CLI command through the agent and returns its exit code.
+
+    Returns None, without running anything, when the command should run in-process:
+    the agent is not running, is disabled with NAAS_AGENT=0, or was started with
+    a different environment.
+    """
+    stdout, stderr = stdout or sys.stdout, stderr or sys.stderr
+    if os.environ.get("NAAS_AGENT") == "0" or not os.path.exists(socket_path()):
+        return None
+
+    message = {"type": "run", "argv": list(argv), "cwd": os.getcwd(), "env": agent_environment()}
+    replies = request(message)
+    try:
+        first_reply = next(replies)
+    except (OSError, ValueError, StopIteration):
+        # Stale socket of an agent that is gone
+        return None
+    if "started" not in first_reply:
+        return None
+
+    try:
+        for reply in replies:
+            if "stdout" in reply:
+                stdout.write(reply["stdout"])
+            elif "stderr" in reply:
+                stderr.write(reply["stderr"])
+            elif "exit" in reply:
+                stdout.flush()
+                return reply["exit"]
+    except (OSError, ValueError) as e:
+        stderr.write(f"Lost the connection to the naas-python agent: {e}\n")
+        return 1
+    # The command already started, so it is not run again in-process
+    stderr.write("The naas-python agent stopped before the command completed.\n")
+    return 1
@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import time
+
+import typer
+
+from naas_python.agent import ping, request, socket_path
+from naas_python.agent.server import DEFAULT_IDLE_TIMEOUT
+
+app = typer.Typer(
+    help="Background agent keeping the CLI warm between commands",
+    add_completion=False,
+    no_args_is_help=True,
+    pretty_exceptions_enable=False,
+    context_settings={"help_option_names": ["-h", "--help"]},
+)
+
+
+@app.command("start")
+def start(
+    idle_timeout: int = typer.Option(DEFAULT_IDLE_TIMEOUT // 60, "--idle-timeout", help="Minutes without any command after which the agent exits"),
+    wait: float = typer.Option(30, "--wait", help="Seconds to wait for the agent to be ready"),
+):
+    """Start the agent, later commands are forwarded to it"""
+    status = ping()
+    if status is not None:
+        print(f"Agent already running (pid {status['pid']}), listening on {status['socket']}.")
+        return
+
+    log_path = os.path.join(os.path.dirname(socket_path()), "agent.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "ab") as log_file:
+        subprocess.Popen(
+            [sys.executable, "-m", "naas_python.agent.server", "--socket", socket_path(), "--idle-timeout", str(idle_timeout * 60)],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=log_file,
+            start_new_session=True,
+        )
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        status = ping(timeout=wait)
+        if status is not None:
+            print(f"Agent started (pid {status['pid']}), listening on {status['socket']}.")
+            return
+        time.sleep(0.1)
+    print(f"The agent did not start within {wait:g} seconds, see {log_path}.", file=sys.stderr)
+    raise typer.Exit(1)
+
+
+@app.command("stop")
+def stop():
+    """Stop the agent, commands run in-process again"""
+    try:
+        next(request({"type": "stop"}, timeout=5))
+        print("Agent stopped.")
+    except (OSError, StopIteration):
+        print("Agent not running.")
+
+
+@app.command("status")
+def status():
+    """Show whether the agent is running"""
+    status = ping()
+    if status is None:
+        print("Agent not running.")
+        raise typer.Exit(1)
+    print(f"Agent running (pid {status['pid']}) on {status['socket']}, up {status['uptime']:.0f}s, {status['commands']} command(s) served.")
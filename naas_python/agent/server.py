@@ -0,0 +1,158 @@
+import argparse
+import importlib
+import io
+import json
+import os
+import socketserver
+import threading
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Callable, List, Optional
+
+from naas_python.agent import agent_environment, socket_path
+
+# Seconds without any command after which the agent exits
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+
+
+class _FrameWriter(io.TextIOBase):
+    """Text stream sending what is written to the client, as {stream: text} frames"""
+
+    def __init__(self, connection, stream: str, lock: threading.Lock):
+        self._connection = connection
+        self._stream = stream
+        self._lock = lock
+
+    def write(self, text: str) -> int:
+        if text:
+            with self._lock:
+                self._connection.write(json.dumps({self._stream: text}).encode() + b"\n")
+                self._connection.flush()
+        return len(text)
+
+    def isatty(self) -> bool:
+        return False
+
+
+class _AgentRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            message = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        self.server.last_activity = time.monotonic()
+
+        if message.get("type") == "ping":
+            self.__send(self.server.status())
+        elif message.get("type") == "stop":
+            self.__send({"stopping": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif message.get("type") == "run":
+            self.__run(message)
+
+    def __run(self, message: dict):
+        # Commands read their configuration from the environment, the agent's must match the client's
+        if message.get("env") != self.server.environment:
+            self.__send({"fallback": "The agent was started with a different environment."})
+            return
+        if not os.path.isdir(message.get("cwd", "")):
+            self.__send({"fallback": "The working directory does not exist."})
+            return
+
+        # The working directory and standard streams are process wide, commands run one at a time
+        with self.server.run_lock:
+            self.__send({"started": True})
+            lock = threading.Lock()
+            stdout = _FrameWriter(self.wfile, "stdout", lock)
+            stderr = _FrameWriter(self.wfile, "stderr", lock)
+            os.chdir(message["cwd"])
+            # Prompts get an empty input, the agent has no terminal to read from. Commands reading
+            # piped input are not forwarded, see naas_python.main.reads_stdin
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                exit_code = self.server.runner(message["argv"], stdout=stdout, stderr=stderr, stdin=io.StringIO(""))
+            self.server.commands += 1
+            self.server.last_activity = time.monotonic()
+            self.__send({"exit": exit_code})
+
+    def __send(self, reply: dict):
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+        self.wfile.flush()
+
+
+class AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Long-lived process running CLI commands sent over a Unix socket.
+
+    The CLI groups are imported once, so adaptors, credentials, API sessions and
+    caches stay warm from one command to the next. The socket is only accessible
+    to the current user, and the agent exits after `idle_timeout` seconds without
+    any command.
+
+    Attributes:
+        path (str): Path of the Unix socket.
+        idle_timeout (float): Seconds of inactivity after which the agent exits.
+        runner (Callable): Runs a command in-process, `naas_python.cli.run_command` by default.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str = None, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, runner: Optional[Callable[..., int]] = None):
+        self.path = path or socket_path()
+        self.idle_timeout = idle_timeout
+        if runner is None:
+            from naas_python.cli import run_command as runner
+        self.runner = runner
+        self.environment = agent_environment()
+        self.run_lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_activity = time.monotonic()
+        self.commands = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        previous_umask = os.umask(0o177)
+        try:
+            super().__init__(self.path, _AgentRequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def warm_up(self) -> None:
+        """Builds the adaptors and domains of every CLI group"""
+        from naas_python.cli import LAZY_SUBCOMMANDS
+
+        for target, _ in LAZY_SUBCOMMANDS.values():
+            importlib.import_module(target.partition(":")[0])
+
+    def status(self) -> dict:
+        return {"pid": os.getpid(), "socket": self.path, "uptime": time.time() - self.started_at, "commands": self.commands}
+
+    def service_actions(self) -> None:
+        if time.monotonic() - self.last_activity > self.idle_timeout and not self.run_lock.locked():
+            self.last_activity = time.monotonic()
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="naas-python background agent")
+    parser.add_argument("--socket", default=socket_path())
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    server = AgentServer(args.socket, idle_timeout=args.idle_timeout)
+    try:
+        server.warm_up()
+        server.serve_forever(poll_interval=1)
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
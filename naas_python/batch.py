@@ -0,0 +1,101 @@
+import io
+import json
+import shlex
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import typer
+
+from naas_python.cli import run_command
+
+# Commands that cannot run from a batch file
+EXCLUDED_COMMANDS = ("batch", "agent")
+
+app = typer.Typer(
+    help="Run the commands of a file in one process",
+    add_completion=False,
+    pretty_exceptions_enable=False,
+    context_settings={"help_option_names": ["-h", "--help"]},
+)
+
+
+def parse_line(line: str) -> Optional[List[str]]:
+    """
+    Returns the arguments of a batch file line, None for blank lines and comments.
+
+    A line is either a shell-style command, with or without the leading
+    `naas-python`, or a JSON array of arguments, or a JSON object with an
+    "argv" array or a "command" string.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line[0] in "[{":
+        parsed = json.loads(line)
+        if isinstance(parsed, dict):
+            parsed = parsed["argv"] if "argv" in parsed else shlex.split(parsed["command"])
+        argv = [str(arg) for arg in parsed]
+    else:
+        argv = shlex.split(line)
+    if argv[:1] == ["naas-python"]:
+        argv = argv[1:]
+    return argv
+
+
+def run_line(line_number: int, argv: List[str]) -> dict:
+    result = {"line": line_number, "command": shlex.join(argv), "exit_code": 0, "seconds": 0.0, "stdout": "", "stderr": ""}
+    if not argv or argv[0] in EXCLUDED_COMMANDS:
+        result.update(exit_code=2, stderr=f'"{argv[0] if argv else ""}" commands cannot run from a batch file.\n')
+        return result
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    started_at = time.perf_counter()
+    # Prompts get an empty input, the commands run unattended
+    result["exit_code"] = run_command(argv, stdout=stdout, stderr=stderr, stdin=io.StringIO(""))
+    result.update(seconds=time.perf_counter() - started_at, stdout=stdout.getvalue(), stderr=stderr.getvalue())
+    return result
+
+
+@app.command("batch")
+def batch(
+    file: typer.FileText = typer.Option(..., "--file", "-f", help='File of commands, one per line, shell-style or JSON, "-" for stdin'),
+    max_in_flight: int = typer.Option(8, "--max-in-flight", "-j", help="Number of commands running at once"),
+    output_format: str = typer.Option("text", "--format", help="Report format, text or jsonl"),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Include the output of every command in the text report"),
+):
+    """Run the commands of a file in one process, sharing adaptors and connections"""
+    lines = []
+    for line_number, line in enumerate(file, start=1):
+        try:
+            argv = parse_line(line)
+        except (ValueError, KeyError, TypeError) as e:
+            lines.append((line_number, None, f"Invalid line: {e}\n"))
+            continue
+        if argv is not None:
+            lines.append((line_number, argv, None))
+
+    def run(entry) -> dict:
+        line_number, argv, error = entry
+        if error is not None:
+            return {"line": line_number, "command": None, "exit_code": 2, "seconds": 0.0, "stdout": "", "stderr": error}
+        return run_line(line_number, argv)
+
+    # Results are reported in the order of the file, as soon as all previous lines are done
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        for result in executor.map(run, lines):
+            failed += result["exit_code"] != 0
+            if output_format == "jsonl":
+                print(json.dumps(result))
+                continue
+            status = "ok" if result["exit_code"] == 0 else f"failed ({result['exit_code']})"
+            print(f"{result['line']:>6} {status:<12} {result['seconds']:7.2f}s {result['command'] or ''}")
+            output = result["stdout"] + result["stderr"] if verbose else result["stderr"] if result["exit_code"] else ""
+            for output_line in output.splitlines():
+                print(f"{'':>6} | {output_line}")
+
+    print(f"{len(lines) - failed} succeeded, {failed} failed.", file=sys.stderr)
+    if failed:
+        raise typer.Exit(1)
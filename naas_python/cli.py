@@ -1,47 +1,197 @@
+import importlib
+import io
+import sys
+import threading
+import traceback
+from typing import List, Optional, TextIO
+
+import click
 import typer
+from typer.core import TyperGroup
 import logging
 logging.basicConfig(level=logging.ERROR)
 
-from naas_python.domains.registry.handlers.CLIRegistryHandler import (
-    primaryAdaptor as typerRegistryAdaptor,
-)
+# Command groups, by name: the "module:attribute" path of their Typer app and their help.
+# Domain handlers build their API adaptor, domain and Typer app on import, so a group
+# is only imported once its subcommand is invoked.
+LAZY_SUBCOMMANDS = {
+    "space": ("naas_python.domains.space.handlers.CLISpaceHandler:primaryAdaptor.app", "Naas Space CLI"),
+    "registry": ("naas_python.domains.registry.handlers.CLIRegistryHandler:primaryAdaptor.app", "Naas Registry CLI"),
+    "secret": ("naas_python.domains.secret.handlers.CLISecretHandler:primaryAdaptor.app", "Naas Secret CLI"),
+    "asset": ("naas_python.domains.asset.handlers.CLIAssetHandler:primaryAdaptor.app", "Naas Asset CLI"),
+    "storage": ("naas_python.domains.storage.handlers.CLIStorageHandler:primaryAdaptor.app", "Naas Storage CLI"),
+    "agent": ("naas_python.agent.cli:app", "Background agent keeping the CLI warm between commands"),
+    "batch": ("naas_python.batch:app", "Run the commands of a file in one process"),
+}
+
+
+class LazyTyperGroup(TyperGroup):
+    """Root group importing the domain command groups on first use."""
 
-# from naas_python.domains import spaceCliAdaptor  # , registryCliAdaptor
-from naas_python.domains.space.handlers.CLISpaceHandler import (
-    primaryAdaptor as typerSpaceAdaptor,
-)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._listing_help = False
 
-# from naas_python.domains import secretCliAdaptor  # , secretCliAdaptor
-from naas_python.domains.secret.handlers.CLISecretHandler import (
-    primaryAdaptor as typerSecretAdaptor,
-)
+    def list_commands(self, ctx: click.Context):
+        return list(self.commands) + [name for name in LAZY_SUBCOMMANDS if name not in self.commands]
 
-from naas_python.domains.asset.handlers.CLIAssetHandler import (
-    primaryAdaptor as typerAssetAdaptor,
-)
+    def get_command(self, ctx: click.Context, cmd_name: str):
+        if cmd_name in self.commands or cmd_name not in LAZY_SUBCOMMANDS:
+            return self.commands.get(cmd_name)
+        target, help = LAZY_SUBCOMMANDS[cmd_name]
+        if self._listing_help:
+            # Listing the groups in the help only needs their description
+            return TyperGroup(name=cmd_name, help=help)
 
-from naas_python.domains.storage.handlers.CLIStorageHandler import (
-    primaryAdaptor as typerStorageAdaptor,
-)
+        module_name, _, attribute = target.partition(":")
+        group_app = importlib.import_module(module_name)
+        for name in attribute.split("."):
+            group_app = getattr(group_app, name)
+        command = typer.main.get_command(group_app)
+        command.name = cmd_name
+        self.add_command(command, cmd_name)
+        return command
+
+    def format_help(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        self._listing_help = True
+        try:
+            return super().format_help(ctx, formatter)
+        finally:
+            self._listing_help = False
 
 
 def _create_cli_app():
     app = typer.Typer(
+        cls=LazyTyperGroup,
         epilog="Found a bug? Report it at https://github.com/jupyter-naas/naas-python/issues",
         pretty_exceptions_show_locals=False,
         pretty_exceptions_short=True,
         # pretty_exceptions_enable=False,
     )
 
-    # Registry domain's related commands
-    app.add_typer(typerSpaceAdaptor.app, name="space")
-    app.add_typer(typerRegistryAdaptor.app, name="registry")
-    app.add_typer(typerSecretAdaptor.app, name="secret")
-    app.add_typer(typerAssetAdaptor.app, name="asset")
-    app.add_typer(typerStorageAdaptor.app, name="storage")    
-
+    # The domain groups (space, registry, secret, asset, storage) are added by LazyTyperGroup
+    @app.callback()
+    def _root():
+        pass
 
     return app
 
 
 app = _create_cli_app()
+
+
+class _ThreadLocalStream(io.TextIOBase):
+    """Standard stream redirected, for the current thread only, while a command runs in-process"""
+
+    def __init__(self, default: TextIO):
+        self._default = default
+        self._local = threading.local()
+
+    def redirect(self, stream: Optional[TextIO]) -> None:
+        self._local.stream = stream
+
+    @property
+    def _stream(self) -> TextIO:
+        return getattr(self._local, "stream", None) or self._default
+
+    # io.TextIOBase implements these itself, they are delegated explicitly to the current stream
+    def read(self, size: Optional[int] = -1) -> str:
+        return self._stream.read(size)
+
+    def readline(self, size: Optional[int] = -1) -> str:
+        return self._stream.readline(size)
+
+    def readlines(self, hint: int = -1) -> List[str]:
+        return self._stream.readlines(hint)
+
+    def write(self, text: str) -> int:
+        return self._stream.write(text)
+
+    def writelines(self, lines) -> None:
+        self._stream.writelines(lines)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+    def fileno(self) -> int:
+        return self._stream.fileno()
+
+    def isatty(self) -> bool:
+        return self._stream.isatty()
+
+    def readable(self) -> bool:
+        return self._stream.readable()
+
+    def writable(self) -> bool:
+        return self._stream.writable()
+
+    def seekable(self) -> bool:
+        return self._stream.seekable()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self._stream)
+
+    @property
+    def closed(self) -> bool:
+        return self._stream.closed
+
+    @property
+    def encoding(self) -> str:
+        return self._stream.encoding
+
+    @property
+    def errors(self) -> Optional[str]:
+        return self._stream.errors
+
+    @property
+    def newlines(self):
+        return self._stream.newlines
+
+    def close(self) -> None:
+        # The redirected streams belong to their callers, and the process streams to the interpreter
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_command = None
+_command_lock = threading.Lock()
+
+
+def run_command(argv: List[str], stdout: TextIO = None, stderr: TextIO = None, stdin: TextIO = None) -> int:
+    """
+    Runs a CLI command in the current process and returns its exit code.
+
+    The output and input of the command go through `stdout`, `stderr` and `stdin`
+    instead of the process streams. Several commands may run at once from different
+    threads, sharing the adaptors and domains already built.
+    """
+    global _command
+    with _command_lock:
+        if _command is None:
+            _command = typer.main.get_command(app)
+        for name in ("stdout", "stderr", "stdin"):
+            if not isinstance(getattr(sys, name), _ThreadLocalStream):
+                setattr(sys, name, _ThreadLocalStream(getattr(sys, name)))
+
+    streams = {"stdout": stdout, "stderr": stderr, "stdin": stdin}
+    for name, stream in streams.items():
+        getattr(sys, name).redirect(stream)
+    try:
+        _command.main(args=list(argv), prog_name="naas-python", standalone_mode=True)
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception:
+        traceback.print_exc(file=sys.stderr)
+        return 1
+    finally:
+        for name in streams:
+            getattr(sys, name).redirect(None)
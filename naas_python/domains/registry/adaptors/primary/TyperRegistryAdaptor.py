@@ -9,15 +9,22 @@ from click import Context
 from rich.console import Console
 from rich.table import Table
 from typer.core import TyperGroup
+from typing_extensions import Annotated
 import os
+import sys
 
 from naas_python.domains.registry.RegistrySchema import (
     IRegistryDomain,
     IRegistryInvoker,
 )
+from naas_python.utils.completion import add_name, forget_name, name_completer, remember_names
+from naas_python.utils.output import OutputFormat, render_rows
 
 logger = getLogger(__name__)
 
+# Completes the names of the registries, as last listed
+complete_registry_names = name_completer("registry", lambda scope: ["registry", "list", "--format", "jsonl"])
+
 
 class OrderCommands(TyperGroup):
     def list_commands(self, ctx: Context):
@@ -87,6 +94,7 @@ class TyperRegistryAdaptor(IRegistryInvoker):
     ):
         """Create a registry with the given name"""
         registry = self.domain.create(name=name)
+        add_name("registry", name)
 
         # Extract the data
         data = [registry.registry.dict().values()]
@@ -121,21 +129,23 @@ class TyperRegistryAdaptor(IRegistryInvoker):
             "-rp",
             help="Preview the response in the terminal using rich",
         ),
+        output_format: Annotated[
+            OutputFormat, typer.Option("--format", help="Output format, a table sized from the first rows, JSON lines or CSV")
+        ] = OutputFormat.table,
     ):
         """List all registries for the current user"""
         registry_list = self.domain.list(page_size=page_size, page_number=page_number)
+        if not page_size and not page_number:
+            remember_names("registry", (registry.name for registry in registry_list.registries))
 
-        # Extract the data
-        data = [registry.dict().values() for registry in registry_list.registries]
-
-        if len(data) == 0:
-            print("No matching results found.")
+        if len(registry_list.registries) == 0:
+            print("No matching results found.", file=sys.stderr)
             return
 
-        # Define column headers using the determined widths
-        headers = [key.upper() for key in registry_list.registries[0].dict().keys()]
-
         if rich_preview:
+            # Define column headers
+            headers = [key.upper() for key in registry_list.registries[0].dict().keys()]
+
             # Create a Rich Table
             table = Table(show_header=True, header_style="bold")
             # Add columns to the table
@@ -143,14 +153,15 @@ class TyperRegistryAdaptor(IRegistryInvoker):
                 table.add_column(header, justify="center")
 
             # Add data rows to the table
-            for row in data:
-                table.add_row(*row)
+            for registry in registry_list.registries:
+                table.add_row(*registry.dict().values())
 
             # Print the table
             rich.print(table)
 
         else:
-            self._list_preview(data, headers)
+            # Rows are printed as they are read, whatever the size of the listing
+            render_rows((registry.dict() for registry in registry_list.registries), output_format)
 
     def get(
         self,
@@ -159,6 +170,7 @@ class TyperRegistryAdaptor(IRegistryInvoker):
             "--name",
             "-n",
             help="Registry name to be retrieved",
+            autocompletion=complete_registry_names,
         ),
         rich_preview: bool = typer.Option(
             False,
@@ -196,16 +208,17 @@ class TyperRegistryAdaptor(IRegistryInvoker):
     def delete(
         self,
         name: str = typer.Option(
-            ..., "--name", "-n", help="Registry name to be deleted"
+            ..., "--name", "-n", help="Registry name to be deleted", autocompletion=complete_registry_names
         ),
     ):
         """Delete a registry with the given name"""
         self.domain.delete(name=name)
+        forget_name("registry", name)
 
     def get_credentials(
         self,
         name: str = typer.Option(
-            ..., "--name", "-n", help="Get access credentials for registry"
+            ..., "--name", "-n", help="Get access credentials for registry", autocompletion=complete_registry_names
         ),
     ):
         """Get access credentials for registry"""
@@ -221,7 +234,7 @@ class TyperRegistryAdaptor(IRegistryInvoker):
     def docker_login(
         self,
         name: str = typer.Option(
-            ..., "--name", "-n", help="Docker login for registry"
+            ..., "--name", "-n", help="Docker login for registry", autocompletion=complete_registry_names
         ),
     ):
         """Execute Docker login for the specified registry"""
@@ -1,8 +1,8 @@
 import json
 import os
+import sys
 import time
 from logging import getLogger
-from typing import List
 from uuid import UUID
 
 import rich
@@ -24,9 +24,14 @@ from naas_python.domains.secret.SecretSchema import (
 )
 # from naas_python.domains.secret.SecretSchema import SecrettryConflictError
 from naas_python.utils.cicd import Pipeline
+from naas_python.utils.completion import add_name, forget_name, name_completer, remember_names
+from naas_python.utils.output import OutputFormat, render_rows
 
 logger = getLogger(__name__)
 
+# Completes the names of the secrets, as last listed
+complete_secret_names = name_completer("secret", lambda scope: ["secret", "list", "--format", "jsonl"])
+
 
 class OrderCommands(TyperGroup):
     def list_commands(self, ctx: Context):
@@ -58,26 +63,6 @@ class TyperSecretAdaptor(ISecretInvoker):
         self.app.command()(self.get)
         self.app.command()(self.delete)
 
-    def _list_preview(self, data: List[dict], headers: list):
-        if not isinstance(data, list):
-            raise TypeError("Data must be a list of dicts, not {}".format(type(data)))
-
-        # Determine column widths based on the longest values
-        column_widths = [max(len(str(item)) for item in col) for col in zip(*data)]
-
-        # Print the headers
-        header_format = "  ".join(
-            f"{header:<{width}}" for header, width in zip(headers, column_widths)
-        )
-        print(header_format)
-
-        # Print the data
-        for row in data:
-            row_format = "  ".join(
-                f"{str(item):<{width}}" for item, width in zip(row, column_widths)
-            )
-            print(row_format)
-
     def create(
         self,
         name: str = typer.Option(..., "--name", "-n", help="Name of the secret"),
@@ -97,6 +82,7 @@ class TyperSecretAdaptor(ISecretInvoker):
         )
 
         if secret is None:
+            add_name("secret", name)
             print('Secret Successfully created')
             
     def bulk_create(
@@ -115,7 +101,7 @@ class TyperSecretAdaptor(ISecretInvoker):
 
     def get(
         self,
-        name: str = typer.Option(..., "--name", "-n", help="Name of the secret"),
+        name: str = typer.Option(..., "--name", "-n", help="Name of the secret", autocompletion=complete_secret_names),
         rich_preview: bool = typer.Option(
             os.environ.get("NAAS_CLI_RICH_PREVIEW", False),
             "--rich-preview",
@@ -134,9 +120,10 @@ class TyperSecretAdaptor(ISecretInvoker):
 
     def delete(
         self,
-        name: str = typer.Option(..., "--name", "-n", help="Name of the secret"),
+        name: str = typer.Option(..., "--name", "-n", help="Name of the secret", autocompletion=complete_secret_names),
     ):
         self.domain.delete(name=name)
+        forget_name("secret", name)
 
         print(f"Secret '{name}' deleted successfully")
 
@@ -150,41 +137,33 @@ class TyperSecretAdaptor(ISecretInvoker):
             "-rp",
             help="Rich preview of the secret information as a table",
         ),
+        output_format: Annotated[
+            OutputFormat, typer.Option("--format", help="Output format, a table sized from the first rows, JSON lines or CSV")
+        ] = OutputFormat.table,
     ):
         """List all secrets for the current user"""
         secret_list = self.domain.list(page_size=page_size, page_number=page_number)
+        if not page_size and not page_number:
+            remember_names("secret", (secret.name for secret in secret_list))
 
-        data = []
-        headers = []
-
-        # Extract the data and headers
-        for secret in secret_list:
-            _secret_dict = secret.dict()
-
-
-            data.append(list(_secret_dict.values()))  # Append a list of values to data
-
-            headers = [key.upper() for key in _secret_dict.keys()]
-
-        if len(data) == 0:
-            print("No matching results found.")
+        if len(secret_list) == 0:
+            print("No matching results found.", file=sys.stderr)
             return
 
-        headers = [key.upper() for key in _secret_dict.keys()]
-
         if rich_preview:
             # Create a Rich Table
             table = Table(show_header=True, header_style="bold")
             # Add columns to the table
-            for header in headers:
-                table.add_column(header, justify="center")
+            for header in secret_list[0].dict().keys():
+                table.add_column(header.upper(), justify="center")
 
             # Add data rows to the table
-            for row in data:
-                table.add_row(*row)
+            for secret in secret_list:
+                table.add_row(*secret.dict().values())
 
             # Print the table
             rich.print(table)
 
         else:
-            self._list_preview(data, headers)
+            # Rows are printed as they are read, whatever the size of the listing
+            render_rows((secret.dict() for secret in secret_list), output_format)
@@ -1,8 +1,8 @@
 import json
 import os
+import sys
 import time
 from logging import getLogger
-from typing import List
 from uuid import UUID
 
 import rich
@@ -23,9 +23,14 @@ from naas_python.domains.space.SpaceSchema import (
 )
 from naas_python.domains.registry.RegistrySchema import RegistryConflictError
 from naas_python.utils.cicd import Pipeline
+from naas_python.utils.completion import add_name, forget_name, name_completer, remember_names
+from naas_python.utils.output import OutputFormat, render_rows
 
 logger = getLogger(__name__)
 
+# Completes the names of the spaces, as last listed
+complete_space_names = name_completer("space", lambda scope: ["space", "list", "--format", "jsonl"])
+
 
 class OrderCommands(TyperGroup):
     def list_commands(self, ctx: Context):
@@ -58,26 +63,6 @@ class TyperSpaceAdaptor(ISpaceInvoker):
         self.app.command()(self.update)
         self.app.command()(self.add)
 
-    def _list_preview(self, data: List[dict], headers: list):
-        if not isinstance(data, list):
-            raise TypeError("Data must be a list of dicts, not {}".format(type(data)))
-
-        # Determine column widths based on the longest values
-        column_widths = [max(len(str(item)) for item in col) for col in zip(*data)]
-
-        # Print the headers
-        header_format = "  ".join(
-            f"{header:<{width}}" for header, width in zip(headers, column_widths)
-        )
-        print(header_format)
-
-        # Print the data
-        for row in data:
-            row_format = "  ".join(
-                f"{str(item):<{width}}" for item, width in zip(row, column_widths)
-            )
-            print(row_format)
-
     def _print_container_info(self, container):
         print(f"- Name: {container.name}")
         print(f"  Image: {container.image}")
@@ -136,6 +121,8 @@ class TyperSpaceAdaptor(ISpaceInvoker):
             ],
         )
 
+        add_name("space", space.name)
+
         if rich_preview:
             self.console.print(PydanticTableModel([space]).table)
 
@@ -150,7 +137,7 @@ class TyperSpaceAdaptor(ISpaceInvoker):
 
     def get(
         self,
-        name: str = typer.Option(..., "--name", "-n", help="Name of the space"),
+        name: str = typer.Option(..., "--name", "-n", help="Name of the space", autocompletion=complete_space_names),
         rich_preview: bool = typer.Option(
             os.environ.get("NAAS_CLI_RICH_PREVIEW", False),
             "--rich-preview",
@@ -175,7 +162,7 @@ class TyperSpaceAdaptor(ISpaceInvoker):
 
     def update(
         self,
-        name: str = typer.Option(..., "--name", "-n", help="Name of the space"),
+        name: str = typer.Option(..., "--name", "-n", help="Name of the space", autocompletion=complete_space_names),
         domain: str = typer.Option(
             None,
             "--domain",
@@ -241,9 +228,10 @@ class TyperSpaceAdaptor(ISpaceInvoker):
 
     def delete(
         self,
-        name: str = typer.Option(..., "--name", "-n", help="Name of the space"),
+        name: str = typer.Option(..., "--name", "-n", help="Name of the space", autocompletion=complete_space_names),
     ):
         self.domain.delete(name=name)
+        forget_name("space", name)
 
         print(f"Space {name} deleted successfully")
 
@@ -257,49 +245,44 @@ class TyperSpaceAdaptor(ISpaceInvoker):
             "-rp",
             help="Rich preview of the space information as a table",
         ),
+        output_format: Annotated[
+            OutputFormat, typer.Option("--format", help="Output format, a table sized from the first rows, JSON lines or CSV")
+        ] = OutputFormat.table,
     ):
         """List all spaces for the current user"""
         space_list = self.domain.list(page_size=page_size, page_number=page_number)
+        if not page_size and not page_number:
+            remember_names("space", (space.name for space in space_list.spaces))
 
-        data = []
-        headers = []
-
-        # Extract the data and headers
-        for space in space_list.spaces:
-            _space_dict = space.dict()
-            _space_dict.pop("containers", None)  # Remove "containers" key if it exists
-
-            # Convert UUID values to strings
-            for key, value in _space_dict.items():
-                if isinstance(value, UUID):
-                    _space_dict[key] = str(value)
-
-            data.append(list(_space_dict.values()))  # Append a list of values to data
-
-            headers = [key.upper() for key in _space_dict.keys()]
-
-        if len(data) == 0:
-            print("No matching results found.")
+        if len(space_list.spaces) == 0:
+            print("No matching results found.", file=sys.stderr)
             return
 
-        headers = [key.upper() for key in _space_dict.keys()]
+        def rows():
+            for space in space_list.spaces:
+                _space_dict = space.dict()
+                _space_dict.pop("containers", None)  # Remove "containers" key if it exists
+
+                # Convert UUID values to strings
+                yield {key: str(value) if isinstance(value, UUID) else value for key, value in _space_dict.items()}
 
         if rich_preview:
             # Create a Rich Table
             table = Table(show_header=True, header_style="bold")
-            # Add columns to the table
-            for header in headers:
-                table.add_column(header, justify="center")
-
-            # Add data rows to the table
-            for row in data:
-                table.add_row(*row)
+            for index, row in enumerate(rows()):
+                # Add columns to the table
+                if index == 0:
+                    for header in row.keys():
+                        table.add_column(header.upper(), justify="center")
+                # Add data rows to the table
+                table.add_row(*row.values())
 
             # Print the table
             rich.print(table)
 
         else:
-            self._list_preview(data, headers)
+            # Rows are printed as they are read, whatever the size of the listing
+            render_rows(rows(), output_format)
 
     def add(
         self,
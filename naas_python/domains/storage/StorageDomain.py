@@ -1,21 +1,44 @@
 from .models.Storage import Storage
+from .models.TransferMetrics import TransferMetrics
+from . import compression as storage_compression
 
-from typing import Mapping
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Mapping, Optional, Tuple
 
 from naas_python.domains.storage.StorageSchema import (
     IStorageDomain,
     IStorageAdaptor,
     IStorageProviderAdaptor,
+    IStorageCacheAdaptor,
+    IStorageIndexAdaptor,
     Storage,
     Object,
-    StorageProviderNotFound
+    StorageProviderNotFound,
+    BadRequest,
+    FileNotFoundError,
 )
 class StorageDomain(IStorageDomain):
-    def __init__(self, adaptor: IStorageAdaptor, storage_provider_adaptors : Mapping[str, IStorageProviderAdaptor]):
+    # Maximum number of keys accepted by a single DeleteObjects call
+    DELETE_BATCH_SIZE = 1000
+
+    def __init__(self, adaptor: IStorageAdaptor, storage_provider_adaptors : Mapping[str, IStorageProviderAdaptor], cache : Optional[IStorageCacheAdaptor] = None, index : Optional[IStorageIndexAdaptor] = None):
         # List[IStorageProviderAdaptor])
         #Map[str : IStorageProviderAdaptor])
         self.adaptor : IStorageAdaptor = adaptor
         self.storage_provider_adaptors : Mapping[str, IStorageProviderAdaptor] = storage_provider_adaptors
+        self.cache : Optional[IStorageCacheAdaptor] = cache
+        self.index : Optional[IStorageIndexAdaptor] = index
+        self.naas_credentials : str = os.path.expanduser("~/.naas/credentials")
+        self.__credentials_cache = None
 
 ############### API ###############
     def create(self, 
@@ -58,6 +81,27 @@ class StorageDomain(IStorageDomain):
         )
         return response
     
+    def iter_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'],
+        recursive: bool = False,
+    ) -> Iterator[dict]:
+        storage_provider = self.__get_storage_provider_adaptor(workspace_id=workspace_id, storage_name=storage_name)
+
+        # The Naas API only lists one level, so recursive listings always go through the provider
+        if recursive or storage_provider.valid_naas_credentials(workspace_id, storage_name):
+            storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+            yield from storage_provider.list_workspace_storage_object(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                storage_prefix=storage_prefix,
+                delimiter=None if recursive else "/",
+            )
+        else:
+            response = self.list_objects(workspace_id=workspace_id, storage_name=storage_name, storage_prefix=storage_prefix)
+            yield from response.get("object", [])
+
     def delete_object(self, 
         workspace_id: str, 
         storage_name: Storage.__fields__['name'],
@@ -70,6 +114,285 @@ class StorageDomain(IStorageDomain):
         )
         return response    
 
+    def delete_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'],
+        dry_run: bool = False,
+        max_in_flight: int = 4,
+        progress: Optional[Callable[[dict], None]] = None,
+        delete_all: bool = False,
+    ) -> dict:
+        # An empty prefix matches the whole storage, which is only deleted when asked explicitly
+        if not storage_prefix.strip('/') and not delete_all:
+            raise BadRequest(f'An empty prefix would delete every object of storage "{storage_name}", pass delete_all to confirm.')
+
+        # The prefix is handled as a directory, so "data" never matches "data2/..."
+        if storage_prefix and not storage_prefix.endswith('/'):
+            storage_prefix += '/'
+
+        object_keys = (
+            object['key']
+            for object in self.iter_objects(workspace_id=workspace_id, storage_name=storage_name, storage_prefix=storage_prefix, recursive=True)
+            if object['type'] == 'file'
+        )
+        summary = {"deleted": 0, "errors": []}
+
+        def collect(batch_result: dict) -> None:
+            summary["deleted"] += len(batch_result["deleted"])
+            summary["errors"].extend(batch_result["errors"])
+            if progress is not None:
+                progress(batch_result)
+
+        if dry_run:
+            for batch in self.__batched(object_keys, self.DELETE_BATCH_SIZE):
+                collect({"deleted": batch, "errors": []})
+            return summary
+
+        self.__delete_keys(workspace_id, storage_name, object_keys, max_in_flight, collect)
+        return summary
+
+    def delete_object_keys(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        object_keys: Iterable[str],
+        max_in_flight: int = 4,
+    ) -> dict:
+        summary = {"deleted": 0, "errors": []}
+
+        def collect(batch_result: dict) -> None:
+            summary["deleted"] += len(batch_result["deleted"])
+            summary["errors"].extend(batch_result["errors"])
+
+        self.__delete_keys(workspace_id, storage_name, object_keys, max_in_flight, collect)
+        return summary
+
+    def __delete_keys(self,
+        workspace_id: str,
+        storage_name: str,
+        object_keys: Iterable[str],
+        max_in_flight: int,
+        on_batch: Callable[[dict], None],
+    ) -> None:
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+
+        def on_done(batch: List[str], future) -> None:
+            try:
+                batch_result = future.result()
+            except Exception as e:
+                # The whole request failed, every key of the batch is reported and the other batches go on
+                batch_result = self.__failed_deletion(batch, e)
+            self.__unindex_objects(workspace_id, storage_name, batch_result["deleted"])
+            on_batch(batch_result)
+
+        self.__run_concurrently(
+            self.__batched(object_keys, self.DELETE_BATCH_SIZE),
+            lambda batch: storage_provider.delete_workspace_storage_objects(workspace_id=workspace_id, storage_name=storage_name, object_keys=batch),
+            max_in_flight,
+            on_done,
+        )
+
+    def __failed_deletion(self, object_keys: List[str], error: Exception) -> dict:
+        # Same shape as the per key errors reported by the storage providers
+        return {
+            "deleted": [],
+            "errors": [{"key": key, "code": type(error).__name__, "message": str(error)} for key in object_keys],
+        }
+
+    def copy_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_path: str,
+        dst_path: str,
+        dst_storage_name: Optional[str] = None,
+        recursive: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        dst_storage_name = dst_storage_name or storage_name
+        summary = {"copied": 0, "errors": []}
+        self.__copy_objects(workspace_id, storage_name, src_path, dst_storage_name, dst_path, recursive, max_in_flight, progress, summary)
+        return summary
+
+    def move_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_path: str,
+        dst_path: str,
+        dst_storage_name: Optional[str] = None,
+        recursive: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        dst_storage_name = dst_storage_name or storage_name
+        summary = {"copied": 0, "deleted": 0, "errors": []}
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        copied_keys = []
+
+        def delete_copied_keys() -> None:
+            # Sources are only removed once their copy succeeded
+            try:
+                result = storage_provider.delete_workspace_storage_objects(workspace_id=workspace_id, storage_name=storage_name, object_keys=copied_keys)
+            except Exception as e:
+                result = self.__failed_deletion(copied_keys, e)
+            self.__unindex_objects(workspace_id, storage_name, result["deleted"])
+            summary["deleted"] += len(result["deleted"])
+            summary["errors"].extend(result["errors"])
+            copied_keys.clear()
+
+        def on_copied(copy_result: dict) -> None:
+            if copy_result["error"] is None:
+                copied_keys.append(copy_result["src"])
+                if len(copied_keys) >= self.DELETE_BATCH_SIZE:
+                    delete_copied_keys()
+            if progress is not None:
+                progress(copy_result)
+
+        self.__copy_objects(workspace_id, storage_name, src_path, dst_storage_name, dst_path, recursive, max_in_flight, on_copied, summary)
+        if copied_keys:
+            delete_copied_keys()
+        return summary
+
+    def read_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> bytes:
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        return storage_provider.read_workspace_storage_object(workspace_id=workspace_id, storage_name=storage_name, src_file=src_file, start=start, end=end)
+
+    def cleanup_uploads(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        older_than: int = 24 * 3600,
+        dry_run: bool = False,
+    ) -> List[dict]:
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        return storage_provider.cleanup_workspace_storage_uploads(workspace_id=workspace_id, storage_name=storage_name, older_than=older_than, dry_run=dry_run)
+
+    def create_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+    ) -> str:
+        # Uploads written part by part, for data produced as it is sent, e.g. by file-like writers
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        return storage_provider.create_workspace_storage_upload(workspace_id=workspace_id, storage_name=storage_name, dst_file=dst_file)
+
+    def upload_part(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> dict:
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        return storage_provider.upload_workspace_storage_part(workspace_id=workspace_id, storage_name=storage_name, dst_file=dst_file, upload_id=upload_id, part_number=part_number, data=data)
+
+    def complete_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+        parts: List[dict],
+    ) -> dict:
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        response = storage_provider.complete_workspace_storage_upload(workspace_id=workspace_id, storage_name=storage_name, dst_file=dst_file, upload_id=upload_id, parts=parts)
+        self.__index_object(storage_provider, workspace_id, storage_name, dst_file)
+        return response
+
+    def abort_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+    ) -> None:
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        storage_provider.abort_workspace_storage_upload(workspace_id=workspace_id, storage_name=storage_name, dst_file=dst_file, upload_id=upload_id)
+
+    def refresh_index(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+    ) -> dict:
+        if self.index is None:
+            raise BadRequest("No object index is configured.")
+        # Only the objects under the prefix are listed again, the rest of the index is kept
+        objects = (
+            object
+            for object in self.iter_objects(workspace_id=workspace_id, storage_name=storage_name, storage_prefix=storage_prefix, recursive=True)
+            if object['type'] == 'file'
+        )
+        return self.index.replace(workspace_id, storage_name, storage_prefix, objects)
+
+    def query_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+        pattern: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        recursive: bool = True,
+    ) -> Iterator[dict]:
+        # A glob narrows the key range down to its literal leading folders
+        if pattern is not None:
+            base_prefix, _ = self.__split_glob(pattern)
+            if base_prefix.startswith(storage_prefix):
+                storage_prefix = base_prefix
+        self.__ensure_indexed(workspace_id, storage_name, storage_prefix)
+        return self.index.query(
+            workspace_id,
+            storage_name,
+            storage_prefix=storage_prefix,
+            key_regex=self.__glob_regex(pattern).pattern if pattern is not None else None,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=modified_after,
+            modified_before=modified_before,
+            recursive=recursive,
+        )
+
+    def disk_usage(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+    ) -> List[dict]:
+        self.__ensure_indexed(workspace_id, storage_name, storage_prefix)
+        return self.index.usage(workspace_id, storage_name, storage_prefix)
+
+    def __ensure_indexed(self, workspace_id: str, storage_name: str, storage_prefix: str) -> None:
+        # A prefix no refresh covered yet is listed live from the storage, and indexed for the next queries
+        if self.index is None:
+            raise BadRequest("No object index is configured.")
+        if not self.index.is_indexed(workspace_id, storage_name, storage_prefix):
+            self.refresh_index(workspace_id, storage_name, storage_prefix)
+
+    def __index_object(self,
+        storage_provider: IStorageProviderAdaptor,
+        workspace_id: str,
+        storage_name: str,
+        object_key: str,
+    ) -> None:
+        # Writes are applied under the prefixes already indexed, the others are indexed on first query
+        if self.index is None or not self.index.is_indexed(workspace_id, storage_name, object_key):
+            return
+        object_metadata = storage_provider.head_workspace_storage_object(workspace_id=workspace_id, storage_name=storage_name, src_file=object_key)
+        self.index.upsert(workspace_id, storage_name, [{
+            "key": object_key,
+            "size": object_metadata['size'],
+            "etag": object_metadata['etag'],
+            "lastmodified": object_metadata['last_modified'].strftime("%Y-%m-%d %H:%M:%S"),
+        }])
+
+    def __unindex_objects(self, workspace_id: str, storage_name: str, object_keys: List[str]) -> None:
+        if self.index is not None and object_keys:
+            self.index.remove(workspace_id, storage_name, object_keys)
+
     def create_credentials(self,         
         workspace_id: str,
         storage_name: Storage.__fields__['name'],        
@@ -83,8 +406,26 @@ class StorageDomain(IStorageDomain):
         workspace_id: str,
         storage_name: Storage.__fields__['name']
     ) -> str:
-        #TODO This function should check in ~.naas/credentials to grab the provider id (s3;azure;gcp;...)
-        return 's3'
+        # The provider of a storage is the one its credentials are saved for in ~/.naas/credentials, S3 by default
+        storage_credentials = self.__read_credentials().get('storage', {}).get(workspace_id, {}).get(storage_name, {})
+        for provider_id in storage_credentials:
+            if provider_id in self.storage_provider_adaptors:
+                return provider_id
+        return next(iter(storage_credentials), 's3')
+
+    def __read_credentials(self) -> dict:
+        # Parsed again only when the file changes
+        try:
+            mtime = os.stat(self.naas_credentials).st_mtime_ns
+        except OSError:
+            return {}
+        if self.__credentials_cache is None or self.__credentials_cache[0] != mtime:
+            try:
+                with open(self.naas_credentials, 'r') as f:
+                    self.__credentials_cache = (mtime, json.load(f))
+            except (OSError, ValueError):
+                return {}
+        return self.__credentials_cache[1]
 
     def __get_storage_provider_adaptor(self,
                                        workspace_id: str,
@@ -101,39 +442,372 @@ class StorageDomain(IStorageDomain):
         storage_name: Storage.__fields__['name'],
         src_file: str,
         dst_file: str,  
+        skip_identical: bool = False,
+        metrics: Optional[TransferMetrics] = None,
+        resume: bool = False,
+        compression: Optional[str] = None,
+    ) -> dict:
+        self.__check_compression(compression)
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        response = self.__upload_object(storage_provider, workspace_id, storage_name, src_file, dst_file, skip_identical, metrics, resume, compression)
+        return response
+    
+    def get_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+        dst_file: str,
+        use_cache: bool = False,
+        metrics: Optional[TransferMetrics] = None,
+        decompress: bool = True,
     ) -> dict:
+        return self.__download_object(None, workspace_id, storage_name, src_file, dst_file, use_cache, metrics, decompress)
 
-        storage_provider_id = self.__get_storage_provider(workspace_id, storage_name)
+    def post_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_pattern: str,
+        dst_path: str,
+        skip_identical: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+        metrics: Optional[TransferMetrics] = None,
+        resume: bool = False,
+        compression: Optional[str] = None,
+    ) -> dict:
+        self.__check_compression(compression)
+        base_dir, _ = self.__split_glob(src_pattern)
+        dst_prefix = self.__folder(dst_path)
 
-        if storage_provider_id not in self.storage_provider_adaptors:
-            raise StorageProviderNotFound(f'Provider "{storage_provider_id}" is not implemented or not loaded.')
-        
-        storage_provider : IStorageProviderAdaptor = self.storage_provider_adaptors[storage_provider_id]
+        src_files = sorted(path for path in glob.glob(src_pattern, recursive=True) if os.path.isfile(path))
+        if not src_files:
+            raise FileNotFoundError(f'No file matches "{src_pattern}".')
 
-        if not storage_provider.valid_naas_credentials(workspace_id, storage_name):
-            credentials = self.adaptor.generate_credentials(workspace_id, storage_name)
-            storage_provider.save_naas_credentials(workspace_id, storage_name, credentials)
+        # Credentials are looked up once, then every upload shares the same provider client
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        file_pairs = (
+            (src_file, dst_prefix + os.path.relpath(src_file, base_dir or '.').replace(os.sep, '/'))
+            for src_file in src_files
+        )
+        return self.__transfer_files(
+            file_pairs,
+            lambda file_pair: self.__upload_object(storage_provider, workspace_id, storage_name, file_pair[0], file_pair[1], skip_identical, metrics, resume, compression),
+            max_in_flight,
+            progress,
+        )
 
-        response = storage_provider.post_workspace_storage_object(workspace_id=workspace_id, storage_name=storage_name, src_file=src_file, dst_file=dst_file)
-        return response
-    
-    def get_object(self,
+    def get_objects(self,
         workspace_id: str,
         storage_name: Storage.__fields__['name'],
+        src_pattern: str,
+        dst_path: str,
+        use_cache: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+        metrics: Optional[TransferMetrics] = None,
+        decompress: bool = True,
+    ) -> dict:
+        base_prefix, pattern = self.__split_glob(src_pattern)
+        matcher = self.__glob_regex(src_pattern)
+
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        # Only patterns spanning several folders need a recursive listing
+        objects = storage_provider.list_workspace_storage_object(
+            workspace_id=workspace_id,
+            storage_name=storage_name,
+            storage_prefix=base_prefix,
+            delimiter=None if '/' in pattern or '**' in pattern else '/',
+        )
+        file_pairs = (
+            (object['key'], os.path.join(dst_path or '.', *object['key'][len(base_prefix):].split('/')))
+            for object in objects
+            if object['type'] == 'file' and matcher.match(object['key'])
+        )
+
+        def download(file_pair: Tuple[str, str]) -> None:
+            os.makedirs(os.path.dirname(file_pair[1]) or '.', exist_ok=True)
+            self.__download_object(storage_provider, workspace_id, storage_name, file_pair[0], file_pair[1], use_cache, metrics, decompress)
+
+        summary = self.__transfer_files(file_pairs, download, max_in_flight, progress)
+        if summary["transferred"] == 0 and not summary["errors"]:
+            raise FileNotFoundError(f'No object matches "{src_pattern}".')
+        return summary
+
+    def __upload_object(self,
+        storage_provider: IStorageProviderAdaptor,
+        workspace_id: str,
+        storage_name: str,
         src_file: str,
         dst_file: str,
-    ) -> bytes:
+        skip_identical: bool,
+        metrics: Optional[TransferMetrics],
+        resume: bool,
+        compression: Optional[str],
+    ) -> dict:
+        if compression is None:
+            response = storage_provider.post_workspace_storage_object(workspace_id=workspace_id, storage_name=storage_name, src_file=src_file, dst_file=dst_file, skip_identical=skip_identical, metrics=metrics, resume=resume)
+            self.__index_object(storage_provider, workspace_id, storage_name, self.__local_path(src_file, dst_file))
+            return response
 
-        storage_provider_id = self.__get_storage_provider(workspace_id, storage_name)
+        # The compressed copy keeps the source file name, for the destination key and content type,
+        # and a path derived from the source version so that a resumed upload finds it again
+        stat = os.stat(src_file)
+        version = hashlib.sha256(f"{os.path.abspath(src_file)}:{stat.st_size}:{stat.st_mtime_ns}:{compression}".encode()).hexdigest()
+        compressed_dir = os.path.join(tempfile.gettempdir(), "naas-compressed", version)
+        compressed_file = os.path.join(compressed_dir, os.path.basename(src_file))
+        try:
+            if not (resume and os.path.exists(compressed_file)):
+                # Only complete compressed copies are renamed in place, for a resumed upload to reuse
+                os.makedirs(compressed_dir, exist_ok=True)
+                storage_compression.compress_file(src_file, compressed_file + '.tmp', compression)
+                os.replace(compressed_file + '.tmp', compressed_file)
 
-        if storage_provider_id not in self.storage_provider_adaptors:
-            raise StorageProviderNotFound(f'Provider "{storage_provider_id}" is not implemented or not loaded.')
-        
-        storage_provider : IStorageProviderAdaptor = self.storage_provider_adaptors[storage_provider_id]
+            response = storage_provider.post_workspace_storage_object(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                src_file=compressed_file,
+                dst_file=dst_file,
+                skip_identical=skip_identical,
+                metrics=metrics,
+                resume=resume,
+                metadata={storage_compression.METADATA_KEY: compression},
+            )
+        except BaseException:
+            # A resumed upload sends the missing parts of the same compressed copy
+            if not (resume and os.path.exists(compressed_file)):
+                shutil.rmtree(compressed_dir, ignore_errors=True)
+            raise
+        shutil.rmtree(compressed_dir, ignore_errors=True)
+        self.__index_object(storage_provider, workspace_id, storage_name, self.__local_path(src_file, dst_file))
+        return response
+
+    def __download_object(self,
+        storage_provider: Optional[IStorageProviderAdaptor],
+        workspace_id: str,
+        storage_name: str,
+        src_file: str,
+        dst_file: str,
+        use_cache: bool,
+        metrics: Optional[TransferMetrics] = None,
+        decompress: bool = True,
+    ) -> dict:
+        # The provider is only connected when a request is actually needed
+        # Cached objects are stored decompressed, raw downloads of compressed objects bypass the cache
+        if not use_cache or self.cache is None or not decompress:
+            storage_provider = storage_provider or self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+            response = storage_provider.get_workspace_storage_object(workspace_id=workspace_id, storage_name=storage_name, src_file=src_file, dst_file=dst_file, metrics=metrics)
+            if decompress and response:
+                self.__decompress_in_place(self.__local_path(src_file, dst_file), response.get('metadata', {}))
+            return response
+
+        # Inside the freshness window the object is served without any request
+        dst_file = self.__local_path(src_file, dst_file)
+        response = self.cache.copy_to(workspace_id, storage_name, src_file, dst_file)
+        if response is not None:
+            return response
+
+        storage_provider = storage_provider or self.__get_connected_storage_provider_adaptor(workspace_id, storage_name)
+        object_metadata = storage_provider.head_workspace_storage_object(workspace_id=workspace_id, storage_name=storage_name, src_file=src_file)
+
+        def download(path: str) -> None:
+            storage_provider.get_workspace_storage_object(workspace_id=workspace_id, storage_name=storage_name, src_file=src_file, dst_file=path, metrics=metrics)
+            self.__decompress_in_place(path, object_metadata.get('metadata', {}))
+
+        return self.cache.store(
+            workspace_id,
+            storage_name,
+            src_file,
+            object_metadata['etag'],
+            download=download,
+            dst_file=dst_file,
+            metadata=object_metadata.get('metadata', {}),
+        )
+
+    def __decompress_in_place(self, path: str, metadata: Mapping[str, str]) -> None:
+        encoding = metadata.get(storage_compression.METADATA_KEY)
+        if encoding is None:
+            return
+        decompressed_file = path + '.decompressed'
+        try:
+            storage_compression.decompress_file(path, decompressed_file, encoding)
+            os.replace(decompressed_file, path)
+        except ImportError as e:
+            raise BadRequest(f'{path} was downloaded compressed with {encoding}. {e}')
+        finally:
+            # A failed decompression leaves the downloaded file as is
+            if os.path.exists(decompressed_file):
+                os.remove(decompressed_file)
+
+    def __check_compression(self, compression: Optional[str]) -> None:
+        if compression is None:
+            return
+        if compression not in storage_compression.ENCODINGS:
+            raise BadRequest(f'Unsupported compression "{compression}", expected one of {", ".join(storage_compression.ENCODINGS)}.')
+        # Checked before any transfer starts, rather than failing on every file
+        try:
+            storage_compression.check_available(compression)
+        except ImportError as e:
+            raise BadRequest(str(e))
+
+    def __transfer_files(self,
+        file_pairs: Iterable[Tuple[str, str]],
+        transfer: Callable[[Tuple[str, str]], Any],
+        max_in_flight: int,
+        progress: Optional[Callable[[dict], None]],
+    ) -> dict:
+        summary = {"transferred": 0, "skipped": 0, "errors": []}
+
+        def on_done(file_pair: Tuple[str, str], future) -> None:
+            transfer_result = {"src": file_pair[0], "dst": file_pair[1], "skipped": False, "error": None}
+            try:
+                response = future.result()
+                transfer_result["skipped"] = bool(isinstance(response, dict) and response.get("skipped"))
+                summary["skipped" if transfer_result["skipped"] else "transferred"] += 1
+            except Exception as e:
+                transfer_result["error"] = str(e)
+                summary["errors"].append({"key": file_pair[0], "code": type(e).__name__, "message": str(e)})
+            if progress is not None:
+                progress(transfer_result)
+
+        self.__run_concurrently(file_pairs, transfer, max_in_flight, on_done)
+        return summary
+
+    def __get_connected_storage_provider_adaptor(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+    ) -> IStorageProviderAdaptor:
+        storage_provider = self.__get_storage_provider_adaptor(workspace_id=workspace_id, storage_name=storage_name)
 
         if not storage_provider.valid_naas_credentials(workspace_id, storage_name):
             credentials = self.adaptor.generate_credentials(workspace_id, storage_name)
             storage_provider.save_naas_credentials(workspace_id, storage_name, credentials)
 
-        response = storage_provider.get_workspace_storage_object(workspace_id=workspace_id, storage_name=storage_name, src_file=src_file, dst_file=dst_file)
-        return response
+        return storage_provider
+
+    def __copy_objects(self,
+        workspace_id: str,
+        storage_name: str,
+        src_path: str,
+        dst_storage_name: str,
+        dst_path: str,
+        recursive: bool,
+        max_in_flight: int,
+        progress: Optional[Callable[[dict], None]],
+        summary: dict,
+    ) -> None:
+        if recursive:
+            src_prefix = src_path if not src_path or src_path.endswith('/') else src_path + '/'
+            dst_prefix = dst_path if not dst_path or dst_path.endswith('/') else dst_path + '/'
+            # The source is listed while it is copied, it must not contain the destination
+            if dst_storage_name == storage_name and dst_prefix.startswith(src_prefix):
+                raise BadRequest(f'Cannot copy "{src_prefix}" into itself.')
+            key_pairs = (
+                (object['key'], dst_prefix + object['key'][len(src_prefix):])
+                for object in self.iter_objects(workspace_id=workspace_id, storage_name=storage_name, storage_prefix=src_prefix, recursive=True)
+                if object['type'] == 'file'
+            )
+        else:
+            dst_key = dst_path + os.path.basename(src_path) if dst_path == '' or dst_path.endswith('/') else dst_path
+            if dst_storage_name == storage_name and dst_key == src_path:
+                raise BadRequest(f'Cannot copy "{src_path}" onto itself.')
+            key_pairs = iter([(src_path, dst_key)])
+
+        # Both storages need valid credentials, the provider reads from one and writes to the other
+        storage_provider = self.__get_connected_storage_provider_adaptor(workspace_id, dst_storage_name)
+        if dst_storage_name != storage_name and self.__get_connected_storage_provider_adaptor(workspace_id, storage_name) is not storage_provider:
+            raise BadRequest(f'Cannot copy from storage "{storage_name}" to "{dst_storage_name}", they use different providers.')
+
+        def on_done(key_pair: Tuple[str, str], future) -> None:
+            copy_result = {"src": key_pair[0], "dst": key_pair[1], "error": None}
+            try:
+                future.result()
+                summary["copied"] += 1
+            except Exception as e:
+                copy_result["error"] = str(e)
+                summary["errors"].append({"key": key_pair[0], "code": type(e).__name__, "message": str(e)})
+            if progress is not None:
+                progress(copy_result)
+
+        def copy(key_pair: Tuple[str, str]) -> None:
+            storage_provider.copy_workspace_storage_object(
+                workspace_id=workspace_id,
+                src_storage_name=storage_name,
+                src_key=key_pair[0],
+                dst_storage_name=dst_storage_name,
+                dst_key=key_pair[1],
+            )
+            self.__index_object(storage_provider, workspace_id, dst_storage_name, key_pair[1])
+
+        self.__run_concurrently(key_pairs, copy, max_in_flight, on_done)
+
+    def __run_concurrently(self,
+        items: Iterable[Any],
+        task: Callable[[Any], Any],
+        max_in_flight: int,
+        on_done: Callable[[Any, Any], None],
+    ) -> None:
+        # Items are pulled lazily, never with more than max_in_flight tasks pending,
+        # and on_done is always called from the calling thread
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            in_flight = {}
+            for item in items:
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        on_done(in_flight.pop(future), future)
+                in_flight[executor.submit(task, item)] = item
+            for future in wait(in_flight).done:
+                on_done(in_flight[future], future)
+
+    def __split_glob(self, pattern: str) -> Tuple[str, str]:
+        # Split a glob into its literal leading folders and the part containing wildcards
+        parts = pattern.split('/')
+        base_parts = []
+        for part in parts[:-1]:
+            if glob.has_magic(part):
+                break
+            base_parts.append(part)
+        base = '/'.join(base_parts) + '/' if base_parts else ''
+        return base, pattern[len(base):]
+
+    def __glob_regex(self, pattern: str):
+        # Shell-style matching where "*", "?" and "[...]" stop at "/" and "**" spans folders
+        regex, i = "", 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                regex, i = regex + "(?:.*/)?", i + 3
+            elif pattern.startswith("**", i):
+                regex, i = regex + ".*", i + 2
+            elif pattern[i] == "*":
+                regex, i = regex + "[^/]*", i + 1
+            elif pattern[i] == "?":
+                regex, i = regex + "[^/]", i + 1
+            elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+                end = pattern.index("]", i + 2)
+                chars = pattern[i + 1:end]
+                if chars.startswith("!"):
+                    chars = "^" + chars[1:]
+                regex, i = regex + "[" + chars.replace("\\", "\\\\") + "]", end + 1
+            else:
+                regex, i = regex + re.escape(pattern[i]), i + 1
+        return re.compile(regex + r"\Z")
+
+    def __folder(self, path: str) -> str:
+        if path in ('', '.', '/'):
+            return ''
+        return path if path.endswith('/') else path + '/'
+
+    def __batched(self, items: Iterable[str], size: int) -> Iterator[List[str]]:
+        iterator = iter(items)
+        while True:
+            batch = list(islice(iterator, size))
+            if not batch:
+                return
+            yield batch
+
+    def __local_path(self, src_file: str, dst_file: str) -> str:
+        if dst_file.endswith('/'):
+            return dst_file + os.path.basename(src_file)
+        if dst_file == '.':
+            return os.path.basename(src_file)
+        return dst_file
@@ -1,9 +1,11 @@
 from abc import ABCMeta, abstractmethod
 from logging import getLogger
-from typing import Mapping
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Mapping, Optional
 
 from naas_models.pydantic.storage_p2p import *
 from .models.Storage import Storage, Object
+from .models.TransferMetrics import TransferMetrics
 
 
 # Secondary Adaptor
@@ -62,6 +64,10 @@ class IStorageProviderAdaptor(metaclass=ABCMeta):
         storage_name: Storage.__fields__['name'],
         src_file: str,
         dst_file: str,
+        skip_identical: bool = False,
+        metrics: Optional[TransferMetrics] = None,
+        resume: bool = False,
+        metadata: Optional[Mapping[str, str]] = None,
     ) -> dict:
         raise NotImplementedError
 
@@ -71,17 +77,205 @@ class IStorageProviderAdaptor(metaclass=ABCMeta):
         storage_name: Storage.__fields__['name'],
         src_file: str,
         dst_file: str,
+        metrics: Optional[TransferMetrics] = None,
     ) -> bytes:
         raise NotImplementedError
     
+    @abstractmethod
+    def read_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'],
+        delimiter: Optional[str] = "/",
+        page_size: int = 1000,
+    ) -> Iterator[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_workspace_storage_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        object_keys: List[str],
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def copy_workspace_storage_object(self,
+        workspace_id: str,
+        src_storage_name: Storage.__fields__['name'],
+        src_key: str,
+        dst_storage_name: Storage.__fields__['name'],
+        dst_key: str,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def cleanup_workspace_storage_uploads(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        older_than: int = 24 * 3600,
+        dry_run: bool = False,
+    ) -> List[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+    ) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def upload_workspace_storage_part(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+        parts: List[dict],
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def abort_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+    ) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def head_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+    ) -> dict:
+        raise NotImplementedError
+
     @abstractmethod
     def save_naas_credentials(self, workspace_id:str, storage_name:str, credentials:dict)-> str:
         raise NotImplementedError
+
+class IStorageCacheAdaptor(metaclass=ABCMeta):
+
+    @abstractmethod
+    def copy_to(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        object_key: str,
+        dst_file: str,
+        etag: str = None,
+    ) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def store(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        object_key: str,
+        etag: str,
+        download: Callable[[str], None],
+        dst_file: str,
+        metadata: Optional[dict] = None,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+class IStorageIndexAdaptor(metaclass=ABCMeta):
+
+    @abstractmethod
+    def is_indexed(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+    ) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def replace(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'],
+        objects: Iterable[dict],
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        objects: Iterable[dict],
+    ) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        object_keys: Iterable[str],
+    ) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+        key_regex: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        recursive: bool = True,
+    ) -> Iterator[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def usage(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+    ) -> List[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+    ) -> None:
+        raise NotImplementedError
     
 # Domain
 class IStorageDomain(metaclass=ABCMeta):
     adaptor: IStorageAdaptor
     storage_provider_adaptors : Mapping[str, IStorageProviderAdaptor]
+    cache : Optional[IStorageCacheAdaptor]
+    index : Optional[IStorageIndexAdaptor]
     # storage_provider_adaptors : Map[str, IStorageProviderAdaptor]
     #TODO to be validated
 
@@ -113,6 +307,45 @@ class IStorageDomain(metaclass=ABCMeta):
     ) -> dict:
         raise NotImplementedError
 
+    @abstractmethod
+    def iter_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'],
+        recursive: bool = False,
+    ) -> Iterator[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def refresh_index(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def query_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+        pattern: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        recursive: bool = True,
+    ) -> Iterator[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def disk_usage(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'] = "",
+    ) -> List[dict]:
+        raise NotImplementedError
+
     @abstractmethod    
     def delete_object(self,
         workspace_id: str,
@@ -121,12 +354,120 @@ class IStorageDomain(metaclass=ABCMeta):
     ) -> dict:
         raise NotImplementedError     
     
+    @abstractmethod
+    def delete_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'],
+        dry_run: bool = False,
+        max_in_flight: int = 4,
+        progress: Optional[Callable[[dict], None]] = None,
+        delete_all: bool = False,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_object_keys(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        object_keys: Iterable[str],
+        max_in_flight: int = 4,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def copy_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_path: str,
+        dst_path: str,
+        dst_storage_name: Optional[str] = None,
+        recursive: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def move_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_path: str,
+        dst_path: str,
+        dst_storage_name: Optional[str] = None,
+        recursive: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def cleanup_uploads(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        older_than: int = 24 * 3600,
+        dry_run: bool = False,
+    ) -> List[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+    ) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def upload_part(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+        parts: List[dict],
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def abort_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+    ) -> None:
+        raise NotImplementedError
+
     @abstractmethod
     def post_object(self,
         workspace_id: str,
         storage_name: Storage.__fields__['name'],
         src_file: str,
         dst_file: str,
+        skip_identical: bool = False,
+        metrics: Optional[TransferMetrics] = None,
+        resume: bool = False,
+        compression: Optional[str] = None,
     ) -> dict:
         raise NotImplementedError
     
@@ -135,11 +476,43 @@ class IStorageDomain(metaclass=ABCMeta):
         workspace_id: str,
         storage_name: Storage.__fields__['name'],
         src_file: str,
-        dst_file: str,        
-    ) -> bytes:
+        dst_file: str,
+        use_cache: bool = False,
+        metrics: Optional[TransferMetrics] = None,
+        decompress: bool = True,
+    ) -> dict:
         raise NotImplementedError
    
     
+    @abstractmethod
+    def post_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_pattern: str,
+        dst_path: str,
+        skip_identical: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+        metrics: Optional[TransferMetrics] = None,
+        resume: bool = False,
+        compression: Optional[str] = None,
+    ) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_pattern: str,
+        dst_path: str,
+        use_cache: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+        metrics: Optional[TransferMetrics] = None,
+        decompress: bool = True,
+    ) -> dict:
+        raise NotImplementedError
+
     @abstractmethod    
     def create_credentials(self,
         workspace_id: str,
@@ -0,0 +1,260 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fsspec.spec import AbstractBufferedFile, AbstractFileSystem
+
+from naas_python.domains.storage.StorageSchema import (
+    FileNotFoundError as StorageFileNotFoundError,
+    IStorageDomain,
+)
+
+# Smallest part of a multipart upload, but the last
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class NaasFileSystem(AbstractFileSystem):
+    """
+    fsspec filesystem over the Naas storages, for `naas://workspace/storage/path` URLs.
+
+    Files are read with ranged requests, listings are kept in the fsspec
+    listings cache, and `cat`, `put` and `get` of several paths run
+    concurrently. It is registered as the "naas" protocol, so that pandas,
+    pyarrow, dask or polars can read and write storages directly:
+
+        pd.read_csv("naas://<workspace_id>/<storage_name>/data.csv")
+
+    Attributes:
+        domain (IStorageDomain): Storage domain the filesystem delegates to,
+            the SDK one by default.
+        max_in_flight (int): Number of objects transferred concurrently by
+            `cat`, `put` and `get`.
+    """
+
+    protocol = "naas"
+    root_marker = ""
+
+    def __init__(self, domain: Optional[IStorageDomain] = None, max_in_flight: int = 8, **kwargs):
+        super().__init__(**kwargs)
+        if domain is None:
+            from naas_python.domains.storage.handlers.PythonHandler import domain
+        self.domain = domain
+        self.max_in_flight = max_in_flight
+
+    @classmethod
+    def _strip_protocol(cls, path):
+        if isinstance(path, list):
+            return [cls._strip_protocol(p) for p in path]
+        path = super()._strip_protocol(path)
+        return path.strip("/")
+
+    def split_path(self, path: str) -> Tuple[str, str, str]:
+        """Returns the workspace id, storage name and object key of `path`"""
+        parts = self._strip_protocol(path).split("/", 2)
+        if len(parts) < 2 or not all(parts[:2]):
+            raise ValueError(f'"{path}" is not a naas://<workspace_id>/<storage_name>/<path> URL.')
+        return parts[0], parts[1], parts[2] if len(parts) == 3 else ""
+
+    def ls(self, path, detail=True, refresh=False, **kwargs):
+        path = self._strip_protocol(path)
+        if not refresh and path in self.dircache:
+            entries = self.dircache[path]
+        else:
+            workspace_id, storage_name, key = self.split_path(path)
+            prefix = key + "/" if key else ""
+            entries = [
+                self.__entry(workspace_id, storage_name, object)
+                for object in self.domain.iter_objects(workspace_id, storage_name, prefix)
+            ]
+            if not entries and key:
+                # Not a folder, maybe a single object
+                entries = [entry for entry in self.__parent_entries(path) if entry["name"] == path]
+                if not entries:
+                    raise FileNotFoundError(path)
+                return entries if detail else [entry["name"] for entry in entries]
+            self.dircache[path] = entries
+        return entries if detail else [entry["name"] for entry in entries]
+
+    def info(self, path, **kwargs):
+        path = self._strip_protocol(path)
+        workspace_id, storage_name, key = self.split_path(path)
+        if not key:
+            return {"name": path, "size": 0, "type": "directory"}
+        for entry in self.__parent_entries(path):
+            if entry["name"] == path:
+                return entry
+        raise FileNotFoundError(path)
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        workspace_id, storage_name, key = self.split_path(path)
+        # Negative offsets are relative to the end of the object
+        if (start is not None and start < 0) or (end is not None and end < 0):
+            size = self.size(path)
+            start = size + start if start is not None and start < 0 else start
+            end = size + end if end is not None and end < 0 else end
+        try:
+            return self.domain.read_object(workspace_id, storage_name, key, start=start, end=end)
+        except StorageFileNotFoundError:
+            raise FileNotFoundError(path)
+
+    def cat(self, path, recursive=False, on_error="raise", **kwargs):
+        paths = self.expand_path(path, recursive=recursive)
+        if len(paths) == 1 and paths[0] == self._strip_protocol(path) and not self.isdir(paths[0]):
+            return self.cat_file(paths[0])
+
+        def read(file_path):
+            try:
+                return self.cat_file(file_path)
+            except Exception as e:
+                if on_error == "raise":
+                    raise
+                return e
+
+        file_paths = [file_path for file_path in paths if not self.isdir(file_path)]
+        contents = self.__map(read, file_paths)
+        return {
+            file_path: content
+            for file_path, content in zip(file_paths, contents)
+            if on_error != "omit" or not isinstance(content, Exception)
+        }
+
+    def put_file(self, lpath, rpath, callback=None, **kwargs):
+        if os.path.isdir(lpath):
+            return
+        workspace_id, storage_name, key = self.split_path(rpath)
+        self.domain.post_object(workspace_id, storage_name, lpath, key)
+        self.invalidate_cache(rpath)
+
+    def put(self, lpath, rpath, recursive=False, callback=None, maxdepth=None, **kwargs):
+        from fsspec.implementations.local import LocalFileSystem, make_path_posix
+        from fsspec.utils import other_paths
+
+        # Same path expansion as fsspec, the uploads themselves run concurrently
+        if isinstance(lpath, list) and isinstance(rpath, list):
+            rpaths, lpaths = rpath, lpath
+        else:
+            lpaths = LocalFileSystem().expand_path(make_path_posix(lpath) if isinstance(lpath, str) else lpath, recursive=recursive, maxdepth=maxdepth)
+            rpaths = other_paths(lpaths, self._strip_protocol(rpath), exists=isinstance(rpath, str) and rpath.endswith("/"))
+        self.__map(lambda paths: self.put_file(*paths), list(zip(lpaths, rpaths)))
+
+    def get_file(self, rpath, lpath, callback=None, **kwargs):
+        if self.isdir(rpath):
+            os.makedirs(lpath, exist_ok=True)
+            return
+        workspace_id, storage_name, key = self.split_path(rpath)
+        os.makedirs(os.path.dirname(lpath) or ".", exist_ok=True)
+        self.domain.get_object(workspace_id, storage_name, key, lpath)
+
+    def get(self, rpath, lpath, recursive=False, callback=None, maxdepth=None, **kwargs):
+        from fsspec.implementations.local import make_path_posix
+        from fsspec.utils import other_paths
+
+        if isinstance(lpath, list) and isinstance(rpath, list):
+            rpaths, lpaths = rpath, lpath
+        else:
+            rpaths = self.expand_path(rpath, recursive=recursive, maxdepth=maxdepth)
+            lpaths = other_paths(rpaths, make_path_posix(lpath), exists=isinstance(lpath, str) and os.path.isdir(lpath))
+        self.__map(lambda paths: self.get_file(*paths), list(zip(rpaths, lpaths)))
+
+    def cp_file(self, path1, path2, **kwargs):
+        workspace_id, storage_name, src_key = self.split_path(path1)
+        dst_workspace_id, dst_storage_name, dst_key = self.split_path(path2)
+        if dst_workspace_id != workspace_id:
+            raise ValueError("Objects can only be copied between storages of the same workspace.")
+        self.domain.copy_objects(workspace_id, storage_name, src_key, dst_key, dst_storage_name=dst_storage_name)
+        self.invalidate_cache(path2)
+
+    def _rm(self, path):
+        self.rm_file(path)
+
+    def rm_file(self, path):
+        self.rm([path])
+
+    def rm(self, path, recursive=False, maxdepth=None):
+        # Folders only exist through their objects, deleting the objects in batches removes them
+        keys_by_storage = {}
+        for file_path in self.expand_path(path, recursive=recursive, maxdepth=maxdepth):
+            workspace_id, storage_name, key = self.split_path(file_path)
+            if key and not self.isdir(file_path):
+                keys_by_storage.setdefault((workspace_id, storage_name), []).append(key)
+
+        for (workspace_id, storage_name), object_keys in keys_by_storage.items():
+            summary = self.domain.delete_object_keys(workspace_id, storage_name, object_keys)
+            if summary["errors"]:
+                error = summary["errors"][0]
+                raise PermissionError(f"Failed to delete {error['key']}: [{error['code']}] {error['message']}")
+        self.invalidate_cache()
+
+    def mkdir(self, path, create_parents=True, **kwargs):
+        # Folders only exist through the objects they contain
+        pass
+
+    def makedirs(self, path, exist_ok=False):
+        pass
+
+    def invalidate_cache(self, path=None):
+        if path is None:
+            self.dircache.clear()
+            return
+        # The listings of the path and all its parents are stale
+        path = self._strip_protocol(path)
+        while path:
+            self.dircache.pop(path, None)
+            path = self._parent(path)
+
+    def _open(self, path, mode="rb", block_size=None, autocommit=True, cache_options=None, **kwargs):
+        return NaasFile(self, path, mode, block_size=block_size or self.blocksize, autocommit=autocommit, cache_options=cache_options, **kwargs)
+
+    def __parent_entries(self, path: str) -> list:
+        parent = self._parent(path)
+        if parent.count("/") < 1:
+            return []
+        try:
+            return self.ls(parent, detail=True)
+        except FileNotFoundError:
+            return []
+
+    def __entry(self, workspace_id: str, storage_name: str, object: dict) -> dict:
+        name = f"{workspace_id}/{storage_name}/{object['prefix']}{object['name']}".rstrip("/")
+        return {
+            "name": name,
+            "size": int(object.get("size") or 0),
+            "type": "directory" if object["type"] == "directory" else "file",
+            "LastModified": object.get("lastmodified"),
+            "ETag": object.get("etag"),
+        }
+
+    def __map(self, task, items: list) -> list:
+        if len(items) <= 1:
+            return [task(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            return list(executor.map(task, items))
+
+
+class NaasFile(AbstractBufferedFile):
+    """File of a Naas storage, read by ranges and written as a multipart upload, part by part."""
+
+    def _fetch_range(self, start, end):
+        return self.fs.cat_file(self.path, start=start, end=end)
+
+    def _initiate_upload(self):
+        workspace_id, storage_name, key = self.fs.split_path(self.path)
+        self._upload = (workspace_id, storage_name, key, self.fs.domain.create_upload(workspace_id, storage_name, key))
+        self._parts = []
+
+    def _upload_chunk(self, final=False):
+        # Multipart uploads need parts of at least 5 MiB but the last, smaller blocks are kept in the buffer
+        if not final and self.buffer.tell() < MIN_PART_SIZE:
+            return False
+        self.buffer.seek(0)
+        data = self.buffer.read()
+        try:
+            # An empty file is still uploaded as a single empty part
+            if data or not self._parts:
+                self._parts.append(self.fs.domain.upload_part(*self._upload, len(self._parts) + 1, data))
+            if final:
+                self.fs.domain.complete_upload(*self._upload, self._parts)
+        except Exception:
+            self.fs.domain.abort_upload(*self._upload)
+            raise
+        return True
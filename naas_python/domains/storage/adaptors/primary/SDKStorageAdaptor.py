@@ -1,8 +1,12 @@
+import glob
 import os
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional
 
 from naas_python.domains.storage.StorageSchema import (
     IStorageDomain,
     IStorageInvoker,
+    TransferMetrics,
 )
 
 class SDKStorageAdaptor(IStorageInvoker):
@@ -14,27 +18,27 @@ class SDKStorageAdaptor(IStorageInvoker):
 ############### API ############### 
 # Workspace Storage
     def create_workspace_storage(self, workspace_id: str = "", storage_name: str = "") -> None:
-        response = self.domain.create_workspace_storage(
+        response = self.domain.create(
             workspace_id=workspace_id,
             storage_name=storage_name,
         )
         return response
     
     def delete_workspace_storage(self, workspace_id: str = "", storage_name: str = "") -> None:
-        response = self.domain.delete_workspace_storage(
+        response = self.domain.delete(
                 workspace_id=workspace_id,
                 storage_name=storage_name,
             )
         return response
     
     def list_workspace_storage(self, workspace_id: str = "") -> str:
-        response = self.domain.list_workspace_storage(
+        response = self.domain.list(
                 workspace_id=workspace_id,
             )
         return response
     
     def create_workspace_storage_credentials(self, workspace_id: str = "", storage_name: str = ""):
-        response = self.domain.create_workspace_storage_credentials(
+        response = self.domain.create_credentials(
                 workspace_id=workspace_id,
                 storage_name=storage_name,
             )
@@ -46,39 +50,224 @@ class SDKStorageAdaptor(IStorageInvoker):
         storage_name: str = "", 
         storage_prefix: str = "") -> str:
 
-        response = self.domain.list_workspace_storage_object(
+        response = self.domain.list_objects(
                 workspace_id=workspace_id,
                 storage_name=storage_name,
                 storage_prefix=storage_prefix,
             )
         return response
     
+    def iter_workspace_storage_object(self,
+        workspace_id: str = "",
+        storage_name: str = "",
+        storage_prefix: str = "",
+        recursive: bool = False,
+        ) -> Iterator[dict]:
+        """Lazily list the objects under a prefix, fetching pages as they are consumed"""
+        return self.domain.iter_objects(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                storage_prefix=storage_prefix,
+                recursive=recursive,
+            )
+
+    def refresh_workspace_storage_index(self,
+        workspace_id: str = "",
+        storage_name: str = "",
+        storage_prefix: str = "",
+        ) -> dict:
+        """List the objects under a prefix again and update the local object index with them"""
+        return self.domain.refresh_index(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                storage_prefix=storage_prefix,
+            )
+
+    def query_workspace_storage_object(self,
+        workspace_id: str = "",
+        storage_name: str = "",
+        storage_prefix: str = "",
+        pattern: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        recursive: bool = True,
+        ) -> Iterator[dict]:
+        """
+        List the objects matching a glob pattern, size and modification date range from the local object index.
+
+        The index of a storage is built on its first query, and kept up to date with the
+        objects written through the SDK; use `refresh_workspace_storage_index` to pick up
+        changes made elsewhere.
+        """
+        return self.domain.query_objects(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                storage_prefix=storage_prefix,
+                pattern=pattern,
+                min_size=min_size,
+                max_size=max_size,
+                modified_after=modified_after,
+                modified_before=modified_before,
+                recursive=recursive,
+            )
+
+    def workspace_storage_disk_usage(self,
+        workspace_id: str = "",
+        storage_name: str = "",
+        storage_prefix: str = "",
+        ) -> List[dict]:
+        """Number of objects and bytes under each entry of a prefix, from the local object index"""
+        return self.domain.disk_usage(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                storage_prefix=storage_prefix,
+            )
+
     def delete_workspace_storage_object(self, 
         workspace_id: str = "", 
         storage_name: str = "",
         object_name: str = "",
         ) -> None:
 
-        response = self.domain.delete_workspace_storage_object(
+        response = self.domain.delete_object(
                 workspace_id=workspace_id,
                 storage_name=storage_name,
                 object_name=object_name,
             )
         return response    
 
+    def delete_workspace_storage_objects(self,
+        workspace_id: str = "",
+        storage_name: str = "",
+        storage_prefix: str = "",
+        dry_run: bool = False,
+        max_in_flight: int = 4,
+        progress: Optional[Callable[[dict], None]] = None,
+        delete_all: bool = False,
+        ) -> dict:
+        """Delete every object under a prefix, in batches of up to 1000 keys
+
+        An empty prefix deletes the whole storage, and requires `delete_all=True`.
+        `progress` is called with the keys deleted and the errors of each batch.
+        Returns the number of deleted objects and the per-key errors.
+        """
+        response = self.domain.delete_objects(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                storage_prefix=storage_prefix,
+                dry_run=dry_run,
+                max_in_flight=max_in_flight,
+                progress=progress,
+                delete_all=delete_all,
+            )
+        return response
+
+    def copy_workspace_storage_object(self,
+        workspace_id: str = "",
+        storage_name: str = "",
+        src_path: str = "",
+        dst_path: str = "",
+        dst_storage_name: Optional[str] = None,
+        recursive: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+        ) -> dict:
+        """Copy objects server-side, within a storage or to another storage of the workspace"""
+        response = self.domain.copy_objects(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                src_path=src_path,
+                dst_path=dst_path,
+                dst_storage_name=dst_storage_name,
+                recursive=recursive,
+                max_in_flight=max_in_flight,
+                progress=progress,
+            )
+        return response
+
+    def move_workspace_storage_object(self,
+        workspace_id: str = "",
+        storage_name: str = "",
+        src_path: str = "",
+        dst_path: str = "",
+        dst_storage_name: Optional[str] = None,
+        recursive: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+        ) -> dict:
+        """Move objects server-side, deleting each source once its copy succeeded"""
+        response = self.domain.move_objects(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                src_path=src_path,
+                dst_path=dst_path,
+                dst_storage_name=dst_storage_name,
+                recursive=recursive,
+                max_in_flight=max_in_flight,
+                progress=progress,
+            )
+        return response
+
+    def cleanup_workspace_storage_uploads(self,
+        workspace_id: str = "",
+        storage_name: str = "",
+        older_than: int = 24 * 3600,
+        dry_run: bool = False,
+    ) -> list:
+        """Abort the multipart uploads started more than `older_than` seconds ago and never completed"""
+        response = self.domain.cleanup_uploads(
+            workspace_id=workspace_id,
+            storage_name=storage_name,
+            older_than=older_than,
+            dry_run=dry_run,
+        )
+        return response
+
 ############### BOTO3 ###############
     def post_workspace_storage_object(self,
         workspace_id: str = "", 
         storage_name: str = "",
         src_file: str = "",
         dst_file: str = "",
+        skip_identical: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+        metrics: Optional[TransferMetrics] = None,
+        resume: bool = False,
+        compression: Optional[str] = None,
     ) -> bytes:
-        if os.path.isfile(src_file):
-            response = self.domain.post_workspace_storage_object(
+        """Upload a file, or every file matching a glob pattern concurrently into the `dst_file` folder.
+
+        Pass a `TransferMetrics` as `metrics` to follow the bytes transferred and collect throughput, part timings and retries.
+        With `resume`, an interrupted multipart upload of the same file only sends its missing parts.
+        With `compression` ("gzip" or "zstd"), files are uploaded compressed and decompressed back on download.
+        """
+        if glob.has_magic(src_file):
+            response = self.domain.post_objects(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                src_pattern=src_file,
+                dst_path=dst_file,
+                skip_identical=skip_identical,
+                max_in_flight=max_in_flight,
+                progress=progress,
+                metrics=metrics,
+                resume=resume,
+                compression=compression,
+            )
+            return response
+        elif os.path.isfile(src_file):
+            response = self.domain.post_object(
                 workspace_id=workspace_id,
                 storage_name=storage_name,
                 src_file=src_file,
                 dst_file=dst_file,
+                skip_identical=skip_identical,
+                metrics=metrics,
+                resume=resume,
+                compression=compression,
             )
             return response            
         else:
@@ -89,12 +278,38 @@ class SDKStorageAdaptor(IStorageInvoker):
         storage_name: str = "",
         src_file: str = "",
         dst_file: str = "",
-        ) -> bytes:
+        use_cache: bool = False,
+        max_in_flight: int = 8,
+        progress: Optional[Callable[[dict], None]] = None,
+        metrics: Optional[TransferMetrics] = None,
+        decompress: bool = True,
+        ) -> dict:
+        """Download an object, or every object matching a glob pattern concurrently into the `dst_file` folder.
+
+        Pass a `TransferMetrics` as `metrics` to follow the bytes transferred and collect throughput, part timings and retries.
+        Objects uploaded compressed are decompressed unless `decompress` is False.
+        """
+        if glob.has_magic(src_file):
+            response = self.domain.get_objects(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                src_pattern=src_file,
+                dst_path=dst_file,
+                use_cache=use_cache,
+                max_in_flight=max_in_flight,
+                progress=progress,
+                metrics=metrics,
+                decompress=decompress,
+            )
+            return response
 
-        response = self.domain.get_workspace_storage_object(
+        response = self.domain.get_object(
                 workspace_id=workspace_id,
                 storage_name=storage_name,
                 src_file=src_file,
                 dst_file=dst_file,
+                use_cache=use_cache,
+                metrics=metrics,
+                decompress=decompress,
             )
         return response
@@ -0,0 +1,78 @@
+import os
+import threading
+
+from rich.console import Console
+from rich.filesize import decimal
+from rich.progress import (
+    BarColumn,
+    DownloadColumn,
+    Progress,
+    TextColumn,
+    TimeRemainingColumn,
+    TransferSpeedColumn,
+)
+
+from naas_python.domains.storage.models.TransferMetrics import (
+    TransferMetrics,
+    TransferStats,
+)
+
+
+class TransferProgressBar:
+    """
+    Rich progress display of storage transfers, in bytes.
+
+    Shows a bar per running transfer and an aggregate bar, both with their
+    throughput, fed by the `metrics` handed to the storage domain.
+
+    Attributes:
+        console (Console): Console the progress is rendered to.
+        metrics (TransferMetrics): Metrics to pass to the upload and download methods.
+    """
+
+    def __init__(self, console: Console):
+        self.console = console
+        self.metrics = TransferMetrics(on_progress=self.__on_progress)
+        self.progress = Progress(
+            TextColumn("{task.description}"),
+            BarColumn(),
+            DownloadColumn(),
+            TransferSpeedColumn(),
+            TimeRemainingColumn(),
+            console=console,
+        )
+        self.__tasks = {}
+        self.__total_task = None
+        self.__total_bytes = 0
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        self.progress.start()
+        self.__total_task = self.progress.add_task("[cyan]Total", total=None)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.progress.stop()
+
+    def __on_progress(self, stats: TransferStats) -> None:
+        with self.__lock:
+            task = self.__tasks.get(id(stats))
+            if task is None:
+                task = self.progress.add_task(os.path.basename(stats.key), total=stats.total_bytes)
+                self.__tasks[id(stats)] = task
+                self.__total_bytes += stats.total_bytes or 0
+                self.progress.update(self.__total_task, total=self.__total_bytes or None)
+
+            self.progress.update(task, completed=stats.transferred_bytes)
+            self.progress.update(self.__total_task, completed=self.metrics.transferred_bytes)
+
+            # Only running transfers keep a bar, the aggregate one accounts for the finished ones
+            if stats.done:
+                self.progress.remove_task(task)
+
+    def summary(self) -> str:
+        summary = self.metrics.summary()
+        return (
+            f"{decimal(summary['transferred_bytes'])} transferred in {summary['seconds']:.1f}s "
+            f"({decimal(int(summary['bytes_per_second']))}/s), {summary['retries']} retry(ies)."
+        )
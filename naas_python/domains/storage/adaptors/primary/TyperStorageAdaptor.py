@@ -2,15 +2,28 @@ from click import Context
 from typer.core import TyperGroup
 
 import typer
+import glob
 import os, json
+from datetime import datetime
+from typing import Optional
+from typing_extensions import Annotated
 from rich.console import Console
 from rich.table import Table
+from rich.progress import Progress
 from logging import getLogger
 
 from naas_python.utils.cicd import Pipeline
+from naas_python.utils.completion import add_name, forget_name, name_completer, remember_names
+from naas_python.utils.output import OutputFormat, render_rows
+from .TransferProgressBar import TransferProgressBar
 
 logger = getLogger(__name__)
 
+# Completes the names of the storages of the --workspace given first, as last listed
+complete_storage_names = name_completer(
+    "storage", lambda workspace_id: ["storage", "list", "--workspace", workspace_id, "--format", "jsonl"], scope_param="workspace_id"
+)
+
 from naas_python.domains.storage.StorageSchema import (
     Storage,
     IStorageInvoker,
@@ -46,6 +59,11 @@ class TyperStorageAdaptor(IStorageInvoker):
         self.app.command("put-object")(self.post_workspace_storage_object)
         self.app.command("get-object")(self.get_workspace_storage_object)
         self.app.command("delete-object")(self.delete_workspace_storage_object)
+        self.app.command("copy-object")(self.copy_workspace_storage_object)
+        self.app.command("move-object")(self.move_workspace_storage_object)
+        self.app.command("cleanup-uploads")(self.cleanup_workspace_storage_uploads)
+        self.app.command("refresh-index")(self.refresh_workspace_storage_index)
+        self.app.command("du")(self.workspace_storage_disk_usage)
         self.app.command("connect")(self.create_workspace_storage_credentials)
 
 ############### API ###############
@@ -61,15 +79,16 @@ class TyperStorageAdaptor(IStorageInvoker):
     ):
             """Create a Workspace Storage"""
             print("creating storage...")
-            storage = self.domain.create_workspace_storage(
+            storage = self.domain.create(
                 workspace_id=workspace_id,
                 storage_name=storage_name,
             )
+            add_name("storage", storage_name, scope=workspace_id)
             print(f"Storage {storage_name} created.")
     
     def delete_workspace_storage(self,
         workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
-        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage"),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),
         rich_preview: bool = typer.Option(
             False,
             "--rich-preview",
@@ -79,10 +98,11 @@ class TyperStorageAdaptor(IStorageInvoker):
     ):
             """Delete a Workspace Storage"""
             print("deleting storage...")
-            storage = self.domain.delete_workspace_storage(
+            storage = self.domain.delete(
                 workspace_id=workspace_id,
                 storage_name=storage_name,
             )
+            forget_name("storage", storage_name, scope=workspace_id)
             print(f"Storage {storage_name} deleted.")
 
     def list_workspace_storage(self,
@@ -92,12 +112,14 @@ class TyperStorageAdaptor(IStorageInvoker):
             "--rich-preview",
             "-rp",
             help="Rich preview of the information as a table",
-        )
+        ),
+        output_format: Annotated[Optional[OutputFormat], typer.Option("--format", help="Output format, a table sized from the first rows, JSON lines or CSV")] = None,
     ):
             """List Workspace Storages"""
-            list_storage = self.domain.list_workspace_storage(
+            list_storage = self.domain.list(
                 workspace_id=workspace_id,
             )
+            remember_names("storage", (storage['name'] for storage in list_storage['storage']), scope=workspace_id)
             if rich_preview:
                 console = Console()
                 table = Table(show_header=True, header_style="bold black")
@@ -107,26 +129,55 @@ class TyperStorageAdaptor(IStorageInvoker):
                     table.add_row(storage['name'])
 
                 console.print(table)
+            elif output_format is not None:
+                render_rows(list_storage['storage'], output_format, columns=["name"])
             else:
                 print(list_storage)
          
     def list_workspace_storage_object(self,
         workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
-        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage"),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),
         storage_prefix: str = typer.Option(..., "--prefix", "-p", help="Path prefix in the storage"),        
+        recursive: bool = typer.Option(False, "--recursive", "-r", help="List all objects under the prefix instead of a single level"),
+        use_index: bool = typer.Option(False, "--index", help="Answer from the local object index, built on first use"),
+        refresh_index: bool = typer.Option(False, "--refresh-index", help="Refresh the local object index of the prefix before listing"),
+        pattern: Optional[str] = typer.Option(None, "--glob", "-g", help="Only list the objects matching a glob pattern, e.g. \"data/**/*.csv\" (uses the index)"),
+        min_size: Optional[int] = typer.Option(None, "--min-size", help="Only list objects of at least this many bytes (uses the index)"),
+        max_size: Optional[int] = typer.Option(None, "--max-size", help="Only list objects of at most this many bytes (uses the index)"),
+        modified_after: Optional[datetime] = typer.Option(None, "--modified-after", formats=["%Y-%m-%d", "%Y-%m-%d %H:%M:%S"], help="Only list objects modified since this date (uses the index)"),
+        modified_before: Optional[datetime] = typer.Option(None, "--modified-before", formats=["%Y-%m-%d", "%Y-%m-%d %H:%M:%S"], help="Only list objects modified before this date (uses the index)"),
         rich_preview: bool = typer.Option(
             False,
             "--rich-preview",
             "-rp",
             help="Rich preview of the information as a table",
-        )
+        ),
+        output_format: Annotated[Optional[OutputFormat], typer.Option("--format", help="Output format, a table sized from the first rows, JSON lines or CSV")] = None,
     ):
             """List a Workspace Storage Objects"""
-            list_storage_object = self.domain.list_workspace_storage_object(
-                workspace_id=workspace_id,
-                storage_name=storage_name,
-                storage_prefix=storage_prefix,
-            )
+            filters = (pattern, min_size, max_size, modified_after, modified_before)
+            if use_index or refresh_index or any(filter is not None for filter in filters):
+                if refresh_index:
+                    self.domain.refresh_index(workspace_id=workspace_id, storage_name=storage_name, storage_prefix=storage_prefix)
+                list_storage_object = self.domain.query_objects(
+                    workspace_id=workspace_id,
+                    storage_name=storage_name,
+                    storage_prefix=storage_prefix,
+                    pattern=pattern,
+                    min_size=min_size,
+                    max_size=max_size,
+                    modified_after=modified_after,
+                    modified_before=modified_before,
+                    # Glob patterns apply to whole keys
+                    recursive=recursive or pattern is not None,
+                )
+            else:
+                list_storage_object = self.domain.iter_objects(
+                    workspace_id=workspace_id,
+                    storage_name=storage_name,
+                    storage_prefix=storage_prefix,
+                    recursive=recursive,
+                )
             if rich_preview:
                 console = Console()
                 table = Table(show_header=True, header_style="bold black")
@@ -136,17 +187,29 @@ class TyperStorageAdaptor(IStorageInvoker):
                 table.add_column("Size")
                 table.add_column("Last Modified")
 
-                for object in list_storage_object["object"]:
+                for object in list_storage_object:
                     table.add_row(object['name'], object['type'], object['prefix'], object['size'], object['lastmodified'])
 
                 console.print(table)
+            elif output_format is not None:
+                # Only the rows sizing the table columns are held in memory
+                render_rows(list_storage_object, output_format, columns=["name", "type", "prefix", "size", "lastmodified"])
             else:
-                print(list_storage_object)
+                # Rows are printed as soon as each page of the listing arrives
+                for object in list_storage_object:
+                    if object['type'] == 'directory':
+                        print(f"{'PRE':>30} {object['prefix']}{object['name']}/")
+                    else:
+                        print(f"{object['lastmodified']:<19} {object['size']:>10} {object['prefix']}{object['name']}")
 
     def delete_workspace_storage_object(self,                                             
         workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
-        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage"),                                      
-        object_name: str = typer.Option(..., "--object", "-o", help="Name of Object or Folder to remove."),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),                                      
+        object_name: str = typer.Option("", "--object", "-o", help="Name of Object or Folder to remove."),
+        recursive: bool = typer.Option(False, "--recursive", "-r", help="Delete every object under the given folder"),
+        delete_all: bool = typer.Option(False, "--all", help="Delete every object of the storage, when no object is given"),
+        dry_run: bool = typer.Option(False, "--dry-run", help="Only print the objects that would be deleted"),
+        max_in_flight: int = typer.Option(4, "--max-in-flight", help="Number of delete batches sent concurrently"),
         rich_preview: bool = typer.Option(
             False,
             "--rich-preview",
@@ -155,17 +218,95 @@ class TyperStorageAdaptor(IStorageInvoker):
         )
     ):
         """Delete a Workspace Storage Object"""
-        print("Deleting object...")
-        response = self.domain.delete_workspace_storage_object(
-            workspace_id=workspace_id,
-            storage_name=storage_name,
-            object_name=object_name,
-        )
-        print("Object deleted.")
+        if not object_name.strip("/") and not delete_all:
+            raise typer.BadParameter("No object given, pass --all to delete every object of the storage.", param_hint="--object")
+        if not recursive and object_name.strip("/"):
+            if dry_run:
+                print(f"would delete {object_name}")
+                return
+            print("Deleting object...")
+            response = self.domain.delete_object(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                object_name=object_name,
+            )
+            print("Object deleted.")
+            return
+
+        with Progress(console=self.console) as progress:
+            task = progress.add_task("[cyan]Listing objects..." if dry_run else "[cyan]Deleting objects...", total=None)
+
+            def on_batch(batch_result: dict):
+                if dry_run:
+                    for key in batch_result["deleted"]:
+                        progress.print(f"would delete {key}")
+                progress.update(task, advance=len(batch_result["deleted"]) + len(batch_result["errors"]))
+
+            summary = self.domain.delete_objects(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                storage_prefix=object_name,
+                dry_run=dry_run,
+                max_in_flight=max_in_flight,
+                progress=on_batch,
+                delete_all=delete_all,
+            )
+
+        for error in summary["errors"]:
+            print(f"Failed to delete {error['key']}: [{error['code']}] {error['message']}")
+        if dry_run:
+            print(f"{summary['deleted']} object(s) would be deleted.")
+        else:
+            print(f"{summary['deleted']} object(s) deleted, {len(summary['errors'])} error(s).")
                 
+    def copy_workspace_storage_object(self,
+        workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the source storage", autocompletion=complete_storage_names),
+        src_path: str = typer.Option(..., "--source", "-src", help="Object or folder path to copy in the storage"),
+        dst_path: str = typer.Option(..., "--destination", "-dst", help="Destination path"),
+        dst_storage_name: str = typer.Option(None, "--destination-storage", "-ds", help="Name of the destination storage, defaults to the source storage"),
+        recursive: bool = typer.Option(False, "--recursive", "-r", help="Copy every object under the source folder"),
+        max_in_flight: int = typer.Option(8, "--max-in-flight", help="Number of objects copied concurrently"),
+    ):
+        """Copy Workspace Storage Objects server-side"""
+        self._transfer_objects(self.domain.copy_objects, "copy", workspace_id, storage_name, src_path, dst_path, dst_storage_name, recursive, max_in_flight)
+
+    def move_workspace_storage_object(self,
+        workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the source storage", autocompletion=complete_storage_names),
+        src_path: str = typer.Option(..., "--source", "-src", help="Object or folder path to move in the storage"),
+        dst_path: str = typer.Option(..., "--destination", "-dst", help="Destination path"),
+        dst_storage_name: str = typer.Option(None, "--destination-storage", "-ds", help="Name of the destination storage, defaults to the source storage"),
+        recursive: bool = typer.Option(False, "--recursive", "-r", help="Move every object under the source folder"),
+        max_in_flight: int = typer.Option(8, "--max-in-flight", help="Number of objects moved concurrently"),
+    ):
+        """Move Workspace Storage Objects server-side"""
+        self._transfer_objects(self.domain.move_objects, "move", workspace_id, storage_name, src_path, dst_path, dst_storage_name, recursive, max_in_flight)
+
+    def _transfer_objects(self, transfer, verb, workspace_id, storage_name, src_path, dst_path, dst_storage_name, recursive, max_in_flight):
+        with Progress(console=self.console) as progress:
+            task = progress.add_task(f"[cyan]Running {verb}...", total=None)
+            summary = transfer(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                src_path=src_path,
+                dst_path=dst_path,
+                dst_storage_name=dst_storage_name,
+                recursive=recursive,
+                max_in_flight=max_in_flight,
+                progress=lambda copy_result: progress.update(task, advance=1),
+            )
+
+        for error in summary["errors"]:
+            print(f"Failed to {verb} {error['key']}: [{error['code']}] {error['message']}")
+        if "deleted" in summary:
+            print(f"{summary['deleted']} object(s) moved, {len(summary['errors'])} error(s).")
+        else:
+            print(f"{summary['copied']} object(s) copied, {len(summary['errors'])} error(s).")
+
     def create_workspace_storage_credentials(self,
         workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
-        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage"),        
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),        
         rich_preview: bool = typer.Option(
             False,
             "--rich-preview",
@@ -175,19 +316,74 @@ class TyperStorageAdaptor(IStorageInvoker):
     ):
         """Create Storage Credentials"""
         print("Creating credentials...")
-        response = self.domain.create_workspace_storage_credentials(
+        response = self.domain.create_credentials(
             workspace_id=workspace_id,
             storage_name=storage_name
         )
         print("Credentials created.")
         print(response)               
 
+    def cleanup_workspace_storage_uploads(self,
+        workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),
+        older_than: int = typer.Option(24, "--older-than", help="Age, in hours, from which an unfinished upload is considered abandoned"),
+        dry_run: bool = typer.Option(False, "--dry-run", help="Only print the uploads that would be aborted"),
+    ):
+        """Abort abandoned multipart uploads"""
+        uploads = self.domain.cleanup_uploads(
+            workspace_id=workspace_id,
+            storage_name=storage_name,
+            older_than=older_than * 3600,
+            dry_run=dry_run,
+        )
+        for upload in uploads:
+            print(f"{upload['initiated']:<19} {upload['key']} ({upload['upload_id']})")
+        if dry_run:
+            print(f"{len(uploads)} upload(s) would be aborted.")
+        else:
+            print(f"{len(uploads)} upload(s) aborted.")
+
+    def refresh_workspace_storage_index(self,
+        workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),
+        storage_prefix: str = typer.Option("", "--prefix", "-p", help="Only refresh the objects under this prefix"),
+    ):
+        """Refresh the local object index of a Workspace Storage"""
+        summary = self.domain.refresh_index(
+            workspace_id=workspace_id,
+            storage_name=storage_name,
+            storage_prefix=storage_prefix,
+        )
+        print(f"{summary['indexed']} object(s) indexed, {summary['removed']} removed.")
+
+    def workspace_storage_disk_usage(self,
+        workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of the workspace"),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),
+        storage_prefix: str = typer.Option("", "--prefix", "-p", help="Path prefix in the storage"),
+        refresh_index: bool = typer.Option(False, "--refresh-index", help="Refresh the local object index of the prefix first"),
+    ):
+        """Summarize the number of objects and bytes under a prefix, from the local object index"""
+        if refresh_index:
+            self.domain.refresh_index(workspace_id=workspace_id, storage_name=storage_name, storage_prefix=storage_prefix)
+        entries = self.domain.disk_usage(
+            workspace_id=workspace_id,
+            storage_name=storage_name,
+            storage_prefix=storage_prefix,
+        )
+        for entry in entries:
+            print(f"{entry['size']:>14} {entry['objects']:>8} {entry['key']}")
+        print(f"{sum(entry['size'] for entry in entries):>14} {sum(entry['objects'] for entry in entries):>8} total")
+
 ############### BOTO3 ###############
     def post_workspace_storage_object(self,
         workspace_id: str = typer.Option(..., "--workspace", "-w", help="ID of  the workspace"),
-        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage"),      
-        src_file: str = typer.Option(..., "--source", "-src", help="File path to upload in the storage"),
-        dst_file: str = typer.Option(..., "--destination", "-dst", help="Destination file path in the storage"),
+        storage_name: str = typer.Option(..., "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),      
+        src_file: str = typer.Option(..., "--source", "-src", help="File path, or glob pattern such as 'data/**/*.csv', to upload in the storage"),
+        dst_file: str = typer.Option(..., "--destination", "-dst", help="Destination file path in the storage, or destination folder for a glob pattern"),
+        skip_identical: bool = typer.Option(False, "--skip-identical", help="Skip the upload when the remote object has the same checksum"),
+        max_in_flight: int = typer.Option(8, "--max-in-flight", help="Number of files uploaded concurrently for a glob pattern"),
+        resume: bool = typer.Option(False, "--resume", help="Resume an interrupted upload of the same file, only sending its missing parts"),
+        compression: str = typer.Option(None, "--compress", help="Compress the uploaded files with 'gzip' or 'zstd', they are decompressed back on download"),
         rich_preview: bool = typer.Option(
             False,
             "--rich-preview",
@@ -196,23 +392,37 @@ class TyperStorageAdaptor(IStorageInvoker):
         )
     ) -> None:
         """Post a Workspace Storage Object"""        
-        if not os.path.isfile(src_file):
+        if glob.has_magic(src_file):
+            self._transfer_files(self.domain.post_objects, "upload", workspace_id, storage_name, src_file, dst_file, max_in_flight, skip_identical=skip_identical, resume=resume, compression=compression)
+        elif not os.path.isfile(src_file):
             print(f"File '{src_file}' does not exist.")
         else:
             print("Uploading object...")
-            response = self.domain.post_workspace_storage_object(
-                workspace_id=workspace_id,
-                storage_name=storage_name,
-                src_file=src_file,
-                dst_file=dst_file
-            )
-            print("Object uploaded.")
+            with TransferProgressBar(self.console) as progress_bar:
+                response = self.domain.post_object(
+                    workspace_id=workspace_id,
+                    storage_name=storage_name,
+                    src_file=src_file,
+                    dst_file=dst_file,
+                    skip_identical=skip_identical,
+                    metrics=progress_bar.metrics,
+                    resume=resume,
+                    compression=compression,
+                )
+            if response and response.get("skipped"):
+                print("Object unchanged, upload skipped.")
+            else:
+                print("Object uploaded.")
+                print(progress_bar.summary())
 
     def get_workspace_storage_object(self,
         workspace_id: str = typer.Option(None, "--workspace", "-w", help="ID of the workspace"),
-        storage_name: str = typer.Option(None, "--storage", "-s", help="Name of the storage"),
-        src_file: str = typer.Option(None, "--source", "-src", help="File path to download in the storage"),                               
-        dst_file: str = typer.Option(None, "--destination", "-dst", help="Destination file path in the filesystem"),
+        storage_name: str = typer.Option(None, "--storage", "-s", help="Name of the storage", autocompletion=complete_storage_names),
+        src_file: str = typer.Option(None, "--source", "-src", help="File path, or glob pattern such as 'logs/2024-*/*.gz', to download in the storage"),                               
+        dst_file: str = typer.Option(None, "--destination", "-dst", help="Destination file path in the filesystem, or destination folder for a glob pattern"),
+        use_cache: bool = typer.Option(False, "--cache", help="Serve the object from the local storage cache when it is unchanged"),
+        raw: bool = typer.Option(False, "--raw", help="Keep objects uploaded compressed as they are stored, without decompressing them"),
+        max_in_flight: int = typer.Option(8, "--max-in-flight", help="Number of objects downloaded concurrently for a glob pattern"),
         rich_preview: bool = typer.Option(
             False,
             "--rich-preview",
@@ -221,14 +431,38 @@ class TyperStorageAdaptor(IStorageInvoker):
         )
     ):
             """Get a Workspace Storage Object"""            
-            if src_file.endswith("/"):
+            if glob.has_magic(src_file):
+                self._transfer_files(self.domain.get_objects, "download", workspace_id, storage_name, src_file, dst_file, max_in_flight, use_cache=use_cache, decompress=not raw)
+            elif src_file.endswith("/"):
                 print("this is not an object")
             else :
                 print("Downloading object...")
-                response = self.domain.get_workspace_storage_object(
-                    workspace_id=workspace_id,
-                    storage_name=storage_name,
-                    src_file=src_file,
-                    dst_file=dst_file
-                )
+                with TransferProgressBar(self.console) as progress_bar:
+                    response = self.domain.get_object(
+                        workspace_id=workspace_id,
+                        storage_name=storage_name,
+                        src_file=src_file,
+                        dst_file=dst_file,
+                        use_cache=use_cache,
+                        metrics=progress_bar.metrics,
+                        decompress=not raw,
+                    )
                 print("Object downloaded.")
+                print(progress_bar.summary())
+
+    def _transfer_files(self, transfer, verb, workspace_id, storage_name, src_pattern, dst_path, max_in_flight, **kwargs):
+        with TransferProgressBar(self.console) as progress_bar:
+            summary = transfer(
+                workspace_id=workspace_id,
+                storage_name=storage_name,
+                src_pattern=src_pattern,
+                dst_path=dst_path,
+                max_in_flight=max_in_flight,
+                metrics=progress_bar.metrics,
+                **kwargs,
+            )
+
+        for error in summary["errors"]:
+            print(f"Failed to {verb} {error['key']}: [{error['code']}] {error['message']}")
+        print(f"{summary['transferred']} file(s) transferred, {summary['skipped']} skipped, {len(summary['errors'])} error(s).")
+        print(progress_bar.summary())
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from logging import getLogger
+from typing import Callable, List, Optional
+
+from naas_python.utils.filelock import FileLock
+from naas_python.domains.storage.StorageSchema import IStorageCacheAdaptor
+
+logger = getLogger(__name__)
+
+
+class LocalObjectCache(IStorageCacheAdaptor):
+    """
+    On-disk read-through cache for storage objects.
+
+    Entries are content addressed by (workspace, storage, key, ETag), evicted
+    in least-recently-used order once the cache grows over `max_size` bytes,
+    and shared between processes through file locks.
+
+    Attributes:
+        cache_dir (str): Root directory of the cache.
+        max_size (int): Maximum size of the cached blobs, in bytes.
+        ttl (float): Seconds during which an entry is served without checking its ETag remotely.
+    """
+
+    def __init__(self, cache_dir: str = None, max_size: int = None, ttl: float = None):
+        self.cache_dir = cache_dir or os.environ.get(
+            "NAAS_STORAGE_CACHE_DIR", os.path.expanduser("~/.naas/cache/storage")
+        )
+        self.max_size = int(
+            max_size if max_size is not None
+            else os.environ.get("NAAS_STORAGE_CACHE_MAX_SIZE", 5 * 1024**3)
+        )
+        self.ttl = float(
+            ttl if ttl is not None
+            else os.environ.get("NAAS_STORAGE_CACHE_TTL", 0)
+        )
+
+        self._blobs_dir = os.path.join(self.cache_dir, "blobs")
+        self._index_path = os.path.join(self.cache_dir, "index.json")
+        self._lock = FileLock(os.path.join(self.cache_dir, ".lock"))
+
+    def copy_to(self,
+        workspace_id: str,
+        storage_name: str,
+        object_key: str,
+        dst_file: str,
+        etag: str = None,
+    ) -> Optional[dict]:
+        entry = self.__find(self.__entry_id(workspace_id, storage_name, object_key), etag)
+        if entry is None:
+            return None
+
+        # The blob can't be evicted or replaced while it is copied
+        with self.__blob_lock(entry["blob"]):
+            blob_path = os.path.join(self._blobs_dir, entry["blob"])
+            if not os.path.isfile(blob_path):
+                return None
+            shutil.copyfile(blob_path, dst_file)
+        return self.__response(entry)
+
+    def store(self,
+        workspace_id: str,
+        storage_name: str,
+        object_key: str,
+        etag: str,
+        download: Callable[[str], None],
+        dst_file: str,
+        metadata: Optional[dict] = None,
+    ) -> dict:
+        entry_id = self.__entry_id(workspace_id, storage_name, object_key)
+        blob = hashlib.sha256(f"{entry_id}\0{etag}".encode("utf-8")).hexdigest()
+        blob_path = os.path.join(self._blobs_dir, blob)
+        removed_blobs = []
+
+        # Serialize downloads of the same blob so concurrent workers fetch it only once
+        with self.__blob_lock(blob):
+            entry = self.__find(entry_id, etag)
+            if entry is None or not os.path.isfile(blob_path):
+                os.makedirs(self._blobs_dir, exist_ok=True)
+                tmp_path = os.path.join(self._blobs_dir, f".{blob}.{uuid.uuid4().hex}.tmp")
+                try:
+                    download(tmp_path)
+                    os.replace(tmp_path, blob_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+
+                with self._lock:
+                    index = self.__read_index()
+                    previous = index.get(entry_id)
+                    if previous is not None and previous["blob"] != blob:
+                        removed_blobs.append(previous["blob"])
+
+                    now = time.time()
+                    entry = index[entry_id] = {
+                        "etag": etag,
+                        "blob": blob,
+                        "size": os.path.getsize(blob_path),
+                        "metadata": metadata or {},
+                        "validated_at": now,
+                        "accessed_at": now,
+                    }
+                    removed_blobs.extend(self.__evict(index, keep=entry_id))
+                    self.__write_index(index)
+
+            shutil.copyfile(blob_path, dst_file)
+
+        # Blobs are removed once the lock of this one is released, a single blob lock is held at a time
+        self.__remove_blobs(removed_blobs)
+        return self.__response(entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            blobs = [entry["blob"] for entry in self.__read_index().values()]
+            self.__write_index({})
+        self.__remove_blobs(blobs)
+
+############### INTERNAL ###############
+
+    def __entry_id(self, workspace_id: str, storage_name: str, object_key: str) -> str:
+        return f"{workspace_id}/{storage_name}/{object_key.lstrip('/')}"
+
+    def __read_index(self) -> dict:
+        if not os.path.exists(self._index_path):
+            return {}
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            logger.debug(f"Corrupted storage cache index {self._index_path}, resetting it.")
+            return {}
+
+    def __write_index(self, index: dict) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def __find(self, entry_id: str, etag: Optional[str]) -> Optional[dict]:
+        # Returns the entry serving the object, marked as accessed, None when it is missing or stale
+        with self._lock:
+            index = self.__read_index()
+            entry = index.get(entry_id)
+            if entry is None:
+                return None
+
+            now = time.time()
+            if etag is None:
+                # Without a remote ETag only entries inside the freshness window are served
+                if now - entry["validated_at"] > self.ttl:
+                    return None
+            elif entry["etag"] != etag:
+                return None
+            else:
+                entry["validated_at"] = now
+
+            if not os.path.isfile(os.path.join(self._blobs_dir, entry["blob"])):
+                index.pop(entry_id)
+                self.__write_index(index)
+                return None
+
+            entry["accessed_at"] = now
+            self.__write_index(index)
+            return entry
+
+    def __response(self, entry: dict) -> dict:
+        # Same shape as the responses of the storage providers downloads
+        return {"etag": entry["etag"], "size": entry["size"], "metadata": entry.get("metadata", {})}
+
+    def __blob_lock(self, blob: str) -> FileLock:
+        return FileLock(os.path.join(self.cache_dir, "locks", f"{blob}.lock"))
+
+    def __remove_blobs(self, blobs: List[str]) -> None:
+        # A blob is removed under its lock, so that no copy of it is in progress, with the lock file itself
+        for blob in blobs:
+            lock = self.__blob_lock(blob)
+            with lock:
+                with self._lock:
+                    if any(entry["blob"] == blob for entry in self.__read_index().values()):
+                        # Stored again meanwhile
+                        continue
+                for path in (os.path.join(self._blobs_dir, blob), lock.path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def __evict(self, index: dict, keep: str) -> List[str]:
+        # Drops the least recently used entries over the maximum size, returns their blobs
+        total_size = sum(entry["size"] for entry in index.values())
+        evicted = []
+        for entry_id, entry in sorted(index.items(), key=lambda item: item[1]["accessed_at"]):
+            if total_size <= self.max_size:
+                break
+            if entry_id == keep:
+                continue
+            evicted.append(entry["blob"])
+            total_size -= entry["size"]
+            del index[entry_id]
+        return evicted
@@ -0,0 +1,225 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from naas_python.domains.storage.StorageSchema import IStorageIndexAdaptor
+
+# Rows written per transaction while refreshing
+REFRESH_BATCH_SIZE = 5000
+
+# Rows read per query while listing
+QUERY_CHUNK_SIZE = 1000
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class SQLiteObjectIndex(IStorageIndexAdaptor):
+    """
+    Local SQLite index of the object metadata of storages.
+
+    Each storage has its own database holding the key, size, ETag and last
+    modification date of its objects, so that listings, glob, size and date
+    queries and disk usage are answered locally. A prefix is refreshed from a
+    full listing of it, and only the prefixes refreshed so far are indexed.
+    Writes made through the SDK under those prefixes are applied as they go.
+
+    Attributes:
+        index_dir (str): Directory of the databases, defaults to the
+            `NAAS_STORAGE_INDEX_DIR` environment variable or ~/.naas/index.
+    """
+
+    def __init__(self, index_dir: Optional[str] = None):
+        self.index_dir = os.path.expanduser(
+            index_dir or os.environ.get("NAAS_STORAGE_INDEX_DIR") or "~/.naas/index"
+        )
+        self._lock = threading.Lock()
+
+    def is_indexed(self, workspace_id: str, storage_name: str, storage_prefix: str = "") -> bool:
+        # The prefix is covered once it, or a shorter prefix of it, was refreshed
+        if not os.path.exists(self.__path(workspace_id, storage_name)):
+            return False
+        with self.__connect(workspace_id, storage_name) as db:
+            return db.execute(
+                "SELECT 1 FROM refreshes WHERE substr(?, 1, length(prefix)) = prefix LIMIT 1",
+                (storage_prefix,),
+            ).fetchone() is not None
+
+    def replace(self, workspace_id: str, storage_name: str, storage_prefix: str, objects: Iterable[dict]) -> dict:
+        refreshed_at = time.time_ns()
+        indexed = 0
+        with self.__connect(workspace_id, storage_name) as db:
+            batch = []
+            for object in objects:
+                batch.append(self.__row(object, refreshed_at))
+                if len(batch) >= REFRESH_BATCH_SIZE:
+                    indexed += self.__upsert_rows(db, batch)
+                    batch = []
+            indexed += self.__upsert_rows(db, batch)
+
+            # Objects of the prefix missing from the new listing were deleted meanwhile
+            low, high = self.__prefix_range(storage_prefix)
+            removed = db.execute(
+                "DELETE FROM objects WHERE key >= ? AND key < ? AND refreshed_at < ?",
+                (low, high, refreshed_at),
+            ).rowcount
+            db.execute(
+                "INSERT OR REPLACE INTO refreshes (prefix, refreshed_at) VALUES (?, ?)",
+                (storage_prefix, datetime.now().strftime(DATE_FORMAT)),
+            )
+            db.commit()
+        return {"indexed": indexed, "removed": removed}
+
+    def upsert(self, workspace_id: str, storage_name: str, objects: Iterable[dict]) -> None:
+        with self.__connect(workspace_id, storage_name) as db:
+            self.__upsert_rows(db, [self.__row(object, time.time_ns()) for object in objects])
+            db.commit()
+
+    def remove(self, workspace_id: str, storage_name: str, object_keys: Iterable[str]) -> None:
+        if not os.path.exists(self.__path(workspace_id, storage_name)):
+            return
+        with self.__connect(workspace_id, storage_name) as db:
+            db.executemany("DELETE FROM objects WHERE key = ?", ((key,) for key in object_keys))
+            db.commit()
+
+    def query(self,
+        workspace_id: str,
+        storage_name: str,
+        storage_prefix: str = "",
+        key_regex: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_after: Optional[datetime] = None,
+        modified_before: Optional[datetime] = None,
+        recursive: bool = True,
+    ) -> Iterator[dict]:
+        # The prefix is a range on the primary key, the other filters narrow it down
+        low, high = self.__prefix_range(storage_prefix)
+        clauses, params = ["key >= ?", "key < ?"], [low, high]
+        if key_regex is not None:
+            clauses.append("key REGEXP ?")
+            params.append(key_regex)
+        if min_size is not None:
+            clauses.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            clauses.append("size <= ?")
+            params.append(max_size)
+        if modified_after is not None:
+            clauses.append("last_modified >= ?")
+            params.append(modified_after.strftime(DATE_FORMAT))
+        if modified_before is not None:
+            clauses.append("last_modified < ?")
+            params.append(modified_before.strftime(DATE_FORMAT))
+
+        folder = storage_prefix[: storage_prefix.rfind("/") + 1]
+        listed_folders = set()
+        last_key = None
+        while True:
+            # Rows are read by chunks, the index is unlocked while they are consumed, so it can be written meanwhile
+            chunk_clauses, chunk_params = list(clauses), list(params)
+            if last_key is not None:
+                chunk_clauses.append("key > ?")
+                chunk_params.append(last_key)
+            with self.__connect(workspace_id, storage_name) as db:
+                rows = db.execute(
+                    f"SELECT key, size, etag, last_modified FROM objects WHERE {' AND '.join(chunk_clauses)} ORDER BY key LIMIT ?",
+                    chunk_params + [QUERY_CHUNK_SIZE],
+                ).fetchall()
+            if not rows:
+                return
+            last_key = rows[-1][0]
+
+            for key, size, etag, last_modified in rows:
+                if not recursive and "/" in key[len(folder):]:
+                    # Deeper objects show up as their first level folder
+                    sub_folder = key[: key.index("/", len(folder)) + 1]
+                    if sub_folder not in listed_folders:
+                        listed_folders.add(sub_folder)
+                        yield self.__entry(sub_folder)
+                    continue
+                yield self.__entry(key, size, etag, last_modified)
+
+    def usage(self, workspace_id: str, storage_name: str, storage_prefix: str = "") -> List[dict]:
+        """Returns the number of objects and bytes under each first level entry of the prefix"""
+        low, high = self.__prefix_range(storage_prefix)
+        folder = storage_prefix[: storage_prefix.rfind("/") + 1]
+        with self.__connect(workspace_id, storage_name) as db:
+            rows = db.execute(
+                """
+                SELECT
+                    CASE WHEN instr(substr(key, :start), '/') > 0
+                        THEN substr(key, 1, :start - 1 + instr(substr(key, :start), '/'))
+                        ELSE key END AS entry,
+                    COUNT(*), SUM(size), MAX(last_modified)
+                FROM objects WHERE key >= :low AND key < :high
+                GROUP BY entry ORDER BY entry
+                """,
+                {"start": len(folder) + 1, "low": low, "high": high},
+            )
+            return [
+                {"key": entry, "type": "directory" if entry.endswith("/") else "file", "objects": count, "size": size, "lastmodified": last_modified}
+                for entry, count, size, last_modified in rows
+            ]
+
+    def clear(self, workspace_id: str, storage_name: str) -> None:
+        try:
+            os.remove(self.__path(workspace_id, storage_name))
+        except OSError:
+            pass
+
+    def __path(self, workspace_id: str, storage_name: str) -> str:
+        name = hashlib.sha256(f"{workspace_id}/{storage_name}".encode()).hexdigest()
+        return os.path.join(self.index_dir, name + ".sqlite")
+
+    @contextmanager
+    def __connect(self, workspace_id: str, storage_name: str):
+        os.makedirs(self.index_dir, exist_ok=True)
+        with self._lock:
+            db = sqlite3.connect(self.__path(workspace_id, storage_name), timeout=30)
+            try:
+                db.create_function("REGEXP", 2, lambda pattern, value: re.match(pattern, value) is not None, deterministic=True)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS objects ("
+                    "key TEXT PRIMARY KEY, size INTEGER, etag TEXT, last_modified TEXT, refreshed_at INTEGER)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS objects_size ON objects (size)")
+                db.execute("CREATE INDEX IF NOT EXISTS objects_last_modified ON objects (last_modified)")
+                db.execute("CREATE TABLE IF NOT EXISTS refreshes (prefix TEXT PRIMARY KEY, refreshed_at TEXT)")
+                yield db
+            finally:
+                db.close()
+
+    def __upsert_rows(self, db: sqlite3.Connection, rows: list) -> int:
+        db.executemany(
+            "INSERT OR REPLACE INTO objects (key, size, etag, last_modified, refreshed_at) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        return len(rows)
+
+    def __row(self, object: dict, refreshed_at: int) -> tuple:
+        return (object["key"], int(object.get("size") or 0), object.get("etag", ""), object.get("lastmodified", ""), refreshed_at)
+
+    def __prefix_range(self, storage_prefix: str) -> tuple:
+        # Every key starting with the prefix sorts between these bounds
+        return storage_prefix, storage_prefix + "\U0010ffff"
+
+    def __entry(self, key: str, size: int = 0, etag: str = "", last_modified: str = "") -> dict:
+        # Same shape as the objects listed by the storage providers
+        prefix, _, name = key.rstrip("/").rpartition("/")
+        prefix = prefix + "/" if prefix else ""
+        return {
+            "name": name,
+            "type": "directory" if key.endswith("/") else "file",
+            "prefix": prefix,
+            "size": str(size),
+            "lastmodified": last_modified,
+            "key": key,
+            "etag": etag,
+        }
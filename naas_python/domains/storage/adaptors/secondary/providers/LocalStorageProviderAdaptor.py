@@ -0,0 +1,420 @@
+from naas_python.domains.storage.StorageSchema import IStorageProviderAdaptor, Storage, Object, TransferMetrics
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from logging import getLogger
+from typing import Iterator, List, Mapping, Optional
+
+from naas_python.utils.domains_base.authorization import update_credentials_file
+
+logger = getLogger(__name__)
+
+# Errors
+from naas_python.domains.storage.StorageSchema import (
+    BadRequest,
+    FileNotFoundError,
+)
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class LocalStorageProviderAdaptor(IStorageProviderAdaptor):
+    """
+    Storage provider backed by a local directory.
+
+    Objects of a storage are the files under <root>/<workspace_id>/<storage_name>,
+    their metadata is kept next to them under <root>/.metadata. It needs no
+    network nor credentials, so storage pipelines can be tested and benchmarked
+    at disk speed. A storage uses it when its entry in ~/.naas/credentials is
+    under the "local" provider id, optionally with the "root" directory:
+
+        {"storage": {"<workspace_id>": {"<storage_name>": {"local": {"root": "/data/naas"}}}}}
+
+    Attributes:
+        root (str): Default root directory, the `NAAS_STORAGE_LOCAL_ROOT`
+            environment variable or ~/.naas/storage.
+    """
+
+    provider_id : str = 'local'
+
+    def __init__(self, root: Optional[str] = None):
+        super().__init__()
+        self.root = os.path.expanduser(root or os.environ.get('NAAS_STORAGE_LOCAL_ROOT') or '~/.naas/storage')
+        self.naas_credentials = os.path.expanduser("~/.naas/credentials")
+        # Root directory of each storage, by (workspace_id, storage_name), read once from the credentials
+        self.__roots = {}
+
+    def post_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+        dst_file: str,
+        skip_identical: bool = False,
+        metrics: Optional[TransferMetrics] = None,
+        resume: bool = False,
+        metadata: Optional[Mapping[str, str]] = None,
+    ) -> dict:
+        if dst_file.endswith('/'):
+            dst_file = dst_file + os.path.basename(src_file)
+        if dst_file == '.':
+            dst_file = os.path.basename(src_file)
+        key = self.__clean_key(dst_file)
+
+        if not os.path.isfile(src_file):
+            raise FileNotFoundError(f"No such file or directory: {src_file}")
+        object_path = self.__object_path(workspace_id, storage_name, key)
+        object_metadata = dict(metadata or {})
+
+        if skip_identical:
+            object_metadata['sha256'] = self.__sha256(src_file)
+            # Objects stored without their checksum are hashed in place
+            if os.path.isfile(object_path) and (self.__read_metadata(workspace_id, storage_name, key).get('sha256') or self.__sha256(object_path)) == object_metadata['sha256']:
+                logger.debug(f"{key} is identical to {src_file}, skipping upload.")
+                return {"key": key, "skipped": True}
+
+        self.__copy_file(src_file, object_path, key, "upload", metrics)
+        self.__write_metadata(workspace_id, storage_name, key, object_metadata)
+        return {"key": key, "skipped": False}
+
+    def get_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+        dst_file: str,
+        metrics: Optional[TransferMetrics] = None,
+    ) -> bytes:
+        if dst_file.endswith('/'):
+            dst_file = dst_file + os.path.basename(src_file)
+        if dst_file == '.':
+            dst_file = os.path.basename(src_file)
+
+        key = self.__clean_key(src_file)
+        object_path = self.__existing_object_path(workspace_id, storage_name, key)
+        response = self.head_workspace_storage_object(workspace_id, storage_name, key)
+        self.__copy_file(object_path, dst_file, key, "download", metrics)
+        return response
+
+    def read_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> bytes:
+        object_path = self.__existing_object_path(workspace_id, storage_name, self.__clean_key(src_file))
+        with open(object_path, 'rb') as f:
+            f.seek(start or 0)
+            return f.read() if end is None else f.read(max(end - (start or 0), 0))
+
+    def list_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        storage_prefix: Object.__fields__['prefix'],
+        delimiter: Optional[str] = "/",
+        page_size: int = 1000,
+    ) -> Iterator[dict]:
+        storage_root = self.__storage_root(workspace_id, storage_name)
+        folder, _, name_prefix = (storage_prefix or '').rpartition('/')
+        folder = folder + '/' if folder else ''
+        folder_path = os.path.join(storage_root, *folder.split('/'))
+        if not os.path.isdir(folder_path):
+            return
+
+        # Same order as S3, with the folders first when listing a single level
+        if delimiter:
+            entries = sorted(entry for entry in os.listdir(folder_path) if entry.startswith(name_prefix))
+            directories = [entry for entry in entries if os.path.isdir(os.path.join(folder_path, entry))]
+            for directory in directories:
+                yield self.__object_entry(folder + directory + '/')
+            for entry in entries:
+                if entry not in directories:
+                    yield self.__object_entry(folder + entry, os.path.join(folder_path, entry))
+            return
+
+        for dir_path, dir_names, file_names in os.walk(folder_path):
+            dir_names.sort()
+            relative_dir = os.path.relpath(dir_path, storage_root).replace(os.sep, '/')
+            relative_dir = '' if relative_dir == '.' else relative_dir + '/'
+            for file_name in sorted(file_names):
+                key = relative_dir + file_name
+                if key.startswith(storage_prefix or ''):
+                    yield self.__object_entry(key, os.path.join(dir_path, file_name))
+
+    def delete_workspace_storage_objects(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        object_keys: List[str],
+    ) -> dict:
+        deleted, errors = [], []
+        for key in object_keys:
+            object_path = self.__object_path(workspace_id, storage_name, self.__clean_key(key))
+            try:
+                os.remove(object_path)
+            except OSError as e:
+                errors.append({"key": key, "code": type(e).__name__, "message": str(e)})
+                continue
+            self.__remove_metadata(workspace_id, storage_name, self.__clean_key(key))
+            self.__remove_empty_folders(os.path.dirname(object_path), self.__storage_root(workspace_id, storage_name))
+            deleted.append(key)
+        return {"deleted": deleted, "errors": errors}
+
+    def copy_workspace_storage_object(self,
+        workspace_id: str,
+        src_storage_name: str,
+        src_key: str,
+        dst_storage_name: str,
+        dst_key: str,
+    ) -> dict:
+        src_path = self.__existing_object_path(workspace_id, src_storage_name, self.__clean_key(src_key))
+        dst_path = self.__object_path(workspace_id, dst_storage_name, self.__clean_key(dst_key))
+        self.__copy_file(src_path, dst_path, dst_key, "copy", None)
+        self.__write_metadata(workspace_id, dst_storage_name, self.__clean_key(dst_key), self.__read_metadata(workspace_id, src_storage_name, self.__clean_key(src_key)))
+        return {"key": dst_key}
+
+    def cleanup_workspace_storage_uploads(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        older_than: int = 24 * 3600,
+        dry_run: bool = False,
+    ) -> List[dict]:
+        # File uploads are plain copies, only the parts of streamed uploads can be left behind
+        uploads_path = os.path.join(self.__root(workspace_id, storage_name), '.uploads', workspace_id, storage_name)
+        if not os.path.isdir(uploads_path):
+            return []
+        cutoff = time.time() - older_than
+        abandoned = []
+        for upload_id in sorted(os.listdir(uploads_path)):
+            upload_path = os.path.join(uploads_path, upload_id)
+            # The folder changes with every part, its time is the last activity of the upload
+            updated_at = os.stat(upload_path).st_mtime
+            if updated_at >= cutoff:
+                continue
+            with open(os.path.join(upload_path, 'key'), 'r') as f:
+                key = f.read()
+            abandoned.append({"key": key, "upload_id": upload_id, "initiated": datetime.fromtimestamp(updated_at).strftime("%Y-%m-%d %H:%M:%S")})
+            if not dry_run:
+                shutil.rmtree(upload_path, ignore_errors=True)
+        return abandoned
+
+    def create_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+    ) -> str:
+        # Parts are kept under <root>/.uploads until the upload completes
+        key = self.__clean_key(dst_file)
+        self.__object_path(workspace_id, storage_name, key)
+        upload_id = uuid.uuid4().hex
+        upload_path = self.__upload_path(workspace_id, storage_name, upload_id)
+        os.makedirs(upload_path)
+        with open(os.path.join(upload_path, 'key'), 'w') as f:
+            f.write(key)
+        return upload_id
+
+    def upload_workspace_storage_part(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> dict:
+        with open(os.path.join(self.__existing_upload_path(workspace_id, storage_name, upload_id), str(part_number)), 'wb') as f:
+            f.write(data)
+        return {"PartNumber": part_number}
+
+    def complete_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+        parts: List[dict],
+    ) -> dict:
+        key = self.__clean_key(dst_file)
+        upload_path = self.__existing_upload_path(workspace_id, storage_name, upload_id)
+        object_path = self.__object_path(workspace_id, storage_name, key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        part_path = object_path + '.part'
+        try:
+            with open(part_path, 'wb') as dst:
+                for part in sorted(parts, key=lambda part: part["PartNumber"]):
+                    with open(os.path.join(upload_path, str(part["PartNumber"])), 'rb') as src:
+                        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            os.replace(part_path, object_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        self.__write_metadata(workspace_id, storage_name, key, {})
+        shutil.rmtree(upload_path, ignore_errors=True)
+        return {"key": key}
+
+    def abort_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        dst_file: str,
+        upload_id: str,
+    ) -> None:
+        shutil.rmtree(self.__upload_path(workspace_id, storage_name, upload_id), ignore_errors=True)
+
+    def head_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: Storage.__fields__['name'],
+        src_file: str,
+    ) -> dict:
+        key = self.__clean_key(src_file)
+        stat = os.stat(self.__existing_object_path(workspace_id, storage_name, key))
+        return {
+            "etag": self.__etag(stat),
+            "size": stat.st_size,
+            "last_modified": datetime.fromtimestamp(stat.st_mtime),
+            "metadata": self.__read_metadata(workspace_id, storage_name, key),
+        }
+
+    def valid_naas_credentials(self, workspace_id:str, storage_name:str)-> bool:
+        return True
+
+    def save_naas_credentials(self, workspace_id:str, storage_name:str, credentials:dict)-> str:
+        # Storages only need an entry under the "local" provider id, with their root directory
+        def set_storage_credentials(existing_data: dict):
+            storages = existing_data.setdefault('storage', {}).setdefault(workspace_id, {})
+            storages[storage_name] = {self.provider_id: {"root": self.root}}
+
+        update_credentials_file(self.naas_credentials, set_storage_credentials)
+        self.__roots.pop((workspace_id, storage_name), None)
+        return ("generated local credentials.")
+
+############### INTERNAL ###############
+
+    def __storage_root(self, workspace_id:str, storage_name:str)-> str:
+        return os.path.join(self.__root(workspace_id, storage_name), workspace_id, storage_name)
+
+    def __root(self, workspace_id:str, storage_name:str)-> str:
+        root = self.__roots.get((workspace_id, storage_name))
+        if root is None:
+            root = self.__roots[(workspace_id, storage_name)] = self.__read_root(workspace_id, storage_name)
+        return root
+
+    def __read_root(self, workspace_id:str, storage_name:str)-> str:
+        # The credentials file can point a storage to its own root directory
+        if os.path.exists(self.naas_credentials):
+            with open(self.naas_credentials, 'r') as f:
+                json_credentials = json.load(f)
+            local_credentials = json_credentials.get('storage', {}).get(workspace_id, {}).get(storage_name, {}).get(self.provider_id, {})
+            if local_credentials.get('root'):
+                return os.path.expanduser(local_credentials['root'])
+        return self.root
+
+    def __object_path(self, workspace_id:str, storage_name:str, key:str)-> str:
+        if not key or key.endswith('/'):
+            raise BadRequest(f'"{key}" is not an object key.')
+        return os.path.join(self.__storage_root(workspace_id, storage_name), *key.split('/'))
+
+    def __existing_object_path(self, workspace_id:str, storage_name:str, key:str)-> str:
+        object_path = self.__object_path(workspace_id, storage_name, key)
+        if not os.path.isfile(object_path):
+            raise FileNotFoundError(f"File not found.")
+        return object_path
+
+    def __upload_path(self, workspace_id:str, storage_name:str, upload_id:str)-> str:
+        if not upload_id.isalnum():
+            raise BadRequest(f'"{upload_id}" is not an upload id.')
+        return os.path.join(self.__root(workspace_id, storage_name), '.uploads', workspace_id, storage_name, upload_id)
+
+    def __existing_upload_path(self, workspace_id:str, storage_name:str, upload_id:str)-> str:
+        upload_path = self.__upload_path(workspace_id, storage_name, upload_id)
+        if not os.path.isdir(upload_path):
+            raise BadRequest(f'No upload "{upload_id}" in progress.')
+        return upload_path
+
+    def __metadata_path(self, workspace_id:str, storage_name:str, key:str)-> str:
+        return os.path.join(self.__root(workspace_id, storage_name), '.metadata', workspace_id, storage_name, *key.split('/')) + '.json'
+
+    def __read_metadata(self, workspace_id:str, storage_name:str, key:str)-> dict:
+        metadata_path = self.__metadata_path(workspace_id, storage_name, key)
+        if not os.path.exists(metadata_path):
+            return {}
+        with open(metadata_path, 'r') as f:
+            return json.load(f)
+
+    def __write_metadata(self, workspace_id:str, storage_name:str, key:str, metadata:dict)-> None:
+        metadata_path = self.__metadata_path(workspace_id, storage_name, key)
+        if not metadata:
+            self.__remove_metadata(workspace_id, storage_name, key)
+            return
+        os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f)
+
+    def __remove_metadata(self, workspace_id:str, storage_name:str, key:str)-> None:
+        try:
+            os.remove(self.__metadata_path(workspace_id, storage_name, key))
+        except OSError:
+            pass
+
+    def __copy_file(self, src_path:str, dst_path:str, key:str, direction:str, metrics:Optional[TransferMetrics])-> None:
+        # Written next to the destination then renamed, readers never see a partial object
+        os.makedirs(os.path.dirname(dst_path) or '.', exist_ok=True)
+        part_path = dst_path + '.part'
+        stats = metrics.start_transfer(key, direction, os.path.getsize(src_path)) if metrics is not None else None
+        try:
+            with open(src_path, 'rb') as src, open(part_path, 'wb') as dst:
+                while True:
+                    block = src.read(COPY_BUFFER_SIZE)
+                    if not block:
+                        break
+                    dst.write(block)
+                    if stats is not None:
+                        metrics.add_bytes(stats, len(block))
+            os.replace(part_path, dst_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            if stats is not None:
+                metrics.finish_transfer(stats)
+
+    def __remove_empty_folders(self, folder:str, storage_root:str)-> None:
+        while os.path.abspath(folder) != os.path.abspath(storage_root):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                return
+            folder = os.path.dirname(folder)
+
+    def __object_entry(self, key:str, path:Optional[str] = None)-> dict:
+        # Same shape as the objects listed by the S3 provider
+        prefix, _, name = key.rstrip('/').rpartition('/')
+        prefix = prefix + '/' if prefix else ''
+        if path is None:
+            return {"name": name, "type": "directory", "prefix": prefix, "size": "0", "lastmodified": "", "key": key, "etag": ""}
+        stat = os.stat(path)
+        return {
+            "name": name,
+            "type": "file",
+            "prefix": prefix,
+            "size": str(stat.st_size),
+            "lastmodified": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
+            "key": key,
+            "etag": self.__etag(stat),
+        }
+
+    def __etag(self, stat: os.stat_result)-> str:
+        # Changes whenever the file is rewritten, without reading it
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def __sha256(self, path:str)-> str:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def __clean_key(self, key:str)-> str:
+        key = '/'.join(part for part in key.replace('"', '').split('/') if part not in ('', '.'))
+        if '..' in key.split('/'):
+            raise BadRequest(f'"{key}" is not a valid object key.')
+        return key
@@ -1,12 +1,29 @@
-from naas_python.domains.storage.StorageSchema import IStorageProviderAdaptor, Storage, Object
+from naas_python.domains.storage.StorageSchema import IStorageProviderAdaptor, Storage, Object, TransferMetrics
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from s3transfer.utils import ChunksizeAdjuster
 import os, json, re
+import base64
+import hashlib
+import threading
+import itertools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from logging import getLogger
 from datetime import datetime, timezone
+from typing import Iterator, List, Optional
 from urllib.parse import urlparse
 import mimetypes
 
+from naas_python.utils.domains_base.authorization import update_credentials_file
+
+from .checksums import compute_file_checksums
+from .upload_journal import UploadJournal
+
 logger = getLogger(__name__)
 
 # Errors
@@ -41,12 +58,32 @@ class S3StorageProviderAdaptor(IStorageProviderAdaptor):
         self.AWS_SESSION_TOKEN=os.environ.get('AWS_SESSION_TOKEN')
         self.AWS_SESSION_EXPIRATION_TOKEN=None    
 
+        # Credentials, by (workspace_id, storage_name), and the clients built from them, by credential set
+        self.__storage_credentials={}
+        self.__s3_clients={}
+        self.__s3_client_lock=threading.Lock()
+        # Transfers reporting metrics, by transfer id, looked up by the botocore event handlers to time each part
+        self.__active_transfers={}
+        self.__active_transfers_lock=threading.Lock()
+        self.__transfer_ids=itertools.count(1)
+        # Transfer id and part number of the request made by the current thread, ranged requests have no part number
+        self.__current_call=threading.local()
+        self.transfer_config=TransferConfig()
+        # Server-side copies only go multipart, with UploadPartCopy, for large objects
+        self.copy_config=TransferConfig(multipart_threshold=256 * 1024**2, multipart_chunksize=128 * 1024**2)
+        self.upload_journal=UploadJournal()
+        self.__download_state_lock=threading.Lock()
+
 
     def post_workspace_storage_object(self,
         workspace_id: str,
         storage_name: Storage.__fields__['name'],
         src_file: str,
         dst_file: str,
+        skip_identical: bool = False,
+        metrics: Optional[TransferMetrics] = None,
+        resume: bool = False,
+        metadata: Optional[dict] = None,
     ) -> dict:
         response = {}
         
@@ -60,13 +97,31 @@ class S3StorageProviderAdaptor(IStorageProviderAdaptor):
         key = self.__clean_path(key)
 
         try:
-            if self.AWS_ACCESS_KEY_ID is None or self.__s3_token_is_expired(self.AWS_SESSION_EXPIRATION_TOKEN):
-                self.__read_naas_credentials(workspace_id, storage_name)
-            
             content_type, _ = mimetypes.guess_type(src_file)
-            s3 = boto3.client('s3')
-            response = s3.upload_file(Filename=src_file, Bucket=self.naas_bucket, Key=key,  ExtraArgs={'ContentType': content_type})
-            return response
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            extra_args = {'ContentType': content_type}
+            if metadata:
+                extra_args['Metadata'] = dict(metadata)
+
+            if skip_identical:
+                checksums = compute_file_checksums(src_file, self.transfer_config.multipart_threshold, self.transfer_config.multipart_chunksize)
+                if self.__remote_object_matches(s3, key, checksums):
+                    logger.debug(f"{key} is identical to {src_file}, skipping upload.")
+                    return {"key": key, "skipped": True}
+                extra_args['Metadata'] = dict(extra_args.get('Metadata', {}), sha256=checksums['sha256'])
+
+            file_size = os.path.getsize(src_file)
+            if file_size >= self.transfer_config.multipart_threshold:
+                self.__multipart_upload(s3, src_file, key, extra_args, resume, metrics)
+            else:
+                # A single request, made from this thread so that it is timed with its transfer.
+                # S3 verifies the SHA-256 computed by botocore as the body is sent
+                with self.__track_transfer(metrics, key, "upload", file_size) as (transfer_id, callback):
+                    with open(src_file, 'rb') as body, self.__transfer_call(transfer_id):
+                        s3.put_object(Bucket=self.naas_bucket, Key=key, Body=body, ChecksumAlgorithm='SHA256', **extra_args)
+                    if callback is not None:
+                        callback(file_size)
+            return {"key": key, "skipped": False}
         except Exception as e:
             self.__handle_exceptions(str(e))
         return response
@@ -77,6 +132,7 @@ class S3StorageProviderAdaptor(IStorageProviderAdaptor):
         storage_name: str, 
         src_file: str, 
         dst_file:str, 
+        metrics: Optional[TransferMetrics] = None,
     ) -> bytes :
         response = b''
 
@@ -91,20 +147,598 @@ class S3StorageProviderAdaptor(IStorageProviderAdaptor):
         object_key = self.__clean_path(object_key)
 
         try:
-            if self.AWS_ACCESS_KEY_ID is None or self.__s3_token_is_expired(self.AWS_SESSION_EXPIRATION_TOKEN):
-                self.__read_naas_credentials(workspace_id, storage_name)
-
-            s3 = boto3.client('s3')
-            response = s3.download_file(Bucket=self.naas_bucket , Key=object_key, Filename=filename)
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            response = self.__ranged_download(s3, object_key, filename, metrics)
             return response
-        
+
+        except BadRequest:
+            raise
         except Exception as e:
             self.__handle_exceptions(str(e))
         return response
+
+    def read_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: str,
+        src_file: str,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> bytes:
+        object_key = self.__clean_path(workspace_id + "/" + storage_name + "/" + src_file)
+        get_kwargs = {"Bucket": self.naas_bucket, "Key": object_key}
+        # Same semantics as a slice, `end` is exclusive
+        if start or end is not None:
+            get_kwargs["Range"] = f"bytes={start or 0}-{'' if end is None else end - 1}"
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            return s3.get_object(**get_kwargs)['Body'].read()
+        except ClientError as e:
+            # Reading past the end gives an empty result, like a file would
+            if e.response['Error']['Code'] == 'InvalidRange':
+                return b''
+            self.__handle_exceptions(str(e))
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+    def list_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: str,
+        storage_prefix: str,
+        delimiter: Optional[str] = "/",
+        page_size: int = 1000,
+    ) -> Iterator[dict]:
+        storage_root = self.__clean_path(workspace_id + "/" + storage_name + "/")
+        list_kwargs = {
+            "Bucket": self.naas_bucket,
+            "Prefix": self.__clean_path(storage_root + storage_prefix),
+            "MaxKeys": page_size,
+        }
+        if delimiter:
+            list_kwargs["Delimiter"] = delimiter
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            # Pages are requested one at a time, following the continuation token, as the caller consumes them
+            while True:
+                page = s3.list_objects_v2(**list_kwargs)
+                for common_prefix in page.get("CommonPrefixes", []):
+                    yield self.__object_entry(storage_root, common_prefix["Prefix"])
+                for content in page.get("Contents", []):
+                    yield self.__object_entry(storage_root, content["Key"], content)
+                if not page.get("IsTruncated"):
+                    break
+                list_kwargs["ContinuationToken"] = page["NextContinuationToken"]
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+    def delete_workspace_storage_objects(self,
+        workspace_id: str,
+        storage_name: str,
+        object_keys: List[str],
+    ) -> dict:
+        storage_root = self.__clean_path(workspace_id + "/" + storage_name + "/")
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            response = s3.delete_objects(
+                Bucket=self.naas_bucket,
+                Delete={
+                    "Objects": [{"Key": self.__clean_path(storage_root + key)} for key in object_keys],
+                    "Quiet": True,
+                },
+            )
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+        # In quiet mode only the keys that failed are reported back
+        errors = [
+            {"key": error["Key"][len(storage_root):], "code": error.get("Code", ""), "message": error.get("Message", "")}
+            for error in response.get("Errors", [])
+        ]
+        failed_keys = {error["key"] for error in errors}
+        return {
+            "deleted": [key for key in object_keys if key not in failed_keys],
+            "errors": errors,
+        }
+
+    def copy_workspace_storage_object(self,
+        workspace_id: str,
+        src_storage_name: str,
+        src_key: str,
+        dst_storage_name: str,
+        dst_key: str,
+    ) -> dict:
+        src_object_key = self.__clean_path(workspace_id + "/" + src_storage_name + "/" + src_key)
+        dst_object_key = self.__clean_path(workspace_id + "/" + dst_storage_name + "/" + dst_key)
+
+        try:
+            src_s3 = self.__get_s3_client(workspace_id, src_storage_name)
+            s3 = self.__get_s3_client(workspace_id, dst_storage_name)
+            if s3 is src_s3:
+                # Managed copy: CopyObject below the threshold, parallel UploadPartCopy above, no data goes through the client
+                s3.copy(
+                    CopySource={"Bucket": self.naas_bucket, "Key": src_object_key},
+                    Bucket=self.naas_bucket,
+                    Key=dst_object_key,
+                    Config=self.copy_config,
+                )
+            else:
+                # The credentials of each storage only reach that storage, the object is streamed from one to the other
+                source = src_s3.get_object(Bucket=self.naas_bucket, Key=src_object_key)
+                extra_args = {"Metadata": source.get("Metadata", {})}
+                if source.get("ContentType"):
+                    extra_args["ContentType"] = source["ContentType"]
+                with source["Body"] as body:
+                    s3.upload_fileobj(body, Bucket=self.naas_bucket, Key=dst_object_key, ExtraArgs=extra_args, Config=self.transfer_config)
+            return {"key": dst_key}
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+    def cleanup_workspace_storage_uploads(self,
+        workspace_id: str,
+        storage_name: str,
+        older_than: int = 24 * 3600,
+        dry_run: bool = False,
+    ) -> List[dict]:
+        storage_root = self.__clean_path(workspace_id + "/" + storage_name + "/")
+        cutoff = datetime.now(timezone.utc).timestamp() - older_than
+        abandoned = []
+        live_upload_ids = set()
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            list_kwargs = {"Bucket": self.naas_bucket, "Prefix": storage_root}
+            while True:
+                page = s3.list_multipart_uploads(**list_kwargs)
+                for upload in page.get("Uploads", []):
+                    if upload["Initiated"].timestamp() >= cutoff:
+                        live_upload_ids.add(upload["UploadId"])
+                        continue
+                    abandoned.append({
+                        "key": upload["Key"][len(storage_root):],
+                        "upload_id": upload["UploadId"],
+                        "initiated": upload["Initiated"].strftime("%Y-%m-%d %H:%M:%S"),
+                    })
+                    if not dry_run:
+                        self.__abort_multipart_upload(s3, upload["Key"], upload["UploadId"])
+                if not page.get("IsTruncated"):
+                    break
+                list_kwargs["KeyMarker"] = page["NextKeyMarker"]
+                list_kwargs["UploadIdMarker"] = page["NextUploadIdMarker"]
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+        # Journal entries of this storage are dropped once their upload is gone, aborted or completed elsewhere
+        if not dry_run:
+            for upload in self.upload_journal.uploads():
+                if upload["bucket"] == self.naas_bucket and upload["key"].startswith(storage_root) \
+                        and upload["created_at"] < cutoff and upload["upload_id"] not in live_upload_ids:
+                    self.upload_journal.remove(upload["bucket"], upload["key"])
+        return abandoned
+
+    def create_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: str,
+        dst_file: str,
+    ) -> str:
+        key = self.__clean_path(workspace_id + "/" + storage_name + "/" + dst_file)
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            content_type, _ = mimetypes.guess_type(dst_file)
+            extra_args = {'ContentType': content_type} if content_type else {}
+            return s3.create_multipart_upload(Bucket=self.naas_bucket, Key=key, ChecksumAlgorithm='SHA256', **extra_args)['UploadId']
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+    def upload_workspace_storage_part(self,
+        workspace_id: str,
+        storage_name: str,
+        dst_file: str,
+        upload_id: str,
+        part_number: int,
+        data: bytes,
+    ) -> dict:
+        key = self.__clean_path(workspace_id + "/" + storage_name + "/" + dst_file)
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            checksum = base64.b64encode(hashlib.sha256(data).digest()).decode()
+            etag = s3.upload_part(Bucket=self.naas_bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data, ChecksumSHA256=checksum)['ETag']
+            return {"PartNumber": part_number, "ETag": etag, "ChecksumSHA256": checksum}
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+    def complete_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: str,
+        dst_file: str,
+        upload_id: str,
+        parts: List[dict],
+    ) -> dict:
+        key = self.__clean_path(workspace_id + "/" + storage_name + "/" + dst_file)
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            s3.complete_multipart_upload(
+                Bucket=self.naas_bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])},
+            )
+            return {"key": dst_file}
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+    def abort_workspace_storage_upload(self,
+        workspace_id: str,
+        storage_name: str,
+        dst_file: str,
+        upload_id: str,
+    ) -> None:
+        key = self.__clean_path(workspace_id + "/" + storage_name + "/" + dst_file)
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            self.__abort_multipart_upload(s3, key, upload_id)
+        except Exception as e:
+            self.__handle_exceptions(str(e))
+
+    def head_workspace_storage_object(self,
+        workspace_id: str,
+        storage_name: str,
+        src_file: str,
+    ) -> dict:
+        object_key = workspace_id + "/" + storage_name + "/" + src_file
+        object_key = self.__clean_path(object_key)
+
+        try:
+            s3 = self.__get_s3_client(workspace_id, storage_name)
+            response = s3.head_object(Bucket=self.naas_bucket, Key=object_key)
+            return {
+                "etag": response['ETag'].strip('"'),
+                "size": response['ContentLength'],
+                "last_modified": response['LastModified'],
+                "metadata": response.get('Metadata', {}),
+            }
+        except Exception as e:
+            self.__handle_exceptions(str(e))
     
 
 ############### INTERNAL ###############
+
+    def __get_s3_client(self, workspace_id:str, storage_name:str):
+        # Each storage has its own credentials. Clients are shared between calls and threads
+        # by credential set, and dropped once no storage uses their credentials anymore.
+        with self.__s3_client_lock:
+            credentials = self.__storage_credentials.get((workspace_id, storage_name))
+            if credentials is None or self.__s3_token_is_expired(credentials['expiration']):
+                credentials = self.__read_naas_credentials(workspace_id, storage_name)
+                self.__storage_credentials[(workspace_id, storage_name)] = credentials
+                in_use = {self.__credentials_key(c) for c in self.__storage_credentials.values()}
+                self.__s3_clients = {key: client for key, client in self.__s3_clients.items() if key in in_use}
+
+            client_key = self.__credentials_key(credentials)
+            s3 = self.__s3_clients.get(client_key)
+            if s3 is None:
+                s3 = boto3.client(
+                    's3',
+                    region_name=credentials['region_name'],
+                    aws_access_key_id=credentials['access_key_id'],
+                    aws_secret_access_key=credentials['secret_key'],
+                    aws_session_token=credentials['session_token'],
+                )
+                s3.meta.events.register('before-parameter-build.s3', self.__before_transfer_call)
+                s3.meta.events.register('after-call.s3', self.__after_transfer_call)
+                self.__s3_clients[client_key] = s3
+            return s3
+
+    def __credentials_key(self, credentials:dict)-> tuple:
+        return (credentials['region_name'], credentials['access_key_id'], credentials['session_token'])
+
+    def __multipart_upload(self, s3, src_file:str, key:str, extra_args:dict, resume:bool, metrics:Optional[TransferMetrics])-> None:
+        # Parts are journaled as they complete so that an interrupted upload only has to send the missing ones
+        file_size = os.path.getsize(src_file)
+        part_size = ChunksizeAdjuster().adjust_chunksize(self.transfer_config.multipart_chunksize, file_size)
+        part_count = math.ceil(file_size / part_size)
+        fingerprint = UploadJournal.fingerprint(src_file)
+
+        upload_id = None
+        completed_parts = {}
+        upload = self.upload_journal.load(self.naas_bucket, key)
+        if upload is not None:
+            if resume and upload["fingerprint"] == fingerprint and upload["part_size"] == part_size:
+                completed_parts = self.__list_uploaded_parts(s3, key, upload["upload_id"], part_size, file_size, upload["checksums"])
+                if completed_parts is not None:
+                    upload_id = upload["upload_id"]
+                    logger.debug(f"Resuming upload of {key}, {len(completed_parts)}/{part_count} part(s) already uploaded.")
+            else:
+                # The source changed or a fresh upload was asked for, the previous parts are useless
+                self.__abort_multipart_upload(s3, key, upload["upload_id"])
+
+        if upload_id is None:
+            upload_id = s3.create_multipart_upload(Bucket=self.naas_bucket, Key=key, ChecksumAlgorithm='SHA256', **{k: v for k, v in extra_args.items() if v is not None})['UploadId']
+            self.upload_journal.start(self.naas_bucket, key, upload_id, part_size, fingerprint)
+            completed_parts = {}
+
+        missing_parts = [part_number for part_number in range(1, part_count + 1) if part_number not in completed_parts]
+        remaining_bytes = sum(min(part_size, file_size - (part_number - 1) * part_size) for part_number in missing_parts)
+
+        try:
+            with self.__track_transfer(metrics, key, "upload", remaining_bytes) as (transfer_id, callback):
+                with ThreadPoolExecutor(max_workers=self.transfer_config.max_request_concurrency) as executor:
+                    uploaded_parts = executor.map(
+                        lambda part_number: self.__upload_part(s3, src_file, key, upload_id, part_number, part_size, transfer_id, callback),
+                        missing_parts,
+                    )
+                    completed_parts.update(zip(missing_parts, uploaded_parts))
+        except Exception:
+            logger.warning(f"Upload of {key} interrupted, run it again with resume enabled to only send the missing parts.")
+            raise
+
+        s3.complete_multipart_upload(
+            Bucket=self.naas_bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [dict(completed_parts[part_number], PartNumber=part_number) for part_number in sorted(completed_parts)]},
+        )
+        self.upload_journal.remove(self.naas_bucket, key)
+
+    def __ranged_download(self, s3, key:str, filename:str, metrics:Optional[TransferMetrics])-> dict:
+        # The object is written to a .part file, renamed over the destination only once complete
+        head = s3.head_object(Bucket=self.naas_bucket, Key=key, ChecksumMode='ENABLED')
+        etag, size = head['ETag'], head['ContentLength']
+        checksum = head.get('ChecksumSHA256')
+        part_file = filename + '.part'
+        state_file = part_file + '.json'
+
+        # Ranges follow the uploaded parts when their checksums can be combined into the object one,
+        # an object with a full checksum is streamed in a single range, others in chunks of the multipart size.
+        # Multipart objects, whatever their size, have a "-<parts count>" suffix on their composite checksum or ETag
+        parts_count = 1
+        if checksum:
+            suffix = checksum if '-' in checksum else etag.strip('"')
+            parts_count = int(suffix.rpartition('-')[2]) if '-' in suffix else 1
+        if checksum and parts_count > 1:
+            chunk_size = s3.head_object(Bucket=self.naas_bucket, Key=key, PartNumber=1)['ContentLength']
+        elif checksum or size < self.transfer_config.multipart_threshold:
+            chunk_size = max(size, 1)
+        else:
+            chunk_size = self.transfer_config.multipart_chunksize
+        chunk_count = math.ceil(size / chunk_size)
+
+        chunk_digests = self.__load_download_state(state_file, part_file, etag, size, chunk_size)
+        if chunk_digests is None:
+            with open(part_file, 'wb'):
+                pass
+            self.__append_download_state(state_file, {"etag": etag, "size": size, "chunk_size": chunk_size}, mode='w')
+            chunk_digests = {}
+
+        if chunk_count == 1:
+            # A single range resumes from the current size of the partial file
+            ranges = [(0, os.path.getsize(part_file), size)] if os.path.getsize(part_file) < size or size == 0 else []
+        else:
+            ranges = [
+                (chunk, chunk * chunk_size, min(size, (chunk + 1) * chunk_size))
+                for chunk in range(chunk_count)
+                if chunk not in chunk_digests
+            ]
+        if chunk_digests or os.path.getsize(part_file) and chunk_count == 1:
+            logger.debug(f"Resuming download of {key} into {part_file}.")
+
+        try:
+            with self.__track_transfer(metrics, key, "download", sum(end - start for _, start, end in ranges)) as (transfer_id, callback):
+                with ThreadPoolExecutor(max_workers=self.transfer_config.max_request_concurrency) as executor:
+                    digests = executor.map(
+                        lambda byte_range: self.__download_range(s3, key, etag, part_file, state_file, chunk_size, *byte_range, transfer_id, callback, chunk_count > 1),
+                        ranges,
+                    )
+                    chunk_digests.update(zip((chunk for chunk, _, _ in ranges), digests))
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('PreconditionFailed', '412'):
+                raise
+            # The object was replaced meanwhile, the partial file can't be completed
+            self.__discard_download(part_file, state_file)
+            raise BadRequest(f"{key} changed during the download, please retry.")
+
+        if checksum and not self.__download_checksum_matches(checksum, chunk_digests, chunk_count):
+            self.__discard_download(part_file, state_file)
+            raise BadRequest(f"{key} failed the SHA-256 integrity check, the download was discarded, please retry.")
+
+        os.replace(part_file, filename)
+        os.remove(state_file)
+        return {"etag": etag.strip('"'), "size": size, "metadata": head.get('Metadata', {})}
+
+    def __download_range(self, s3, key:str, etag:str, part_file:str, state_file:str, chunk_size:int, chunk:int, start:int, end:int, transfer_id:Optional[int], callback, record_chunk:bool)-> str:
+        # The range digest is computed as the bytes are written, only a resumed prefix is read back
+        sha256 = hashlib.sha256()
+        with open(part_file, 'r+b') as f:
+            f.seek(chunk * chunk_size)
+            remaining = start - chunk * chunk_size
+            while remaining > 0:
+                block = f.read(min(1024 * 1024, remaining))
+                sha256.update(block)
+                remaining -= len(block)
+
+            if end > start:
+                # IfMatch guarantees every range comes from the same version of the object
+                with self.__transfer_call(transfer_id, chunk + 1):
+                    response = s3.get_object(Bucket=self.naas_bucket, Key=key, Range=f"bytes={start}-{end - 1}", IfMatch=etag)
+                f.seek(start)
+                for block in response['Body'].iter_chunks(1024 * 1024):
+                    f.write(block)
+                    sha256.update(block)
+                    if callback is not None:
+                        callback(len(block))
+        if record_chunk:
+            self.__append_download_state(state_file, {"chunk": chunk, "sha256": sha256.hexdigest()})
+        return sha256.hexdigest()
+
+    def __download_checksum_matches(self, checksum:str, chunk_digests:dict, chunk_count:int)-> bool:
+        # A multipart object checksum is the SHA-256 of its part digests, suffixed by the part count
+        expected = base64.b64decode(checksum.split('-')[0])
+        if chunk_count == 1:
+            return bytes.fromhex(chunk_digests[0]) == expected
+        combined = hashlib.sha256(b''.join(bytes.fromhex(chunk_digests[chunk]) for chunk in range(chunk_count)))
+        return combined.digest() == expected
+
+    def __discard_download(self, part_file:str, state_file:str)-> None:
+        for path in (part_file, state_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __load_download_state(self, state_file:str, part_file:str, etag:str, size:int, chunk_size:int)-> Optional[dict]:
+        # Digests of the chunks completed by a previous download of the same object version, None when there is nothing to resume
+        if not os.path.exists(state_file) or not os.path.exists(part_file):
+            return None
+        chunk_digests = None
+        with open(state_file) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if chunk_digests is None:
+                    if (entry.get("etag"), entry.get("size"), entry.get("chunk_size")) != (etag, size, chunk_size):
+                        return None
+                    chunk_digests = {}
+                elif "chunk" in entry:
+                    chunk_digests[entry["chunk"]] = entry["sha256"]
+        return chunk_digests
+
+    def __append_download_state(self, state_file:str, entry:dict, mode:str='a')-> None:
+        with self.__download_state_lock:
+            with open(state_file, mode) as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def __upload_part(self, s3, src_file:str, key:str, upload_id:str, part_number:int, part_size:int, transfer_id:Optional[int], callback)-> dict:
+        with open(src_file, 'rb') as f:
+            f.seek((part_number - 1) * part_size)
+            body = f.read(part_size)
+        # The part checksum is computed from the bytes already in memory and verified by S3 on receipt
+        checksum = base64.b64encode(hashlib.sha256(body).digest()).decode()
+        with self.__transfer_call(transfer_id, part_number):
+            etag = s3.upload_part(Bucket=self.naas_bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body, ChecksumSHA256=checksum)['ETag']
+        self.upload_journal.add_part(self.naas_bucket, key, part_number, etag, checksum)
+        if callback is not None:
+            callback(len(body))
+        return {"ETag": etag, "ChecksumSHA256": checksum}
+
+    def __list_uploaded_parts(self, s3, key:str, upload_id:str, part_size:int, file_size:int, journaled_checksums:dict)-> Optional[dict]:
+        # The server is the reference for the uploaded parts, None when the upload no longer exists
+        parts = {}
+        list_kwargs = {"Bucket": self.naas_bucket, "Key": key, "UploadId": upload_id}
+        try:
+            while True:
+                page = s3.list_parts(**list_kwargs)
+                for part in page.get("Parts", []):
+                    expected_size = min(part_size, file_size - (part["PartNumber"] - 1) * part_size)
+                    # Parts whose checksum is unknown are sent again, the completed object checksum needs all of them
+                    checksum = part.get("ChecksumSHA256") or journaled_checksums.get(part["PartNumber"])
+                    if part["Size"] == expected_size and checksum:
+                        parts[part["PartNumber"]] = {"ETag": part["ETag"], "ChecksumSHA256": checksum}
+                if not page.get("IsTruncated"):
+                    break
+                list_kwargs["PartNumberMarker"] = page["NextPartNumberMarker"]
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchUpload':
+                self.upload_journal.remove(self.naas_bucket, key)
+                return None
+            raise
+        return parts
+
+    def __abort_multipart_upload(self, s3, key:str, upload_id:str)-> None:
+        try:
+            s3.abort_multipart_upload(Bucket=self.naas_bucket, Key=key, UploadId=upload_id)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'NoSuchUpload':
+                raise
+        upload = self.upload_journal.load(self.naas_bucket, key)
+        if upload is not None and upload["upload_id"] == upload_id:
+            self.upload_journal.remove(self.naas_bucket, key)
+
+    @contextmanager
+    def __track_transfer(self, metrics:Optional[TransferMetrics], key:str, direction:str, total_bytes:Optional[int]):
+        # Yields the id of the transfer and its progress callback, both None when no metrics are collected
+        if metrics is None:
+            yield None, None
+            return
+
+        stats = metrics.start_transfer(key, direction, total_bytes)
+        with self.__active_transfers_lock:
+            transfer_id = next(self.__transfer_ids)
+            self.__active_transfers[transfer_id] = (metrics, stats)
+        try:
+            yield transfer_id, lambda bytes_amount: metrics.add_bytes(stats, bytes_amount)
+        finally:
+            with self.__active_transfers_lock:
+                self.__active_transfers.pop(transfer_id, None)
+            metrics.finish_transfer(stats)
+
+    @contextmanager
+    def __transfer_call(self, transfer_id:Optional[int], part_number:Optional[int] = None):
+        # Requests made by the current thread meanwhile are timed as parts of the transfer
+        self.__current_call.transfer_id, self.__current_call.part_number = transfer_id, part_number
+        try:
+            yield
+        finally:
+            self.__current_call.transfer_id = self.__current_call.part_number = None
+
+    def __before_transfer_call(self, params:dict, model, context:dict, **kwargs)-> None:
+        # Handlers run on the thread making the call
+        transfer_id = getattr(self.__current_call, 'transfer_id', None)
+        if model.name not in ('PutObject', 'UploadPart', 'GetObject') or transfer_id is None:
+            return
+        part_number = params.get('PartNumber') or getattr(self.__current_call, 'part_number', None) or 1
+        context['naas_transfer'] = (transfer_id, part_number, time.monotonic())
+
+    def __after_transfer_call(self, parsed:dict, context:dict, **kwargs)-> None:
+        if 'naas_transfer' not in context:
+            return
+        transfer_id, part_number, started_at = context['naas_transfer']
+        with self.__active_transfers_lock:
+            transfer = self.__active_transfers.get(transfer_id)
+        if transfer is None:
+            return
+        metrics, stats = transfer
+        retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        metrics.add_part(stats, part_number, time.monotonic() - started_at, retries)
     
+    def __object_entry(self, storage_root:str, key:str, content:dict = None)-> dict:
+        # Same shape as the objects listed by the Naas API, keyed relatively to the storage
+        relative_key = key[len(storage_root):]
+        prefix, _, name = relative_key.rstrip("/").rpartition("/")
+        prefix = prefix + "/" if prefix else ""
+
+        if content is None:
+            return {"name": name, "type": "directory", "prefix": prefix, "size": "0", "lastmodified": "", "key": relative_key, "etag": ""}
+        return {
+            "name": name,
+            "type": "file",
+            "prefix": prefix,
+            "size": str(content["Size"]),
+            "lastmodified": content["LastModified"].strftime("%Y-%m-%d %H:%M:%S"),
+            "key": relative_key,
+            "etag": content["ETag"].strip('"'),
+        }
+
+    def __remote_object_matches(self, s3, key:str, checksums:dict)-> bool:
+        try:
+            response = s3.head_object(Bucket=self.naas_bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+        # Prefer the SHA-256 recorded at upload time, the ETag is only comparable for unencrypted uploads
+        remote_sha256 = response.get('Metadata', {}).get('sha256')
+        if remote_sha256:
+            return remote_sha256 == checksums['sha256']
+        return response['ETag'].strip('"') == checksums['etag']
+
     def __clean_path(self, path):
         path = path.replace('"', '')
         path=re.sub(r'/{2,}', '/', path)
@@ -119,54 +753,42 @@ class S3StorageProviderAdaptor(IStorageProviderAdaptor):
         else:
             return False # If AWS_SESSION_EXPIRATION_TOKEN is None it never expire
 
-    def __update_aws_env(self, access_key_id:str, secret_key:str, session_token:str, expiration:str, region_name:str)-> None:
-        self.AWS_ACCESS_KEY_ID = access_key_id
-        self.AWS_SECRET_ACCESS_KEY = secret_key
-        self.AWS_SESSION_TOKEN = session_token
-        self.DEFAULT_REGION = region_name
-        self.AWS_SESSION_EXPIRATION_TOKEN = expiration
-        os.environ['AWS_ACCESS_KEY_ID'] = access_key_id
-        os.environ['AWS_SECRET_ACCESS_KEY'] = secret_key
-        os.environ['AWS_SESSION_TOKEN'] = session_token
-        os.environ['AWS_DEFAULT_REGION'] = region_name
-
-
-    def __read_naas_credentials(self, workspace_id:str, storage_name:str)-> None:
+    def __read_naas_credentials(self, workspace_id:str, storage_name:str)-> dict:
         #TODO new feature: self.__get_active_workspace()
 
-        # do not change setted env variables
-        if not self.AWS_ACCESS_KEY_ID:
-
-            # try read env var from naas_credentials file
-            if os.path.exists(self.naas_credentials):
-                with open(self.naas_credentials, 'r') as file:
-                    json_credentials = json.load(file)
-
-                # get the storages list
-                json_storages = json_credentials.get('storage', {})
-                if workspace_id in json_storages and storage_name in json_storages[workspace_id] and 's3' in json_storages[workspace_id][storage_name]:
-                        json_credentials = json_storages[workspace_id][storage_name]['s3']
-                        region_name = json_credentials.get('REGION_NAME')
-                        access_key_id = json_credentials.get('AWS_ACCESS_KEY_ID')
-                        secret_key = json_credentials.get('AWS_SECRET_ACCESS_KEY')
-                        session_token = json_credentials.get('AWS_SESSION_TOKEN')
-                        expiration = json_credentials.get('AWS_SESSION_EXPIRATION_TOKEN')
-                else :
-                    raise BadCredentials("Credentials Not found. Please generate new credentials.")
+        # credentials set in the environment are used for every storage
+        if self.AWS_ACCESS_KEY_ID:
+            return {
+                "region_name": None,
+                "access_key_id": self.AWS_ACCESS_KEY_ID,
+                "secret_key": self.AWS_SECRET_ACCESS_KEY,
+                "session_token": self.AWS_SESSION_TOKEN,
+                "expiration": None,
+            }
 
-                if self.__s3_token_is_expired(expiration) :
-                    raise ExpiredToken("The provided token has expired. Please generate new credentials.")
-                else :
-                    if access_key_id is not None :
-                        self.__update_aws_env(
-                            region_name=region_name,
-                            access_key_id=access_key_id,
-                            secret_key=secret_key,
-                            session_token=session_token,
-                            expiration=expiration
-                        )
-                    else:
-                        raise BadCredentials("missing information in file, generate new credentials")
+        # try read the storage credentials from naas_credentials file
+        json_storages = {}
+        if os.path.exists(self.naas_credentials):
+            with open(self.naas_credentials, 'r') as file:
+                json_storages = json.load(file).get('storage', {})
+
+        if workspace_id not in json_storages or storage_name not in json_storages[workspace_id] or 's3' not in json_storages[workspace_id][storage_name]:
+            raise BadCredentials("Credentials Not found. Please generate new credentials.")
+
+        json_credentials = json_storages[workspace_id][storage_name]['s3']
+        expiration = json_credentials.get('AWS_SESSION_EXPIRATION_TOKEN')
+        if self.__s3_token_is_expired(expiration) :
+            raise ExpiredToken("The provided token has expired. Please generate new credentials.")
+        if json_credentials.get('AWS_ACCESS_KEY_ID') is None :
+            raise BadCredentials("missing information in file, generate new credentials")
+
+        return {
+            "region_name": json_credentials.get('REGION_NAME'),
+            "access_key_id": json_credentials.get('AWS_ACCESS_KEY_ID'),
+            "secret_key": json_credentials.get('AWS_SECRET_ACCESS_KEY'),
+            "session_token": json_credentials.get('AWS_SESSION_TOKEN'),
+            "expiration": expiration,
+        }
 
     def valid_naas_credentials(self, workspace_id:str, storage_name:str)-> bool:
         # do not change setted env variables
@@ -218,34 +840,31 @@ class S3StorageProviderAdaptor(IStorageProviderAdaptor):
             "expiration": credentials['credentials']['s3']['expiration']
         }
 
-        # write the credentials to the file
-        naas_credentials = os.path.expanduser(self.naas_credentials)
-        existing_data = {}
-
-        if os.path.exists(naas_credentials):
-            with open(naas_credentials, 'r') as f:
-                existing_data = json.load(f)
-
-        # Ensure 'storage' key exists in existing_data
-        if 'storage' not in existing_data:
-            existing_data['storage'] = {}
-
-        # Update the 'storage' key with new credentials
-        existing_data['storage'].update({
-            s3_credentials['workspace_id']: {
-                    s3_credentials['storage_name']: {
-                        s3_credentials["provider"]: {
-                        "REGION_NAME": s3_credentials['region_name'],
-                        "AWS_ACCESS_KEY_ID": s3_credentials['access_key_id'],
-                        "AWS_SECRET_ACCESS_KEY": s3_credentials['secret_key'],
-                        "AWS_SESSION_TOKEN": s3_credentials['session_token'],
-                        "AWS_SESSION_EXPIRATION_TOKEN": s3_credentials['expiration']
+        # write the credentials to the file, keeping the other entries
+        def set_storage_credentials(existing_data: dict):
+            # Ensure 'storage' key exists in existing_data
+            if 'storage' not in existing_data:
+                existing_data['storage'] = {}
+
+            # Update the 'storage' key with new credentials
+            existing_data['storage'].update({
+                s3_credentials['workspace_id']: {
+                        s3_credentials['storage_name']: {
+                            s3_credentials["provider"]: {
+                            "REGION_NAME": s3_credentials['region_name'],
+                            "AWS_ACCESS_KEY_ID": s3_credentials['access_key_id'],
+                            "AWS_SECRET_ACCESS_KEY": s3_credentials['secret_key'],
+                            "AWS_SESSION_TOKEN": s3_credentials['session_token'],
+                            "AWS_SESSION_EXPIRATION_TOKEN": s3_credentials['expiration']
+                        }
                     }
                 }
-            }
-        })
-        with open(naas_credentials, 'w') as f:
-            json.dump(existing_data, f)
+            })
+
+        update_credentials_file(os.path.expanduser(self.naas_credentials), set_storage_credentials)
+        # the next call reads the new credentials
+        with self.__s3_client_lock:
+            self.__storage_credentials.pop((workspace_id, storage_name), None)
         return ("generated s3 credentials.")                
 
     #TODO try improve exception handling                    
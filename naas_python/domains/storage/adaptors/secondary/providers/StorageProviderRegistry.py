@@ -0,0 +1,57 @@
+import importlib
+import threading
+from typing import Iterator, Mapping, Optional
+
+from naas_python.domains.storage.StorageSchema import IStorageProviderAdaptor
+
+# Providers shipped with naas_python, by provider id
+DEFAULT_STORAGE_PROVIDERS = {
+    "s3": "naas_python.domains.storage.adaptors.secondary.providers.S3StorageProviderAdaptor:S3StorageProviderAdaptor",
+    "local": "naas_python.domains.storage.adaptors.secondary.providers.LocalStorageProviderAdaptor:LocalStorageProviderAdaptor",
+}
+
+
+class StorageProviderRegistry(Mapping):
+    """
+    Lazy mapping of provider ids to storage provider adaptors.
+
+    Providers are registered by import path, "module:Class", and only imported
+    and instantiated the first time they are looked up, so that the SDK does
+    not load boto3 until an S3 storage is actually used.
+
+    Attributes:
+        providers (Mapping[str, str], optional): Import paths by provider id,
+            the providers shipped with naas_python by default.
+    """
+
+    def __init__(self, providers: Optional[Mapping[str, str]] = None):
+        self._targets = dict(DEFAULT_STORAGE_PROVIDERS if providers is None else providers)
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def register(self, provider_id: str, target) -> None:
+        """Registers an import path, or an already built adaptor, as `provider_id`"""
+        with self._lock:
+            if isinstance(target, str):
+                self._targets[provider_id] = target
+                self._instances.pop(provider_id, None)
+            else:
+                self._targets[provider_id] = f"{type(target).__module__}:{type(target).__name__}"
+                self._instances[provider_id] = target
+
+    def __getitem__(self, provider_id: str) -> IStorageProviderAdaptor:
+        with self._lock:
+            if provider_id not in self._instances:
+                module_name, _, class_name = self._targets[provider_id].partition(":")
+                provider_class = getattr(importlib.import_module(module_name), class_name)
+                self._instances[provider_id] = provider_class()
+            return self._instances[provider_id]
+
+    def __contains__(self, provider_id) -> bool:
+        return provider_id in self._targets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._targets)
+
+    def __len__(self) -> int:
+        return len(self._targets)
@@ -0,0 +1,50 @@
+import hashlib
+import os
+
+from s3transfer.utils import ChunksizeAdjuster
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def compute_file_checksums(path: str, multipart_threshold: int, multipart_chunksize: int) -> dict:
+    """
+    Compute the checksums of a local file in a single streaming pass.
+
+    Args:
+        path (str): Path of the local file.
+        multipart_threshold (int): Size from which the file is uploaded in several parts.
+        multipart_chunksize (int): Configured size of each uploaded part.
+
+    Returns:
+        dict: The SHA-256 hex digest, under "sha256", and the ETag S3 computes
+        for the file when uploaded with the same transfer settings, under "etag".
+    """
+    file_size = os.path.getsize(path)
+    part_size = ChunksizeAdjuster().adjust_chunksize(multipart_chunksize, file_size)
+
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    part_digests = []
+
+    with open(path, "rb") as f:
+        while True:
+            part_md5 = hashlib.md5()
+            remaining = part_size
+            while remaining > 0:
+                block = f.read(min(READ_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                sha256.update(block)
+                md5.update(block)
+                part_md5.update(block)
+                remaining -= len(block)
+            if remaining == part_size:
+                break
+            part_digests.append(part_md5.digest())
+
+    if file_size < multipart_threshold:
+        etag = md5.hexdigest()
+    else:
+        etag = f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+    return {"sha256": sha256.hexdigest(), "etag": etag}
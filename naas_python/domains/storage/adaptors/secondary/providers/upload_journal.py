@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Iterator, Optional
+
+
+class UploadJournal:
+    """
+    Local journal of the multipart uploads in progress.
+
+    Each upload has its own append-only file: a header line describing the
+    upload (upload id, part size, source file fingerprint) followed by a line
+    per completed part with its ETag and checksum, so that a crashed upload can
+    be resumed by sending only the missing parts. Lines torn by a crash are ignored when reading back.
+
+    Attributes:
+        journal_dir (str): Directory of the journal files, defaults to the
+            `NAAS_STORAGE_UPLOAD_JOURNAL_DIR` environment variable or ~/.naas/uploads.
+    """
+
+    def __init__(self, journal_dir: Optional[str] = None):
+        self.journal_dir = os.path.expanduser(
+            journal_dir
+            or os.environ.get("NAAS_STORAGE_UPLOAD_JOURNAL_DIR")
+            or "~/.naas/uploads"
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(path: str) -> dict:
+        stat = os.stat(path)
+        return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def start(self, bucket: str, key: str, upload_id: str, part_size: int, fingerprint: dict) -> None:
+        header = {
+            "bucket": bucket,
+            "key": key,
+            "upload_id": upload_id,
+            "part_size": part_size,
+            "fingerprint": fingerprint,
+            "created_at": time.time(),
+        }
+        os.makedirs(self.journal_dir, exist_ok=True)
+        with self._lock:
+            self.__write(self.__path(bucket, key), "w", header)
+
+    def add_part(self, bucket: str, key: str, part_number: int, etag: str, checksum: Optional[str] = None) -> None:
+        with self._lock:
+            self.__write(self.__path(bucket, key), "a", {"part_number": part_number, "etag": etag, "checksum": checksum})
+
+    def load(self, bucket: str, key: str) -> Optional[dict]:
+        """Returns the journaled upload of `key`, with the ETags and checksums of its completed parts by number, or None"""
+        path = self.__path(bucket, key)
+        if not os.path.exists(path):
+            return None
+        return self.__read(path)
+
+    def remove(self, bucket: str, key: str) -> None:
+        try:
+            os.remove(self.__path(bucket, key))
+        except OSError:
+            pass
+
+    def uploads(self) -> Iterator[dict]:
+        if not os.path.isdir(self.journal_dir):
+            return
+        for name in sorted(os.listdir(self.journal_dir)):
+            if name.endswith(".jsonl"):
+                upload = self.__read(os.path.join(self.journal_dir, name))
+                if upload is not None:
+                    yield upload
+
+    def __path(self, bucket: str, key: str) -> str:
+        name = hashlib.sha256(f"{bucket}/{key}".encode()).hexdigest()
+        return os.path.join(self.journal_dir, name + ".jsonl")
+
+    def __write(self, path: str, mode: str, entry: dict) -> None:
+        with open(path, mode) as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __read(self, path: str) -> Optional[dict]:
+        upload = None
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if upload is None:
+                    if "upload_id" not in entry:
+                        return None
+                    upload = dict(entry, parts={}, checksums={})
+                elif "part_number" in entry:
+                    upload["parts"][entry["part_number"]] = entry["etag"]
+                    if entry.get("checksum"):
+                        upload["checksums"][entry["part_number"]] = entry["checksum"]
+        return upload
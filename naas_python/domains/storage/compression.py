@@ -0,0 +1,55 @@
+import gzip
+import shutil
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Object metadata entry recording the encoding of compressed uploads
+METADATA_KEY = "compression"
+
+ENCODINGS = ("gzip", "zstd")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            'zstd compression requires the "zstandard" package, install it with `pip install "naas-python[zstd]"`.'
+        )
+    return zstandard
+
+
+def check_available(encoding: str) -> None:
+    """Raises ImportError when the package needed by `encoding` is not installed."""
+    if encoding == "zstd":
+        _zstandard()
+
+
+def compress_file(src_path: str, dst_path: str, encoding: str) -> None:
+    """
+    Stream `src_path` into `dst_path` compressed with `encoding`.
+
+    The output only depends on the input bytes, so that checksums of
+    compressed uploads stay comparable from one upload to the next.
+    """
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        if encoding == "gzip":
+            # No file name nor timestamp in the header
+            with gzip.GzipFile(filename="", mode="wb", fileobj=dst, mtime=0) as gz:
+                shutil.copyfileobj(src, gz, COPY_BUFFER_SIZE)
+        elif encoding == "zstd":
+            _zstandard().ZstdCompressor().copy_stream(src, dst, read_size=COPY_BUFFER_SIZE)
+        else:
+            raise ValueError(f'Unsupported compression "{encoding}", expected one of {", ".join(ENCODINGS)}.')
+
+
+def decompress_file(src_path: str, dst_path: str, encoding: str) -> None:
+    """Stream `src_path`, compressed with `encoding`, decompressed into `dst_path`."""
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        if encoding == "gzip":
+            with gzip.GzipFile(mode="rb", fileobj=src) as gz:
+                shutil.copyfileobj(gz, dst, COPY_BUFFER_SIZE)
+        elif encoding == "zstd":
+            _zstandard().ZstdDecompressor().copy_stream(src, dst, read_size=COPY_BUFFER_SIZE)
+        else:
+            raise ValueError(f'Unsupported compression "{encoding}", expected one of {", ".join(ENCODINGS)}.')
@@ -1,5 +1,7 @@
 from ..adaptors.secondary.NaasStorageAPIAdaptor import NaasStorageAPIAdaptor
-from naas_python.domains.storage.adaptors.secondary.providers.S3StorageProviderAdaptor import S3StorageProviderAdaptor
+from naas_python.domains.storage.adaptors.secondary.providers.StorageProviderRegistry import StorageProviderRegistry
+from ..adaptors.secondary.LocalObjectCache import LocalObjectCache
+from ..adaptors.secondary.SQLiteObjectIndex import SQLiteObjectIndex
 from ..StorageDomain import StorageDomain
 from ..adaptors.primary.TyperStorageAdaptor import TyperStorageAdaptor
 
@@ -8,16 +10,13 @@ import logging
 logging.debug("CliStorageHandler.py : Initializing secondaryAdaptor")
 secondaryAdaptor = NaasStorageAPIAdaptor()
 
-s3 = S3StorageProviderAdaptor()
-#azure = AzureStorageProviderAdaptor()
-
-storage_provider_adaptors = {
-    s3.provider_id: s3,
-    #azure.provider_id: azure,
-}
+# Providers (s3, local, ...) are only imported and built once a storage uses them
+storage_provider_adaptors = StorageProviderRegistry()
 
 logging.debug("CliStorageHandler.py : Initializing domain")
-domain = StorageDomain(secondaryAdaptor, storage_provider_adaptors=storage_provider_adaptors)
+cache = LocalObjectCache()
+index = SQLiteObjectIndex()
+domain = StorageDomain(secondaryAdaptor, storage_provider_adaptors=storage_provider_adaptors, cache=cache, index=index)
 
 logging.debug("CliStorageHandler.py : Initializing primaryAdaptor")
 primaryAdaptor = TyperStorageAdaptor(domain)
\ No newline at end of file
@@ -0,0 +1,137 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+
+@dataclass
+class PartTiming:
+    part_number: int
+    seconds: float
+    retries: int = 0
+
+
+@dataclass
+class TransferStats:
+    """Progress and timings of a single object transfer"""
+
+    key: str
+    direction: str
+    total_bytes: Optional[int] = None
+    transferred_bytes: int = 0
+    retries: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+    parts: List[PartTiming] = field(default_factory=list)
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.transferred_bytes / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def raw(self) -> dict:
+        """Returns the dict representation of the object"""
+        return {
+            "key": self.key,
+            "direction": self.direction,
+            "total_bytes": self.total_bytes,
+            "transferred_bytes": self.transferred_bytes,
+            "seconds": self.elapsed,
+            "bytes_per_second": self.bytes_per_second,
+            "retries": self.retries,
+            "parts": [part.__dict__ for part in self.parts],
+        }
+
+
+class TransferMetrics:
+    """
+    Collects per-transfer and aggregate metrics of storage transfers.
+
+    Pass an instance to the storage upload and download methods, it is updated
+    from the transfer threads as bytes and parts complete.
+
+    Attributes:
+        on_progress (Callable[[TransferStats], None], optional): Called with the
+            updated transfer each time bytes are transferred or a transfer finishes.
+    """
+
+    def __init__(self, on_progress: Optional[Callable[[TransferStats], None]] = None):
+        self.on_progress = on_progress
+        self._transfers: List[TransferStats] = []
+        # Running total, progress callbacks read it on every byte update
+        self._transferred_bytes = 0
+        self._lock = threading.Lock()
+
+    def start_transfer(self, key: str, direction: str, total_bytes: Optional[int] = None) -> TransferStats:
+        stats = TransferStats(key=key, direction=direction, total_bytes=total_bytes)
+        with self._lock:
+            self._transfers.append(stats)
+        self._notify(stats)
+        return stats
+
+    def add_bytes(self, stats: TransferStats, bytes_amount: int) -> None:
+        with self._lock:
+            stats.transferred_bytes += bytes_amount
+            self._transferred_bytes += bytes_amount
+        self._notify(stats)
+
+    def add_part(self, stats: TransferStats, part_number: int, seconds: float, retries: int = 0) -> None:
+        with self._lock:
+            stats.parts.append(PartTiming(part_number=part_number, seconds=seconds, retries=retries))
+            stats.retries += retries
+
+    def finish_transfer(self, stats: TransferStats) -> None:
+        with self._lock:
+            stats.finished_at = time.monotonic()
+        self._notify(stats)
+
+    def _notify(self, stats: TransferStats) -> None:
+        if self.on_progress is not None:
+            self.on_progress(stats)
+
+    @property
+    def transfers(self) -> List[TransferStats]:
+        with self._lock:
+            return list(self._transfers)
+
+    @property
+    def transferred_bytes(self) -> int:
+        return self._transferred_bytes
+
+    @property
+    def retries(self) -> int:
+        return sum(stats.retries for stats in self.transfers)
+
+    @property
+    def elapsed(self) -> float:
+        # Wall time from the first transfer start to the last transfer end
+        transfers = self.transfers
+        if not transfers:
+            return 0.0
+        started_at = min(stats.started_at for stats in transfers)
+        if all(stats.done for stats in transfers):
+            return max(stats.finished_at for stats in transfers) - started_at
+        return time.monotonic() - started_at
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.transferred_bytes / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "transfers": len(self.transfers),
+            "transferred_bytes": self.transferred_bytes,
+            "seconds": self.elapsed,
+            "bytes_per_second": self.bytes_per_second,
+            "retries": self.retries,
+        }
@@ -1 +1,2 @@
-from .Storage import Storage
\ No newline at end of file
+from .Storage import Storage
+from .TransferMetrics import TransferMetrics, TransferStats
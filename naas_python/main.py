@@ -1,7 +1,30 @@
-from naas_python.cli import app
+import os
+import sys
+
+
+def reads_stdin(argv) -> bool:
+    """
+    Whether the command may read the standard input of the client.
+
+    The agent has no terminal and does not receive piped input, so these commands
+    run in-process: the input is piped or redirected, or a "-" argument names stdin.
+    """
+    return not sys.stdin or not sys.stdin.isatty() or "-" in argv
 
 
 def main():
+    # Commands go to the background agent when it runs, and are run in-process otherwise.
+    # Shell completion reads its words from the environment and always runs in-process.
+    argv = sys.argv[1:]
+    if argv[:1] != ["agent"] and "_NAAS_PYTHON_COMPLETE" not in os.environ and not reads_stdin(argv):
+        from naas_python.agent import forward_command
+
+        exit_code = forward_command(argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    from naas_python.cli import app
+
     app()
 
 
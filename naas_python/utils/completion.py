@@ -0,0 +1,162 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import click
+
+from naas_python.utils.filelock import FileLock
+
+# Seconds after which cached names are refreshed in the background
+DEFAULT_TTL = 5 * 60
+
+# Seconds during which a started refresh is not started again
+REFRESH_TIMEOUT = 60
+
+
+class NameCache:
+    """
+    Local cache of remote names (spaces, registries, secrets, storages) used by shell completion.
+
+    Names are stored by kind and scope, e.g. the storages of a workspace, in a
+    single JSON file only readable by the current user. The list commands fill
+    it, and completion refreshes stale entries in the background.
+
+    Attributes:
+        path (str): Path of the cache file.
+        ttl (float): Seconds during which cached names are fresh.
+    """
+
+    def __init__(self, path: str = None, ttl: float = None):
+        self.path = path or os.environ.get("NAAS_COMPLETION_CACHE", os.path.expanduser("~/.naas/completion.json"))
+        self.ttl = ttl if ttl is not None else float(os.environ.get("NAAS_COMPLETION_TTL", DEFAULT_TTL))
+        self._lock = FileLock(self.path + ".lock")
+
+    def lookup(self, kind: str, scope: str = "") -> Tuple[List[str], bool]:
+        """Returns the cached names and whether they are fresh"""
+        entry = self.__read().get(self.__key(kind, scope), {})
+        return entry.get("names", []), time.time() - entry.get("updated_at", 0) < self.ttl
+
+    def remember(self, kind: str, names: Iterable[str], scope: str = "") -> None:
+        """Replaces the cached names with those of a complete listing"""
+        with self._lock:
+            cache = self.__read()
+            cache[self.__key(kind, scope)] = {"names": sorted(set(names)), "updated_at": time.time()}
+            self.__write(cache)
+
+    def add(self, kind: str, name: str, scope: str = "") -> None:
+        self.__update(kind, scope, lambda names: names | {name})
+
+    def discard(self, kind: str, name: str, scope: str = "") -> None:
+        self.__update(kind, scope, lambda names: names - {name})
+
+    def start_refresh(self, kind: str, scope: str = "") -> bool:
+        """Returns whether the caller should refresh the names, False if another refresh is running"""
+        with self._lock:
+            cache = self.__read()
+            entry = cache.setdefault(self.__key(kind, scope), {})
+            if time.time() - entry.get("refreshing_at", 0) < REFRESH_TIMEOUT:
+                return False
+            entry["refreshing_at"] = time.time()
+            self.__write(cache)
+            return True
+
+    def __update(self, kind: str, scope: str, change: Callable[[set], set]) -> None:
+        # Names created or deleted are reflected without waiting for the next listing
+        if not os.path.exists(self.path):
+            return
+        with self._lock:
+            cache = self.__read()
+            entry = cache.get(self.__key(kind, scope))
+            if entry is None or "names" not in entry:
+                return
+            entry["names"] = sorted(change(set(entry["names"])))
+            self.__write(cache)
+
+    def __key(self, kind: str, scope: str) -> str:
+        return f"{kind}/{scope}"
+
+    def __read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def __write(self, cache: dict) -> None:
+        # Readers never see a partially written file
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.path)
+
+
+def remember_names(kind: str, names: Iterable[str], scope: str = "") -> None:
+    """Fills the completion cache from a listing, completion is best effort and never fails a command"""
+    try:
+        NameCache().remember(kind, names, scope)
+    except OSError:
+        pass
+
+
+def add_name(kind: str, name: str, scope: str = "") -> None:
+    try:
+        NameCache().add(kind, name, scope)
+    except OSError:
+        pass
+
+
+def forget_name(kind: str, name: str, scope: str = "") -> None:
+    try:
+        NameCache().discard(kind, name, scope)
+    except OSError:
+        pass
+
+
+def _refresh_in_background(argv: List[str]) -> None:
+    # The list command fills the cache, the completion variables are removed so it runs normally
+    env = {key: value for key, value in os.environ.items() if not (key.startswith("_") and key.endswith("_COMPLETE"))}
+    subprocess.Popen(
+        [sys.executable, "-m", "naas_python.main", *argv],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=env,
+        start_new_session=True,
+    )
+
+
+def name_completer(kind: str, list_command: Callable[[str], List[str]], scope_param: Optional[str] = None) -> Callable:
+    """
+    Returns a Typer autocompletion callback completing names from the local cache.
+
+    Completion never waits for the API: cached names are returned right away,
+    and when they are missing or older than the cache TTL, `list_command(scope)`
+    is run in a background process to refresh them for the next completion.
+
+    Args:
+        kind: Kind of the names, e.g. "secret".
+        list_command: Returns the arguments of the CLI command listing the names of a scope.
+        scope_param: Name of the command parameter scoping the names, e.g. "workspace_id".
+    """
+
+    def complete(ctx: click.Context, incomplete: str) -> List[str]:
+        scope = ""
+        if scope_param is not None:
+            scope = ctx.params.get(scope_param) or ""
+            if not scope:
+                return []
+        try:
+            cache = NameCache()
+            names, fresh = cache.lookup(kind, scope)
+            if not fresh and cache.start_refresh(kind, scope):
+                _refresh_in_background(list_command(scope))
+        except OSError:
+            return []
+        return [name for name in names if name.startswith(incomplete)]
+
+    return complete
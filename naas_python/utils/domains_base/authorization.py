@@ -1,18 +1,24 @@
 import asyncio
+import base64
 import json
 import logging
 import os
-import socket
+import threading
+import time
+import uuid
 import webbrowser
-from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dataclasses import dataclass
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 import requests
 import urllib3
 
+from naas_python.utils.exceptions import NaasException
+from naas_python.utils.filelock import FileLock
+
 # Configure logging
 # logging.basicConfig(
 #     level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -22,6 +28,58 @@ import urllib3
 class TimeoutException(Exception): 
     pass
 
+
+class ExpiredTokenError(NaasException):
+    pass
+
+
+# Seconds before expiry from which JupyterHub-derived tokens are refreshed in the background
+TOKEN_REFRESH_MARGIN = 15 * 60
+
+
+def credentials_lock(credentials_file_path) -> FileLock:
+    """Lock serializing the reads and writes of a credentials file, across processes"""
+    return FileLock(f"{credentials_file_path}.lock")
+
+
+def update_credentials_file(credentials_file_path, update: Callable[[dict], None]) -> dict:
+    """
+    Applies `update` to the contents of a credentials file and writes them back.
+
+    The file holds the CLI token as well as the storage credentials, so only
+    the updated entries change. It is rewritten atomically, only readable by
+    the current user.
+    """
+    credentials_file_path = str(credentials_file_path)
+    os.makedirs(os.path.dirname(credentials_file_path) or ".", exist_ok=True)
+    with credentials_lock(credentials_file_path):
+        try:
+            with open(credentials_file_path, "r") as file:
+                credentials = json.load(file)
+        except (OSError, ValueError):
+            credentials = {}
+        update(credentials)
+        tmp_path = f"{credentials_file_path}.{uuid.uuid4().hex}.tmp"
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as file:
+            file.write(json.dumps(credentials))
+        os.replace(tmp_path, credentials_file_path)
+    return credentials
+
+
+def jwt_expiry(token: str):
+    """
+    Returns the expiry timestamp of a JWT from its `exp` claim, None if it has none.
+
+    The token is only decoded, its signature is checked by the API.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
 @dataclass
 class TokenResponse:
     code: str = None
@@ -105,55 +163,57 @@ class CustomHandler(BaseHTTPRequestHandler):
 
 
 class AuthenticatorBaseServer(ThreadingHTTPServer):
-    data = {}
+    """
+    Local HTTP server receiving the login token POSTed by the browser.
+
+    Requests are served by a background thread, and `_gather_result` returns as
+    soon as the token arrives, or after `timeout` seconds without it. Waiting
+    only involves threads, so it works from scripts, threads and notebooks with
+    a running event loop alike, and `_gather_result_async` awaits it in asyncio.
+    """
+
+    daemon_threads = True
 
     def __init__(self, hostname, port, timeout):
+        self.data = {}
+        self._received = threading.Event()
+        self._serving = None
         super().__init__((hostname, port), CustomHandler)
         self.timeout = timeout
 
     def set_data(self, data: TokenResponse or dict):
-        if isinstance(data, dict):
-            # act as a validator
-            self.data = TokenResponse(**data).raw
-        else:
-            self.data = data.raw
-
-    def handle_timeout(self):
-        self.server_close()
-
-    def handle_timeout(self):
-        """Called if no new request arrives within self.timeout.
-        """
-        raise TimeoutException()
+        try:
+            if isinstance(data, dict):
+                # act as a validator
+                self.data = TokenResponse(**data).raw
+            else:
+                self.data = data.raw
+        except TypeError:
+            self._handle_exception(400, "invalid_request", "Unexpected login response.")
+        finally:
+            self._received.set()
+
+    def start(self):
+        """Serves requests in the background, until the token is gathered"""
+        if self._serving is None:
+            self._serving = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+            self._serving.start()
 
     def _gather_result(self):
-        while not self.data:
-            try:
-                self.handle_request()
-
-                # Sometime, there can be some concurrency issues making the CLI wait for the full timeout while the POST request as
-                # already been handled. So it's waiting for a request that will never happen.
-                # To mitigate this situation, after the first request being handled, which should be a sign that the webapp is actually trying
-                # to send the payload. We are reducing the timeout to 2 seconds as what we should get, in a row is an OPTIONS request followed directly
-                # by the POST request. So 2 seconds should be enough to handle that.
-                self.timeout = 2
-
-            except IOError:
-                self._handle_exception(400, "invalid_request", "IOError")
-                break
-            except TimeoutException as e:
-                if not self.data:
-                    raise e
-                break
-            except Exception as e:
-                self._handle_exception(500, "server_error", "Internal Server Error")
-                break
-
-        if not self.data:
+        self.start()
+        if not self._received.wait(self.timeout):
             self._handle_exception(408, "timeout", "Request timed out.")
-
+        self.shutdown()
         return self.data
 
+    async def _gather_result_async(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self._gather_result)
+
+    def server_close(self):
+        if self._serving is not None and self._serving.is_alive():
+            self.shutdown()
+        super().server_close()
+
     def _handle_exception(self, status, error, error_description):
         # I kept the status here for future API compatibility
         self.data.update(
@@ -193,9 +253,11 @@ class NaasSpaceAuthenticatorAdapter(IAuthenticatorAdapter):
     ):
         self._access_token = None
         self._jwt_token = None
+        # Where the token comes from: "environment", "jupyterhub" or "file"
+        self._token_source = None
+        self._refreshing = threading.Lock()
         self.port = port
         self._server = None
-        # TODO: Fix bug where the async call during dev mode, only finishes after the exact timeout period
         self._timeout = timeout
         self.trade_url = trade_url
         self.trade_jupyterhub_url=trade_jupyterhub_url
@@ -203,80 +265,39 @@ class NaasSpaceAuthenticatorAdapter(IAuthenticatorAdapter):
         self._redirect_uri = None
 
     def _start_http_server(self, start_port) -> AuthenticatorBaseServer:
-        port = start_port
-
+        # The first free port from start_port is used, 0 lets the system pick one
         for port in range(start_port, start_port + 1000):
             try:
                 self._server = AuthenticatorBaseServer(
-                    "0.0.0.0", self.port, timeout=self._timeout
+                    "0.0.0.0", port, timeout=self._timeout
                 )
-                logging.debug(f"HTTP server started on port {self.port}.")
-                self._redirect_uri = f"http://localhost:{port}"
-                break
-            except socket.error:
+            except OSError:
                 continue
-            except Exception as e:
-                print(e)
-                break
-
-        if self._redirect_uri is None:
-            logging.debug("No available ports found.")
-            return None
-
-        if not self._server:
-            logging.debug("Failed to start HTTP server.")
-            return None
-        else:
+            port = self._server.server_address[1]
+            logging.debug(f"HTTP server started on port {port}.")
+            self._redirect_uri = f"http://localhost:{port}"
             return self._server
 
+        logging.debug("No available ports found.")
+        return None
+
     # This method is intended for use in mock testing only, not for production.
     def _handle_mock_post(self, data: dict):
         """
         Replicates the behavior of an external agent by submitting a POST request to the server.
 
         :param data: A dictionary containing data to be sent in the request.
-        :return: The response from the server.
+        :return: The data gathered by the server.
         """
-        try:
-            # Define a function for sending the POST request asynchronously
-            async def send_post_request():
-                try:
-                    # Create a connection pool using urllib3
-                    with urllib3.PoolManager() as http:
-                        response = http.request(
-                            "POST",
-                            self._redirect_uri,
-                            body=json.dumps(data),
-                        )
-                        post_result = response.data
-                    return post_result
-                except Exception as e:
-                    raise e
-
-            # Create a ThreadPoolExecutor to run _gather_results in a separate thread
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                loop = asyncio.get_event_loop()
-
-                # Use asyncio to run _gather_results in a separate thread
-                _gather_results_future = loop.run_in_executor(
-                    executor, self._server._gather_result
-                )
-
-                # Asynchronously send the POST request
-                post_result = loop.run_until_complete(send_post_request())
-
-                assert (
-                    post_result
-                    == b"Authentication process has been successfully completed."
-                )
-
-                # Wait for _gather_results to complete
-                _gather_result = loop.run_until_complete(_gather_results_future)
-
-                return _gather_result
-        except Exception as e:
-            # Handle exceptions or log errors as needed
-            return f"Error: {str(e)}"
+        self._server.start()
+        with urllib3.PoolManager() as http:
+            http.request(
+                "POST",
+                self._redirect_uri,
+                body=json.dumps(data),
+                headers={"Content-Type": "application/json"},
+            )
+        return self._server._gather_result()
 
     def _parse_login_response(self, response):
         if response.get("error"):
@@ -291,8 +312,13 @@ class NaasSpaceAuthenticatorAdapter(IAuthenticatorAdapter):
 
     def _request_token(self):
         # Get the access token from the NaaS authentication service
-        with self._start_http_server(self.port) as server:
-            # response = server._gather_result()
+        server = self._start_http_server(self.port)
+        if server is None:
+            raise Exception(f"Unable to start the login server, no port available from {self.port}.")
+
+        with server:
+            # Requests are served as soon as the browser sends them
+            server.start()
 
             _environment_mode = os.getenv("NAAS_ENVIRONMENT_MODE", "production")
             if _environment_mode == "production":
@@ -303,8 +329,6 @@ class NaasSpaceAuthenticatorAdapter(IAuthenticatorAdapter):
                     #return None
                 response = server._gather_result()
 
-
-
             else:
                 # In a non-production environment (test), send a mock POST request
                 logging.debug(
@@ -351,7 +375,7 @@ class NaasSpaceAuthenticatorAdapter(IAuthenticatorAdapter):
         return credentials
 
     def _gather_file_credentials(self, credentials_file_path: Path):
-        with open(credentials_file_path, "r") as file:
+        with credentials_lock(credentials_file_path), open(credentials_file_path, "r") as file:
             self._file_contents = file.read()
             # If file is "encoded/encrypted" run decoding/decryption process
             # ...
@@ -369,11 +393,15 @@ class NaasSpaceAuthenticatorAdapter(IAuthenticatorAdapter):
             self._jwt_token = access_token
             
         try:
-            # Create target directory in case it does not exists.
-            os.makedirs(os.path.join(os.path.dirname(credentials_file_path)), exist_ok=True)
+            def set_token(credentials: dict):
+                # The storage credentials saved in the same file are kept
+                credentials["jwt_token"] = access_token
+                if jupyterhub_access_token is not None:
+                    credentials["source"] = "jupyterhub"
+                else:
+                    credentials.pop("source", None)
 
-            with open(credentials_file_path, "w") as file:
-                file.write(json.dumps({"jwt_token": access_token}))
+            update_credentials_file(credentials_file_path, set_token)
 
             if prompt:
                 print(f'\n\t✅ CLI Token successfuly generated and stored to {credentials_file_path.as_posix()}\n\n')
@@ -389,27 +417,101 @@ class NaasSpaceAuthenticatorAdapter(IAuthenticatorAdapter):
 
         credentials_path = Path(os.path.expanduser("~/.naas/credentials"))
         _var_credentials = self._gather_env_credentials()
-        
+
         # look for the existence of overriding environment variable to create the new file
         if "jwt_token" in _var_credentials:
-            # Validate stored token is valid... then assign value and return
             self._jwt_token = _var_credentials["jwt_token"]
-            return self._jwt_token
-        
+            self._token_source = "environment"
+
         elif "jupyterhub_api_token" in _var_credentials:
-            access_token = _var_credentials["jupyterhub_api_token"]
-            self._generate_credential_file(credentials_file_path=credentials_path, jupyterhub_access_token=access_token, prompt=False)
-            
+            self._token_source = "jupyterhub"
+            # A token traded earlier from JupyterHub is reused until it expires
+            credentials = self.__stored_credentials(credentials_path)
+            if credentials.get("source") == "jupyterhub" and not self.__expires_within(credentials.get("jwt_token"), 0):
+                self._jwt_token = credentials["jwt_token"]
+            else:
+                self._refresh_jupyterhub_token(credentials_path)
+
         elif credentials_path.exists() and credentials_path.is_file():
             # Check the file contents and grab the token
             credentials = self._gather_file_credentials(credentials_path)
             logging.debug(f"Credentials file found and not empty.")
             # credentials.update(self._gather_env_credentials())
             self._jwt_token = credentials["jwt_token"]
-            
-        else :   
+            self._token_source = "file"
+
+        else :
             # We could not find any credentials, so we need to start the authentication process
             self._generate_credential_file(credentials_file_path=credentials_path)
+            self._token_source = "file"
+
+        self._check_token_expiry()
+        return self._jwt_token
+
+    def _check_token_expiry(self):
+        # Expired tokens fail here instead of after a round trip to the API
+        expires_at = jwt_expiry(self._jwt_token)
+        if expires_at is None:
+            return
+
+        if self._token_source == "jupyterhub":
+            if expires_at <= time.time():
+                self._refresh_jupyterhub_token()
+            elif expires_at - time.time() < TOKEN_REFRESH_MARGIN and self._refreshing.acquire(blocking=False):
+                threading.Thread(target=self.__refresh_in_background, daemon=True).start()
+            return
+
+        if expires_at <= time.time():
+            expired_on = datetime.fromtimestamp(expires_at).strftime("%Y-%m-%d %H:%M:%S")
+            if self._token_source == "environment":
+                raise ExpiredTokenError(
+                    f"The token of NAAS_CREDENTIALS_JWT_TOKEN expired on {expired_on}. Please set a new token."
+                )
+            credentials_path = os.path.expanduser("~/.naas/credentials")
+            raise ExpiredTokenError(
+                f"Your CLI token expired on {expired_on}. Please delete {credentials_path} and run the command again to log in."
+            )
+
+    def _refresh_jupyterhub_token(self, credentials_path: Path = None):
+        credentials_path = credentials_path or Path(os.path.expanduser("~/.naas/credentials"))
+        try:
+            self._generate_credential_file(
+                credentials_file_path=credentials_path,
+                jupyterhub_access_token=os.environ["JUPYTERHUB_API_TOKEN"],
+                prompt=False,
+            )
+        except Exception as e:
+            raise ExpiredTokenError(
+                "Unable to refresh your token from JupyterHub. Please restart your JupyterHub server, or set NAAS_CREDENTIALS_JWT_TOKEN.",
+                e,
+            )
+
+    def __refresh_in_background(self):
+        try:
+            # Another process may have refreshed the token already
+            credentials_path = Path(os.path.expanduser("~/.naas/credentials"))
+            credentials = self.__stored_credentials(credentials_path)
+            if credentials.get("source") == "jupyterhub" and not self.__expires_within(credentials.get("jwt_token"), TOKEN_REFRESH_MARGIN):
+                self._jwt_token = credentials["jwt_token"]
+            else:
+                self._refresh_jupyterhub_token(credentials_path)
+            logging.debug("JupyterHub token refreshed ahead of expiry.")
+        except Exception as e:
+            # The token is still valid, the refresh is tried again on next use
+            logging.debug(f"Background token refresh failed: {e}")
+        finally:
+            self._refreshing.release()
+
+    def __stored_credentials(self, credentials_path: Path) -> dict:
+        try:
+            return self._gather_file_credentials(credentials_path)
+        except (OSError, ValueError):
+            return {}
+
+    def __expires_within(self, token, seconds) -> bool:
+        # Tokens without a readable expiry are considered expired
+        expires_at = jwt_expiry(token)
+        return expires_at is None or expires_at - time.time() <= seconds
 
     def trade_for_long_lived_token(self, access_token, access_token_type="workspace"):
         if access_token_type == "workspace":
@@ -432,4 +534,7 @@ class NaasSpaceAuthenticatorAdapter(IAuthenticatorAdapter):
     def jwt_token(self):
         if not self._jwt_token:
             self.check_credentials()
+        else:
+            # Long-running processes keep the token, its expiry is checked on every use
+            self._check_token_expiry()
         return self._jwt_token
@@ -0,0 +1,76 @@
+import os
+import threading
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """
+    Cross-process advisory lock backed by a lock file.
+
+    The lock is exclusive and blocking, for other processes as well as for
+    other threads sharing the instance. It can be used as a context manager
+    and is released automatically when the owning process exits. Its holder
+    may remove the lock file before releasing it.
+
+    Attributes:
+        path (str): Path of the lock file, created on first acquisition.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._thread_lock = threading.Lock()
+
+    def acquire(self) -> None:
+        self._thread_lock.acquire()
+        try:
+            self._fd = self.__lock_file()
+        except Exception:
+            self._thread_lock.release()
+            raise
+
+    def __lock_file(self) -> int:
+        while True:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.name == "nt":
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    # The previous holder may have removed the lock file, the lock is then taken on the new one
+                    try:
+                        if os.fstat(fd).st_ino != os.stat(self.path).st_ino:
+                            os.close(fd)
+                            continue
+                    except FileNotFoundError:
+                        os.close(fd)
+                        continue
+            except Exception:
+                os.close(fd)
+                raise
+            return fd
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            if os.name == "nt":
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -1,12 +1,32 @@
+import atexit
 import logging
 import os
-from datetime import datetime
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
 from rich.logging import RichHandler
 
+LOG_FILENAME = "naas_python.log"
 
-def initialize_logging(logging_dir: Path = None, persistent_max: int = 3):
+# Size from which the log file is rotated
+LOG_MAX_BYTES = 5 * 1024 * 1024
+
+_listener = None
+
+
+class _DeferredRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler only creating its directory and file once a record is written"""
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def initialize_logging(logging_dir: Path = None, persistent_max: int = 3, max_bytes: int = LOG_MAX_BYTES):
     # Create a logger
     logger = logging.getLogger("naas_python")
     logger.setLevel(logging.DEBUG)
@@ -21,37 +41,44 @@ def initialize_logging(logging_dir: Path = None, persistent_max: int = 3):
     # Add the rich handler to the logger
     logger.addHandler(rich_handler)
 
-    # Create a file handler if a logging directory is specified
+    # Log to a rotating file in the logging directory, cwd/.logs by default.
+    # All processes share that file, and rotation is not safe across processes: when several CLI processes,
+    # the agent or notebooks log to the same directory, one of them may rotate the file while others still
+    # write to it, and records can end up in a backup or be lost around the rotation. Set
+    # NAAS_PYTHON_LOGGING_DIR to a directory per process when complete logs matter.
     if logging_dir is None:
         logging_dir = os.environ.get("NAAS_PYTHON_LOGGING_DIR", Path.cwd() / ".logs")
-    logging_dir.mkdir(parents=True, exist_ok=True)
-
-    filename = f'{datetime.now().strftime("%Y-%m-%d_%H-%M-%S")}.log'
-    file_handler = logging.FileHandler(filename=logging_dir / filename)
+    file_handler = _DeferredRotatingFileHandler(
+        filename=Path(logging_dir) / LOG_FILENAME,
+        maxBytes=max_bytes,
+        backupCount=persistent_max,
+    )
     file_handler.setLevel(logging.DEBUG)
 
     # Update the formatter
     formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s - %(message)s")
 
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
 
-    # Remove precedent log files
-    _remove_precedent_log_files(log_dir=logging_dir, lof_max=persistent_max)
+    # Records are written to the file from a background thread, so that logging never waits on the disk
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    logger.addHandler(QueueHandler(log_queue))
 
     return logger
 
 
-def _remove_precedent_log_files(log_dir: Path, lof_max: int = 3):
-    # Remove precedent log files if they exceed the maximum allowed
-    log_files = list(log_dir.glob("*.log"))
-
-    if len(log_files) > lof_max:
-        log_files.sort(key=os.path.getmtime)
-        for i in range(len(log_files) - lof_max):
-            log_file = log_files[i]
-            if log_file.exists():
-                try:
-                    log_file.unlink()  # Remove the file
-                except Exception as e:
-                    logging.error(f"Failed to remove log file {log_file}: {e}")
+def shutdown_logging():
+    """Writes the queued records and detaches the handlers set up by `initialize_logging`"""
+    global _listener
+    logger = logging.getLogger("naas_python")
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
@@ -0,0 +1,106 @@
+import csv
+import json
+import sys
+from collections import deque
+from enum import Enum
+from itertools import islice
+from typing import Iterable, List, Optional, TextIO
+
+
+class OutputFormat(str, Enum):
+    """Output formats of the list commands"""
+
+    table = "table"
+    jsonl = "jsonl"
+    csv = "csv"
+
+
+FORMATS = tuple(output_format.value for output_format in OutputFormat)
+
+# Rows read before printing a table, to size its columns
+DEFAULT_SAMPLE_SIZE = 100
+
+# Widest a table column gets, longer values are cut
+DEFAULT_MAX_WIDTH = 60
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _cut(text: str, width: int) -> str:
+    return text if len(text) <= width else text[: width - 1] + "…"
+
+
+def render_rows(
+    rows: Iterable[dict],
+    output_format: str = "table",
+    columns: Optional[List[str]] = None,
+    file: Optional[TextIO] = None,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    max_width: int = DEFAULT_MAX_WIDTH,
+) -> int:
+    """
+    Prints rows as they come, holding at most `sample_size` of them in memory.
+
+    Args:
+        rows: Rows to print, any iterable of dicts, including a lazy listing.
+        output_format: "table" for aligned columns sized from the first rows,
+            "jsonl" for one JSON object per line, "csv" for a CSV with a header.
+        columns: Keys to print, in order, those of the first row by default.
+        file: Stream to print to, the standard output by default.
+        sample_size: Number of rows the table columns are sized from.
+        max_width: Width above which table values are cut, except in the last column.
+
+    Returns:
+        int: The number of rows printed, nothing is printed when there are none.
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {', '.join(FORMATS)}")
+    file = file or sys.stdout
+    rows = iter(rows)
+
+    if output_format == "jsonl":
+        count = 0
+        for row in rows:
+            row = row if columns is None else {column: row.get(column) for column in columns}
+            file.write(json.dumps(row, default=str) + "\n")
+            count += 1
+        return count
+
+    sample = deque(islice(rows, sample_size if output_format == "table" else 1))
+    if not sample:
+        return 0
+    columns = columns or list(sample[0].keys())
+
+    if output_format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        count = 0
+        for row in _chain(sample, rows):
+            writer.writerow([_text(row.get(column)) for column in columns])
+            count += 1
+        return count
+
+    widths = [
+        min(max_width, max(len(column), *(len(_text(row.get(column))) for row in sample)))
+        for column in columns
+    ]
+
+    def line(values: List[str]) -> str:
+        cells = [f"{_cut(value, width):<{width}}" for value, width in zip(values[:-1], widths)]
+        return "  ".join(cells + values[-1:]).rstrip() + "\n"
+
+    file.write(line([column.upper() for column in columns]))
+    count = 0
+    for row in _chain(sample, rows):
+        file.write(line([_text(row.get(column)) for column in columns]))
+        count += 1
+    return count
+
+
+def _chain(sample: deque, rows: Iterable[dict]) -> Iterable[dict]:
+    # The sampled rows are released as they are printed
+    while sample:
+        yield sample.popleft()
+    yield from rows
@@ -0,0 +1,194 @@
+"""
+Import time and CLI cold-start benchmark, with time budgets.
+
+Measures, each in a fresh interpreter:
+    - `import naas_python`, budgeted on its own -X importtime cumulative time,
+    - `naas-python --help` and the `--help` of every domain group,
+    - `naas-python secret list` against a local stand-in of the Naas API.
+
+The median wall time of each case is compared with its budget, and the modules
+taking the most time to import are reported with it. The JSON report is written
+to --output (stdout by default), and the run fails when a case fails or exceeds
+its budget.
+
+    python tests/benchmarks/startup.py --repeat 5 --output startup.json
+    python tests/benchmarks/startup.py --budget import=30 --budget help:storage=400
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DOMAINS = ("space", "registry", "secret", "asset", "storage")
+
+# Budgets in milliseconds, by case name
+DEFAULT_BUDGETS = {
+    "import": 50,
+    "help": 500,
+    **{f"help:{domain}": 1000 for domain in DOMAINS},
+    "command:secret-list": 1500,
+}
+
+# Number of modules reported in the breakdown of each case
+TOP_MODULES = 15
+
+
+class NaasAPIStandIn(BaseHTTPRequestHandler):
+    """Answers the health probe and the secret listing of the Naas API"""
+
+    secrets = [{"name": f"SECRET_{i}", "value": "benchmark"} for i in range(50)]
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "":
+            self.__reply(200, {"status": "ok"})
+        elif self.path.rstrip("/") == "/secret":
+            self.__reply(200, {"secrets": self.secrets})
+        else:
+            self.__reply(404, {"error": f"{self.path} is not served by the stand-in"})
+
+    def log_message(self, format, *args):
+        pass
+
+    def __reply(self, status: int, body: dict):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+@contextmanager
+def api_stand_in() -> Iterator[str]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NaasAPIStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def parse_import_times(stderr: str) -> List[dict]:
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            modules.append({"module": module.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return modules
+
+
+def run_case(name: str, args: List[str], env: dict, cwd: str, repeat: int, budget_ms: Optional[float]) -> dict:
+    command = [sys.executable, *args]
+    seconds, returncode, error = [], 0, None
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = subprocess.run(command, env=env, cwd=cwd, capture_output=True, text=True)
+        seconds.append(time.perf_counter() - started_at)
+        if result.returncode != 0:
+            returncode, error = result.returncode, result.stderr.strip().splitlines()[-1:] or [""]
+
+    # One more run, with -X importtime, to see where the time goes
+    profiled = subprocess.run([sys.executable, "-X", "importtime", *args], env=env, cwd=cwd, capture_output=True, text=True)
+    modules = parse_import_times(profiled.stderr)
+
+    median_ms = statistics.median(seconds) * 1000
+    case = {
+        "name": name,
+        "command": " ".join(args),
+        "wall_ms": [round(s * 1000, 1) for s in seconds],
+        "median_ms": round(median_ms, 1),
+        "import_ms": round(sum(module["self_ms"] for module in modules), 1),
+        "budget_ms": budget_ms,
+        "returncode": returncode,
+        "error": error[0] if error else None,
+        "top_modules": sorted(modules, key=lambda module: module["self_ms"], reverse=True)[:TOP_MODULES],
+    }
+    # The import case is budgeted on the import of the package itself, not the interpreter start-up
+    if name == "import":
+        measured_ms = next((module["cumulative_ms"] for module in modules if module["module"] == "naas_python"), median_ms)
+        case["package_import_ms"] = measured_ms
+    else:
+        measured_ms = median_ms
+    case["over_budget"] = budget_ms is not None and measured_ms > budget_ms
+    return case
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the naas_python import time and CLI cold start.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each case, the median is reported")
+    parser.add_argument("--budget", action="append", default=[], metavar="CASE=MS", help="Overrides the budget of a case, e.g. help:storage=400")
+    parser.add_argument("--budget-file", help="JSON file of budgets in milliseconds, by case name")
+    parser.add_argument("--output", help="File the JSON report is written to, stdout by default")
+    args = parser.parse_args(argv)
+
+    budgets = dict(DEFAULT_BUDGETS)
+    if args.budget_file:
+        with open(args.budget_file) as f:
+            budgets.update(json.load(f))
+    for budget in args.budget:
+        name, _, value = budget.partition("=")
+        budgets[name] = float(value)
+
+    cases = [
+        ("import", ["-c", "import naas_python"]),
+        ("help", ["-m", "naas_python.main", "--help"]),
+        *((f"help:{domain}", ["-m", "naas_python.main", domain, "--help"]) for domain in DOMAINS),
+        ("command:secret-list", ["-m", "naas_python.main", "secret", "list"]),
+    ]
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "cases": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="naas-startup-") as home, api_stand_in() as api_url:
+        # An empty home and a token in the environment, so that no command reads the user's credentials
+        env = dict(
+            os.environ,
+            HOME=home,
+            PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get("PYTHONPATH")])),
+            NAAS_PYTHON_API_BASE_URL=api_url,
+            NAAS_CREDENTIALS_JWT_TOKEN="benchmark",
+            NAAS_PYTHON_LOGGING_DIR=os.path.join(home, "logs"),
+        )
+        for name, case_args in cases:
+            case = run_case(name, case_args, env, home, args.repeat, budgets.get(name))
+            report["cases"].append(case)
+            status = "FAILED" if case["returncode"] else "OVER BUDGET" if case["over_budget"] else "ok"
+            print(f"{name:<22} {case['median_ms']:8.1f} ms (imports {case['import_ms']:7.1f} ms, budget {case['budget_ms']}) {status}", file=sys.stderr)
+
+    report["finished_at"] = datetime.now(timezone.utc).isoformat()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    failed = [case for case in report["cases"] if case["returncode"] or case["over_budget"]]
+    for case in failed:
+        reason = f"exited with {case['returncode']}: {case['error']}" if case["returncode"] else f"took longer than {case['budget_ms']} ms"
+        print(f"{case['name']} {reason}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
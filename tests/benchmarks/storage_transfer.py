@@ -0,0 +1,257 @@
+"""
+Upload and download throughput of the S3 storage provider, against a local S3 stand-in.
+
+Every combination of object size, part size and concurrency is uploaded and
+downloaded through `S3StorageProviderAdaptor`, and the timings are written as
+JSON. Part size and concurrency only change multipart transfers, so objects
+smaller than a part size are measured once per concurrency.
+
+The stand-in is, in order of preference:
+    - the server at --endpoint-url (or AWS_ENDPOINT_URL), e.g. `moto_server -p 5000` or MinIO,
+    - a moto server started on a free port, when moto[server] is installed,
+    - moto's in-process mock, which skips the network and only measures the client side.
+
+    python tests/benchmarks/storage_transfer.py --sizes 1KB,8MB,64MB --concurrency 1,8 --output bench.json
+    python tests/benchmarks/storage_transfer.py --baseline bench.json --max-regression 0.2
+
+With --baseline, the run fails when a measurement is slower than the same one in
+the baseline by more than --max-regression.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+
+UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+DEFAULT_SIZES = "1KB,1MB,16MB,128MB,1GB,5GB"
+DEFAULT_PART_SIZES = "8MB,64MB"
+DEFAULT_CONCURRENCY = "1,4,10"
+
+WORKSPACE_ID = "benchmark"
+STORAGE_NAME = "transfers"
+
+# Source files are written from this block, random so that nothing on the way compresses them
+WRITE_BLOCK_SIZE = 4 * 1024**2
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper()
+    for unit in sorted(UNITS, key=len, reverse=True):
+        if value.endswith(unit):
+            return int(float(value[: -len(unit)]) * UNITS[unit])
+    return int(value)
+
+
+def format_size(size: int) -> str:
+    for unit in ("GB", "MB", "KB"):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+def parse_list(value: str, parse=int) -> List[int]:
+    return [parse(item) for item in value.split(",") if item.strip()]
+
+
+@contextmanager
+def s3_stand_in(endpoint_url: Optional[str]) -> Iterator[dict]:
+    # Fake credentials, only the stand-in ever sees them
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    endpoint_url = endpoint_url or os.environ.get("AWS_ENDPOINT_URL")
+    if endpoint_url:
+        os.environ["AWS_ENDPOINT_URL"] = endpoint_url
+        yield {"backend": "external", "endpoint_url": endpoint_url}
+        return
+
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        ThreadedMotoServer = None
+
+    if ThreadedMotoServer is not None:
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+        server.start()
+        host, port = server.get_host_and_port()
+        os.environ["AWS_ENDPOINT_URL"] = f"http://{host}:{port}"
+        try:
+            yield {"backend": "moto-server", "endpoint_url": os.environ["AWS_ENDPOINT_URL"]}
+        finally:
+            server.stop()
+        return
+
+    from moto import mock_aws
+
+    print("moto[server] is not installed, measuring against the in-process mock.", file=sys.stderr)
+    with mock_aws():
+        yield {"backend": "moto-in-process", "endpoint_url": None}
+
+
+def write_source_file(path: str, size: int) -> None:
+    block = os.urandom(min(size, WRITE_BLOCK_SIZE))
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            chunk = block[:remaining]
+            f.write(chunk)
+            remaining -= len(chunk)
+
+
+def measure(transfer, repeat: int) -> dict:
+    from naas_python.domains.storage.models import TransferMetrics
+
+    seconds, retries, parts = [], 0, 0
+    for _ in range(repeat):
+        metrics = TransferMetrics()
+        started_at = time.perf_counter()
+        transfer(metrics)
+        seconds.append(time.perf_counter() - started_at)
+        retries += metrics.retries
+        parts = max(len(stats.parts) for stats in metrics.transfers) if metrics.transfers else 0
+    return {"seconds": seconds, "median_seconds": statistics.median(seconds), "retries": retries, "parts": parts}
+
+
+def run(args) -> dict:
+    sizes = parse_list(args.sizes, parse_size)
+    part_sizes = parse_list(args.part_sizes, parse_size)
+    concurrency_levels = parse_list(args.concurrency)
+
+    work_dir = tempfile.mkdtemp(prefix="naas-bench-", dir=args.work_dir)
+    # Journals and credentials of the benchmark never touch the user's ~/.naas
+    os.environ["NAAS_STORAGE_UPLOAD_JOURNAL_DIR"] = os.path.join(work_dir, "journal")
+
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from naas_python.domains.storage.adaptors.secondary.providers.S3StorageProviderAdaptor import (
+        S3StorageProviderAdaptor,
+    )
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "boto3": boto3.__version__,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": [],
+    }
+    try:
+        with s3_stand_in(args.endpoint_url) as stand_in:
+            report.update(stand_in)
+            s3 = boto3.client("s3")
+            s3.create_bucket(Bucket=args.bucket)
+            provider = S3StorageProviderAdaptor()
+            provider.naas_bucket = args.bucket
+
+            for size in sizes:
+                src_file = os.path.join(work_dir, f"object-{format_size(size)}.bin")
+                write_source_file(src_file, size)
+                measured_single_part = set()
+
+                for part_size in part_sizes:
+                    for concurrency in concurrency_levels:
+                        if size < part_size:
+                            # Single request transfers, the same whatever the part size
+                            if concurrency in measured_single_part:
+                                continue
+                            measured_single_part.add(concurrency)
+
+                        provider.transfer_config = TransferConfig(
+                            multipart_threshold=part_size,
+                            multipart_chunksize=part_size,
+                            max_concurrency=concurrency,
+                        )
+                        key = f"{format_size(size)}/{format_size(part_size)}-{concurrency}.bin"
+                        dst_file = os.path.join(work_dir, "download")
+                        case = {"size": size, "part_size": part_size, "concurrency": concurrency, "multipart": size >= part_size}
+
+                        for operation, transfer in (
+                            ("upload", lambda metrics: provider.post_workspace_storage_object(WORKSPACE_ID, STORAGE_NAME, src_file, key, metrics=metrics)),
+                            ("download", lambda metrics: provider.get_workspace_storage_object(WORKSPACE_ID, STORAGE_NAME, key, dst_file, metrics=metrics)),
+                        ):
+                            result = dict(case, operation=operation, **measure(transfer, args.repeat))
+                            result["mib_per_second"] = size / UNITS["MB"] / result["median_seconds"] if result["median_seconds"] > 0 else 0.0
+                            report["results"].append(result)
+                            print(
+                                f"{operation:<8} {format_size(size):>6} part {format_size(part_size):>5} x{concurrency:<3} "
+                                f"{result['mib_per_second']:10.1f} MiB/s",
+                                file=sys.stderr,
+                            )
+
+                        os.remove(dst_file)
+                        provider.delete_workspace_storage_objects(WORKSPACE_ID, STORAGE_NAME, [key])
+                os.remove(src_file)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report["finished_at"] = datetime.now(timezone.utc).isoformat()
+    return report
+
+
+def compare(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Returns the measurements slower than the baseline by more than `max_regression`"""
+    def case_key(result: dict) -> tuple:
+        return (result["operation"], result["size"], result["part_size"], result["concurrency"])
+
+    baseline_results = {case_key(result): result for result in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        previous = baseline_results.get(case_key(result))
+        if previous is None or previous["mib_per_second"] <= 0:
+            continue
+        change = result["mib_per_second"] / previous["mib_per_second"] - 1
+        result["baseline_mib_per_second"] = previous["mib_per_second"]
+        if change < -max_regression:
+            regressions.append(
+                f"{result['operation']} {format_size(result['size'])} part {format_size(result['part_size'])} "
+                f"x{result['concurrency']}: {previous['mib_per_second']:.1f} -> {result['mib_per_second']:.1f} MiB/s ({change:+.0%})"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark storage uploads and downloads against a local S3 stand-in.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Object sizes, default {DEFAULT_SIZES}")
+    parser.add_argument("--part-sizes", default=DEFAULT_PART_SIZES, help=f"Multipart part sizes, default {DEFAULT_PART_SIZES}")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help=f"Parts transferred concurrently, default {DEFAULT_CONCURRENCY}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each measurement, the median is reported")
+    parser.add_argument("--endpoint-url", help="S3 compatible server to benchmark against, instead of starting moto")
+    parser.add_argument("--bucket", default="naas-benchmark", help="Bucket created for the benchmark")
+    parser.add_argument("--work-dir", help="Directory of the temporary source and downloaded files")
+    parser.add_argument("--output", help="File the JSON report is written to, stdout by default")
+    parser.add_argument("--baseline", help="Previous JSON report to compare the throughputs with")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Tolerated throughput loss against the baseline, 0.2 for 20%%")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        report["regressions"] = regressions
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import io
+import os
+import sys
+import threading
+
+import click
+import pytest
+
+from naas_python.agent import forward_command, ping
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="The agent listens on a Unix socket")
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    from naas_python.agent.server import AgentServer
+
+    monkeypatch.setenv("NAAS_AGENT_SOCKET", str(tmp_path / "agent.sock"))
+    commands = []
+
+    def runner(argv, stdout, stderr, stdin):
+        commands.append((argv, os.getcwd()))
+        print(f"ran {' '.join(argv)}")
+        stderr.write("warning\n")
+        return 3
+
+    server = AgentServer(idle_timeout=60, runner=runner)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True)
+    thread.start()
+    yield commands
+    server.shutdown()
+    server.server_close()
+
+
+def test_commands_are_forwarded_to_the_agent(agent, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stdout, stderr = io.StringIO(), io.StringIO()
+
+    assert forward_command(["secret", "list"], stdout=stdout, stderr=stderr) == 3
+    assert (stdout.getvalue(), stderr.getvalue()) == ("ran secret list\n", "warning\n")
+    assert agent == [(["secret", "list"], str(tmp_path))]
+    assert ping()["commands"] == 1
+
+    # Commands depending on another environment run in-process
+    monkeypatch.setenv("NAAS_PYTHON_API_BASE_URL", "http://localhost:1")
+    assert forward_command(["secret", "list"], stdout=stdout, stderr=stderr) is None
+    assert len(agent) == 1
+
+
+def test_commands_run_in_process_without_agent(tmp_path, monkeypatch):
+    monkeypatch.setenv("NAAS_AGENT_SOCKET", str(tmp_path / "agent.sock"))
+    assert ping() is None
+    assert forward_command(["secret", "list"]) is None
+
+
+@pytest.fixture
+def cli_agent(tmp_path, monkeypatch):
+    from naas_python.agent.server import AgentServer
+    from naas_python.cli import run_command
+
+    monkeypatch.setenv("NAAS_AGENT_SOCKET", str(tmp_path / "agent.sock"))
+    server = AgentServer(idle_timeout=60, runner=run_command)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.1}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.skipif(
+    tuple(int(part) for part in click.__version__.split(".")[:2]) >= (8, 2),
+    reason="typer 0.9 does not parse option values with click 8.2 and later",
+)
+def test_batch_reads_stdin_through_the_agent(cli_agent, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stdout, stderr = io.StringIO(), io.StringIO()
+
+    # The agent has no input to give, the command still iterates its standard input
+    assert forward_command(["batch", "-f", "-"], stdout=stdout, stderr=stderr) == 0
+    assert stderr.getvalue() == "0 succeeded, 0 failed.\n"
+    assert cli_agent.commands == 1
+
+
+@pytest.mark.parametrize("argv, piped", [(["batch", "-f", "-"], False), (["secret", "list"], True)])
+def test_commands_reading_stdin_run_in_process(cli_agent, argv, piped, monkeypatch):
+    from naas_python import main
+
+    stdin = io.StringIO("secret --help\n")
+    stdin.isatty = lambda: not piped
+    monkeypatch.setattr(sys, "stdin", stdin)
+    monkeypatch.setattr(sys, "argv", ["naas-python", *argv])
+    monkeypatch.setattr("naas_python.cli.app", lambda: sys.exit(0))
+
+    assert main.reads_stdin(argv)
+    with pytest.raises(SystemExit):
+        main.main()
+    assert cli_agent.commands == 0
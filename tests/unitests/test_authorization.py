@@ -0,0 +1,107 @@
+import asyncio
+import base64
+import json
+import socket
+import time
+
+import pytest
+import urllib3
+
+from naas_python.utils.domains_base.authorization import ExpiredTokenError, NaasSpaceAuthenticatorAdapter, jwt_expiry
+
+
+def make_jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"sub": "user", "exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.delenv("NAAS_CREDENTIALS_JWT_TOKEN", raising=False)
+    monkeypatch.delenv("JUPYTERHUB_API_TOKEN", raising=False)
+    return tmp_path
+
+
+def test_login_completes_as_soon_as_the_token_arrives(monkeypatch):
+    monkeypatch.setenv("NAAS_ENVIRONMENT_MODE", "test")
+    monkeypatch.setenv("NAAS_MOCK_TOKEN", "code-123")
+
+    started_at = time.monotonic()
+    assert NaasSpaceAuthenticatorAdapter(port=0, timeout=30)._request_token() == "code-123"
+    assert time.monotonic() - started_at < 5
+
+
+def test_login_server_uses_the_next_free_port():
+    with socket.socket() as busy:
+        busy.bind(("0.0.0.0", 0))
+        busy.listen()
+        busy_port = busy.getsockname()[1]
+
+        authenticator = NaasSpaceAuthenticatorAdapter(port=busy_port, timeout=1)
+        with authenticator._start_http_server(busy_port) as server:
+            assert server.server_address[1] > busy_port
+            assert authenticator._redirect_uri == f"http://localhost:{server.server_address[1]}"
+
+
+def test_login_server_can_be_awaited():
+    authenticator = NaasSpaceAuthenticatorAdapter(timeout=1)
+
+    async def login():
+        with authenticator._start_http_server(0) as server:
+            server.start()
+            gathering = asyncio.ensure_future(server._gather_result_async())
+            with urllib3.PoolManager() as http:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: http.request("POST", authenticator._redirect_uri, body=json.dumps({"code": "code-123"}))
+                )
+            return await gathering
+
+    assert asyncio.run(login())["code"] == "code-123"
+
+    # Without the token, the login fails after the timeout
+    with authenticator._start_http_server(0) as server:
+        assert server._gather_result()["error"] == "timeout"
+
+
+def test_expired_tokens_fail_without_calling_the_api(home, monkeypatch):
+    assert jwt_expiry(make_jwt(1700000000)) == 1700000000
+    assert jwt_expiry("opaque-token") is None
+
+    monkeypatch.setenv("NAAS_CREDENTIALS_JWT_TOKEN", make_jwt(time.time() - 60))
+    with pytest.raises(ExpiredTokenError, match="NAAS_CREDENTIALS_JWT_TOKEN expired"):
+        NaasSpaceAuthenticatorAdapter().jwt_token()
+
+    valid_token = make_jwt(time.time() + 3600)
+    monkeypatch.setenv("NAAS_CREDENTIALS_JWT_TOKEN", valid_token)
+    assert NaasSpaceAuthenticatorAdapter().jwt_token() == valid_token
+
+
+def test_jupyterhub_tokens_are_refreshed_ahead_of_expiry(home, monkeypatch):
+    monkeypatch.setenv("JUPYTERHUB_API_TOKEN", "hub-token")
+    (home / ".naas").mkdir()
+    credentials_path = home / ".naas" / "credentials"
+    expiring_token, new_token = make_jwt(time.time() + 60), make_jwt(time.time() + 86400)
+    storage = {"ws": {"st": {"local": {"root": "/data"}}}}
+    credentials_path.write_text(json.dumps({"jwt_token": expiring_token, "source": "jupyterhub", "storage": storage}))
+
+    authenticator = NaasSpaceAuthenticatorAdapter()
+    trades = []
+    monkeypatch.setattr(authenticator, "trade_for_long_lived_token", lambda access_token, access_token_type: trades.append(access_token) or new_token)
+
+    # The current token is used while the new one is traded in the background
+    assert authenticator.jwt_token() in (expiring_token, new_token)
+    deadline = time.monotonic() + 5
+    while authenticator.jwt_token() != new_token and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert authenticator.jwt_token() == new_token
+    assert trades == ["hub-token"]
+    # The storage credentials saved in the same file are kept
+    assert json.loads(credentials_path.read_text()) == {"jwt_token": new_token, "source": "jupyterhub", "storage": storage}
+
+    # Tokens that cannot be refreshed fail with a clear message
+    credentials_path.write_text(json.dumps({"jwt_token": make_jwt(time.time() - 60), "source": "jupyterhub"}))
+    authenticator = NaasSpaceAuthenticatorAdapter()
+    monkeypatch.setattr(authenticator, "trade_for_long_lived_token", lambda access_token, access_token_type: 1 / 0)
+    with pytest.raises(ExpiredTokenError, match="Unable to refresh your token from JupyterHub"):
+        authenticator.jwt_token()
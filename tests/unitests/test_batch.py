@@ -0,0 +1,29 @@
+import pytest
+
+from naas_python.batch import parse_line, run_line
+
+
+@pytest.mark.parametrize(
+    "line, argv",
+    [
+        ("# comment", None),
+        ("   ", None),
+        ("secret list", ["secret", "list"]),
+        ("naas-python secret get -n 'my secret'", ["secret", "get", "-n", "my secret"]),
+        ('["secret", "get", "-n", "my secret"]', ["secret", "get", "-n", "my secret"]),
+        ('{"argv": ["secret", "list"]}', ["secret", "list"]),
+        ('{"command": "naas-python secret list"}', ["secret", "list"]),
+    ],
+)
+def test_parse_line(line, argv):
+    assert parse_line(line) == argv
+
+
+def test_run_line_reports_failures():
+    result = run_line(1, ["batch", "-f", "commands.txt"])
+    assert result["exit_code"] == 2
+    assert "cannot run from a batch file" in result["stderr"]
+
+    result = run_line(2, ["secret", "nope"])
+    assert (result["line"], result["command"], result["exit_code"]) == (2, "secret nope", 2)
+    assert "No such command" in result["stderr"]
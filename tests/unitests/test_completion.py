@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import pytest
+
+from naas_python.utils import completion
+from naas_python.utils.completion import NameCache, name_completer
+
+
+@pytest.fixture
+def refreshes(tmp_path, monkeypatch):
+    monkeypatch.setenv("NAAS_COMPLETION_CACHE", str(tmp_path / "completion.json"))
+    refreshes = []
+    monkeypatch.setattr(completion, "_refresh_in_background", refreshes.append)
+    return refreshes
+
+
+def test_names_are_completed_from_the_cache(refreshes):
+    complete = name_completer("secret", lambda scope: ["secret", "list"])
+
+    # Nothing is cached yet, the names are listed in the background once
+    assert complete(SimpleNamespace(params={}), "") == []
+    assert complete(SimpleNamespace(params={}), "") == []
+    assert refreshes == [["secret", "list"]]
+
+    NameCache().remember("secret", ["api-key", "api-secret", "token"])
+    assert complete(SimpleNamespace(params={}), "api") == ["api-key", "api-secret"]
+
+    NameCache().add("secret", "api-token")
+    NameCache().discard("secret", "api-key")
+    assert complete(SimpleNamespace(params={}), "api") == ["api-secret", "api-token"]
+    assert len(refreshes) == 1
+
+
+def test_stale_names_are_refreshed_in_the_background(refreshes, monkeypatch):
+    complete = name_completer("storage", lambda workspace_id: ["storage", "list", "-w", workspace_id], scope_param="workspace_id")
+    NameCache().remember("storage", ["data"], scope="ws-1")
+
+    assert complete(SimpleNamespace(params={}), "") == []
+    assert complete(SimpleNamespace(params={"workspace_id": "ws-1"}), "") == ["data"]
+    assert refreshes == []
+
+    monkeypatch.setenv("NAAS_COMPLETION_TTL", "0")
+    assert complete(SimpleNamespace(params={"workspace_id": "ws-1"}), "") == ["data"]
+    assert refreshes == [["storage", "list", "-w", "ws-1"]]
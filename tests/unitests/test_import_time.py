@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+
+# Heavy dependencies only needed once a domain is used
+HEAVY_PACKAGES = ("boto3", "botocore", "rich", "requests", "pydantic")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(code: str, cwd) -> list:
+    """Runs `code` in a fresh interpreter, returns the JSON values it printed, one per line"""
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def loaded(modules, prefixes) -> list:
+    return sorted(module for module in modules if module.split(".")[0] in prefixes or module.startswith(prefixes))
+
+
+def test_cli_loads_domain_groups_on_first_use(tmp_path):
+    code = (
+        "import sys, json, click, typer, typer.main\n"
+        # Typer loads rich itself when it is installed, only the modules loaded by the CLI are checked
+        "before = set(sys.modules)\n"
+        "from naas_python.cli import app\n"
+        "group = typer.main.get_command(app)\n"
+        "ctx = click.Context(group)\n"
+        "group.list_commands(ctx)\n"
+        "print(json.dumps(sorted(set(sys.modules) - before)))\n"
+        "group.get_command(ctx, 'secret')\n"
+        "print(json.dumps(sorted(m for m in sys.modules if m.endswith('Handler') and '.CLI' in m)))\n"
+    )
+    started, after_first_use = run(code, tmp_path)
+
+    assert loaded(started, HEAVY_PACKAGES) == []
+    assert loaded(started, ("naas_python.domains", "naas_python.utils")) == []
+    assert after_first_use == ["naas_python.domains.secret.handlers.CLISecretHandler"]
+
+
+def test_sdk_builds_domains_on_first_access(tmp_path):
+    code = (
+        "import sys, json\n"
+        "import naas_python\n"
+        "print(json.dumps(sorted(sys.modules)))\n"
+        "naas_python.secret\n"
+        "print(json.dumps(sorted(m for m in sys.modules if m.endswith('Handler'))))\n"
+    )
+    imported, after_first_access = run(code, tmp_path)
+
+    assert loaded(imported, HEAVY_PACKAGES) == []
+    assert loaded(imported, ("naas_python.domains", "naas_python.utils")) == []
+    assert after_first_access == ["naas_python.domains.secret.handlers.PythonHandler"]
@@ -0,0 +1,27 @@
+import logging
+
+import pytest
+
+from naas_python.utils.log import LOG_FILENAME, initialize_logging, shutdown_logging
+
+
+@pytest.fixture
+def logging_dir(tmp_path):
+    shutdown_logging()
+    yield tmp_path / "logs"
+    shutdown_logging()
+
+
+def test_log_file_is_created_on_first_record_and_rotated(logging_dir):
+    logger = initialize_logging(logging_dir, persistent_max=2, max_bytes=200)
+
+    assert initialize_logging(logging_dir) is logger
+    assert not logging_dir.exists()
+
+    for i in range(20):
+        logger.debug("record %d", i)
+    shutdown_logging()
+
+    assert sorted(path.name for path in logging_dir.iterdir()) == [LOG_FILENAME, f"{LOG_FILENAME}.1", f"{LOG_FILENAME}.2"]
+    assert "record 19" in (logging_dir / LOG_FILENAME).read_text()
+    assert logging.getLogger("naas_python").handlers == []
@@ -0,0 +1,44 @@
+import io
+import json
+
+from naas_python.utils.output import render_rows
+
+ROWS = [
+    {"name": "a", "size": 1, "lastmodified": None},
+    {"name": "a-much-longer-name", "size": 12345, "lastmodified": "2024-01-01 00:00:00"},
+]
+
+
+def render(rows, output_format, **kwargs) -> str:
+    file = io.StringIO()
+    render_rows(rows, output_format, file=file, **kwargs)
+    return file.getvalue()
+
+
+def test_formats():
+    assert render(ROWS, "jsonl").splitlines() == [json.dumps(row) for row in ROWS]
+    assert render(ROWS, "csv", columns=["name", "size"]).splitlines() == ["name,size", "a,1", "a-much-longer-name,12345"]
+    assert render(ROWS, "table").splitlines() == [
+        "NAME                SIZE   LASTMODIFIED",
+        "a                   1",
+        "a-much-longer-name  12345  2024-01-01 00:00:00",
+    ]
+    assert render([], "table") == ""
+
+
+def test_table_columns_are_sized_from_a_sample():
+    rows = [{"name": "a", "size": 1}, {"name": "b", "size": 2}, {"name": "a-much-longer-name", "size": 3}]
+    assert render(rows, "table", sample_size=2).splitlines() == ["NAME  SIZE", "a     1", "b     2", "a-m…  3"]
+
+
+def test_rows_are_printed_as_they_are_read():
+    file = io.StringIO()
+
+    def rows():
+        for index in range(10):
+            yield {"index": index}
+            if index == 5:
+                # Everything past the sample has been printed already
+                assert file.getvalue().splitlines()[-1] == "5"
+
+    assert render_rows(rows(), "table", file=file, sample_size=2) == 10
@@ -0,0 +1,29 @@
+import hashlib
+
+from naas_python.domains.storage.adaptors.secondary.providers.checksums import (
+    compute_file_checksums,
+)
+
+MiB = 1024 * 1024
+
+
+def test_single_part_etag_is_md5(tmp_path):
+    path = tmp_path / "small.txt"
+    path.write_bytes(b"hello world")
+
+    checksums = compute_file_checksums(str(path), 8 * MiB, 8 * MiB)
+
+    assert checksums["etag"] == hashlib.md5(b"hello world").hexdigest()
+    assert checksums["sha256"] == hashlib.sha256(b"hello world").hexdigest()
+
+
+def test_multipart_etag(tmp_path):
+    content = bytes(range(256)) * (12 * MiB // 256)
+    path = tmp_path / "large.bin"
+    path.write_bytes(content)
+
+    checksums = compute_file_checksums(str(path), 8 * MiB, 5 * MiB)
+
+    parts = [content[i : i + 5 * MiB] for i in range(0, len(content), 5 * MiB)]
+    expected = hashlib.md5(b"".join(hashlib.md5(p).digest() for p in parts)).hexdigest()
+    assert checksums["etag"] == f"{expected}-3"
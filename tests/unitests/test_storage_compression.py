@@ -0,0 +1,20 @@
+import pytest
+
+from naas_python.domains.storage.compression import compress_file, decompress_file
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_compression_round_trip(tmp_path, encoding):
+    if encoding == "zstd":
+        pytest.importorskip("zstandard")
+    content = b"id,name\n" + b"".join(b"%d,row%d\n" % (i, i) for i in range(10000))
+    (tmp_path / "data.csv").write_bytes(content)
+
+    compress_file(str(tmp_path / "data.csv"), str(tmp_path / "data.1"), encoding)
+    compress_file(str(tmp_path / "data.csv"), str(tmp_path / "data.2"), encoding)
+    decompress_file(str(tmp_path / "data.1"), str(tmp_path / "copy.csv"), encoding)
+
+    # Identical inputs give identical outputs, so compressed uploads can be skipped when unchanged
+    assert (tmp_path / "data.1").read_bytes() == (tmp_path / "data.2").read_bytes()
+    assert (tmp_path / "data.1").stat().st_size < len(content) / 2
+    assert (tmp_path / "copy.csv").read_bytes() == content
@@ -0,0 +1,136 @@
+import pytest
+
+from naas_python.domains.storage.StorageDomain import StorageDomain
+from naas_python.domains.storage.StorageSchema import BadRequest
+
+
+class MockStorageProvider:
+    provider_id = "s3"
+
+    def __init__(self, keys):
+        self.objects = {key: b"x" for key in keys}
+        self.delete_calls = []
+
+    def valid_naas_credentials(self, workspace_id, storage_name):
+        return True
+
+    def list_workspace_storage_object(self, workspace_id, storage_name, storage_prefix, delimiter="/", page_size=1000):
+        for key in sorted(self.objects):
+            if key.startswith(storage_prefix):
+                yield {"key": key, "type": "file", "name": key.rsplit("/", 1)[-1]}
+
+    def delete_workspace_storage_objects(self, workspace_id, storage_name, object_keys):
+        self.delete_calls.append(list(object_keys))
+        errors = [
+            {"key": key, "code": "AccessDenied", "message": "Access Denied"}
+            for key in object_keys
+            if key.endswith("locked.txt")
+        ]
+        failed_keys = {error["key"] for error in errors}
+        for key in object_keys:
+            if key not in failed_keys:
+                del self.objects[key]
+        return {"deleted": [key for key in object_keys if key not in failed_keys], "errors": errors}
+
+    def get_workspace_storage_object(self, workspace_id, storage_name, src_file, dst_file, metrics=None):
+        with open(dst_file, "wb") as f:
+            f.write(self.objects[src_file])
+
+    def copy_workspace_storage_object(self, workspace_id, src_storage_name, src_key, dst_storage_name, dst_key):
+        self.objects[dst_key] = self.objects[src_key]
+        return {"key": dst_key}
+
+
+@pytest.fixture
+def provider():
+    keys = [f"old/{i}.txt" for i in range(2500)] + ["old/locked.txt", "older/keep.txt"]
+    return MockStorageProvider(keys)
+
+
+def test_delete_objects_in_batches(provider):
+    domain = StorageDomain(None, storage_provider_adaptors={"s3": provider})
+    batches = []
+
+    summary = domain.delete_objects("ws", "st", "old", max_in_flight=2, progress=batches.append)
+
+    assert summary["deleted"] == 2500
+    assert [error["key"] for error in summary["errors"]] == ["old/locked.txt"]
+    assert max(len(call) for call in provider.delete_calls) == StorageDomain.DELETE_BATCH_SIZE
+    assert len(batches) == len(provider.delete_calls) == 3
+    assert sorted(provider.objects) == ["old/locked.txt", "older/keep.txt"]
+
+
+def test_delete_objects_reports_failed_batches(provider):
+    domain = StorageDomain(None, storage_provider_adaptors={"s3": provider})
+    delete_workspace_storage_objects = provider.delete_workspace_storage_objects
+
+    def delete_objects(workspace_id, storage_name, object_keys):
+        if "old/1.txt" in object_keys:
+            raise ConnectionError("connection lost")
+        return delete_workspace_storage_objects(workspace_id, storage_name, object_keys)
+
+    provider.delete_workspace_storage_objects = delete_objects
+    summary = domain.delete_objects("ws", "st", "old", max_in_flight=1)
+
+    # The other batches are still deleted
+    assert summary["deleted"] == 1500
+    failed = [error for error in summary["errors"] if error["key"] != "old/locked.txt"]
+    assert len(failed) == StorageDomain.DELETE_BATCH_SIZE
+    assert failed[0] == {"key": "old/0.txt", "code": "ConnectionError", "message": "connection lost"}
+    assert len(provider.objects) == StorageDomain.DELETE_BATCH_SIZE + 2
+
+
+def test_delete_objects_dry_run(provider):
+    domain = StorageDomain(None, storage_provider_adaptors={"s3": provider})
+
+    summary = domain.delete_objects("ws", "st", "old/", dry_run=True)
+
+    assert summary == {"deleted": 2501, "errors": []}
+    assert provider.delete_calls == []
+
+
+def test_delete_objects_requires_a_prefix_or_delete_all(provider):
+    domain = StorageDomain(None, storage_provider_adaptors={"s3": provider})
+
+    for prefix in ("", "/"):
+        with pytest.raises(BadRequest, match="pass delete_all"):
+            domain.delete_objects("ws", "st", prefix)
+    assert provider.delete_calls == []
+
+    assert domain.delete_objects("ws", "st", "", delete_all=True)["deleted"] == 2501
+    assert sorted(provider.objects) == ["old/locked.txt"]
+
+
+def test_move_objects_between_prefixes(provider):
+    domain = StorageDomain(None, storage_provider_adaptors={"s3": provider})
+
+    summary = domain.move_objects("ws", "st", "old", "new", recursive=True)
+
+    assert summary["copied"] == 2501
+    assert summary["deleted"] == 2500
+    assert "new/0.txt" in provider.objects and "old/0.txt" not in provider.objects
+    assert "new/locked.txt" in provider.objects and "old/locked.txt" in provider.objects
+    assert "older/keep.txt" in provider.objects
+
+
+def test_copy_object_into_folder(provider):
+    domain = StorageDomain(None, storage_provider_adaptors={"s3": provider})
+
+    domain.copy_objects("ws", "st", "older/keep.txt", "backup/")
+
+    assert "backup/keep.txt" in provider.objects
+
+
+def test_get_objects_with_glob(tmp_path):
+    provider = MockStorageProvider(["logs/2024-01/a.gz", "logs/2024-01/deep/b.gz", "logs/2024-02/c.gz", "logs/2023-12/d.gz", "logs/2024-03/e.txt"])
+    domain = StorageDomain(None, storage_provider_adaptors={"s3": provider})
+
+    summary = domain.get_objects("ws", "st", "logs/2024-*/*.gz", str(tmp_path))
+
+    assert summary == {"transferred": 2, "skipped": 0, "errors": []}
+    assert (tmp_path / "2024-01" / "a.gz").exists()
+    assert (tmp_path / "2024-02" / "c.gz").exists()
+
+    summary = domain.get_objects("ws", "st", "logs/**/*.gz", str(tmp_path / "all"))
+    assert summary["transferred"] == 4
+    assert (tmp_path / "all" / "2024-01" / "deep" / "b.gz").exists()
@@ -0,0 +1,83 @@
+import json
+import os
+
+import boto3
+import moto
+import pytest
+
+fsspec = pytest.importorskip("fsspec")
+
+from naas_python.domains.storage.adaptors.primary.FsspecStorageAdaptor import MIN_PART_SIZE, NaasFileSystem
+from naas_python.domains.storage.adaptors.secondary.providers.S3StorageProviderAdaptor import S3StorageProviderAdaptor
+from naas_python.domains.storage.adaptors.secondary.providers.StorageProviderRegistry import StorageProviderRegistry
+from naas_python.domains.storage.StorageDomain import StorageDomain
+
+BUCKET = "naas-storage"
+
+
+@pytest.fixture
+def fs(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("NAAS_STORAGE_UPLOAD_JOURNAL_DIR", str(tmp_path / "journal"))
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN", "AWS_PROFILE", "AWS_ENDPOINT_URL"):
+        monkeypatch.delenv(name, raising=False)
+    (tmp_path / ".naas").mkdir()
+    credentials = {
+        "REGION_NAME": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "key",
+        "AWS_SECRET_ACCESS_KEY": "secret",
+        "AWS_SESSION_TOKEN": "token",
+        "AWS_SESSION_EXPIRATION_TOKEN": "2999-01-01 00:00:00+0000",
+    }
+    (tmp_path / ".naas" / "credentials").write_text(json.dumps({"storage": {"ws": {"st": {"s3": credentials}}}}))
+
+    # Built before the mock, which sets credentials in the environment
+    provider = S3StorageProviderAdaptor()
+    provider.naas_bucket = BUCKET
+    registry = StorageProviderRegistry()
+    registry.register("s3", provider)
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        # skip_instance_cache: every test gets a filesystem over its own domain
+        yield NaasFileSystem(domain=StorageDomain(None, storage_provider_adaptors=registry), skip_instance_cache=True)
+
+
+def test_round_trip(fs):
+    content = os.urandom(2 * MIN_PART_SIZE + 1024)
+    uploaded_parts = []
+    s3 = fs.domain.storage_provider_adaptors["s3"]._S3StorageProviderAdaptor__get_s3_client("ws", "st")
+    s3.meta.events.register("before-parameter-build.s3.UploadPart", lambda params, **kwargs: uploaded_parts.append(len(params["Body"])))
+
+    # Written blocks are sent as parts while the file is written
+    with fs.open("naas://ws/st/data/file.bin", "wb", block_size=1024 * 1024) as f:
+        for offset in range(0, len(content), 1024 * 1024):
+            f.write(content[offset:offset + 1024 * 1024])
+        assert uploaded_parts == [MIN_PART_SIZE, MIN_PART_SIZE]
+    assert uploaded_parts == [MIN_PART_SIZE, MIN_PART_SIZE, 1024]
+
+    with fs.open("naas://ws/st/data/small.txt", "w") as f:
+        f.write("a,b\n")
+
+    assert fs.ls("naas://ws/st/data", detail=False) == ["ws/st/data/file.bin", "ws/st/data/small.txt"]
+    assert fs.info("naas://ws/st/data/file.bin")["size"] == len(content)
+    with fs.open("naas://ws/st/data/file.bin", "rb") as f:
+        f.seek(MIN_PART_SIZE - 10)
+        assert f.read(20) == content[MIN_PART_SIZE - 10:MIN_PART_SIZE + 10]
+    assert fs.cat("naas://ws/st/data/small.txt") == b"a,b\n"
+
+    fs.rm("naas://ws/st/data", recursive=True)
+    assert fs.ls("naas://ws/st", detail=False) == []
+    assert boto3.client("s3", region_name="us-east-1").list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+
+
+def test_failed_writes_abort_their_upload(fs):
+    s3 = fs.domain.storage_provider_adaptors["s3"]._S3StorageProviderAdaptor__get_s3_client("ws", "st")
+    s3.meta.events.register("before-parameter-build.s3.CompleteMultipartUpload", lambda **kwargs: 1 / 0)
+
+    with pytest.raises(Exception):
+        with fs.open("naas://ws/st/data.bin", "wb") as f:
+            f.write(b"x" * 1024)
+
+    s3 = boto3.client("s3", region_name="us-east-1")
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
@@ -0,0 +1,124 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+from naas_python.domains.storage.adaptors.secondary.providers.LocalStorageProviderAdaptor import (
+    LocalStorageProviderAdaptor,
+)
+from naas_python.domains.storage.adaptors.secondary.providers.StorageProviderRegistry import (
+    StorageProviderRegistry,
+)
+from naas_python.domains.storage.StorageDomain import StorageDomain
+from naas_python.domains.storage.StorageSchema import BadRequest
+
+
+@pytest.fixture
+def domain(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    (tmp_path / ".naas").mkdir()
+    credentials = {"storage": {"ws": {"st": {"local": {"root": str(tmp_path / "root")}}}}}
+    (tmp_path / ".naas" / "credentials").write_text(json.dumps(credentials))
+
+    registry = StorageProviderRegistry()
+    registry.register("local", LocalStorageProviderAdaptor())
+    return StorageDomain(None, storage_provider_adaptors=registry)
+
+
+def test_domain_round_trip_on_local_provider(domain, tmp_path):
+    (tmp_path / "data.csv").write_text("a,b\n1,2\n")
+
+    domain.post_object("ws", "st", str(tmp_path / "data.csv"), "in/data.csv")
+    domain.post_object("ws", "st", str(tmp_path / "data.csv"), "in/deep/data.csv", compression="gzip")
+
+    assert (tmp_path / "root" / "ws" / "st" / "in" / "data.csv").read_text() == "a,b\n1,2\n"
+    assert [o["key"] for o in domain.iter_objects("ws", "st", "in/")] == ["in/deep/", "in/data.csv"]
+    assert domain.read_object("ws", "st", "in/data.csv", start=4, end=7) == b"1,2"
+    assert domain.post_object("ws", "st", str(tmp_path / "data.csv"), "in/data.csv", skip_identical=True)["skipped"]
+
+    summary = domain.get_objects("ws", "st", "in/**/*.csv", str(tmp_path / "out"))
+    assert summary["transferred"] == 2
+    assert (tmp_path / "out" / "deep" / "data.csv").read_text() == "a,b\n1,2\n"
+
+    assert domain.delete_objects("ws", "st", "in")["deleted"] == 2
+    assert list(domain.iter_objects("ws", "st", "", recursive=True)) == []
+
+
+def test_registry_builds_providers_on_first_use():
+    sys.modules.pop("naas_python.domains.storage.adaptors.secondary.providers.LocalStorageProviderAdaptor", None)
+    registry = StorageProviderRegistry()
+
+    assert "local" in registry and "s3" in registry
+    assert "naas_python.domains.storage.adaptors.secondary.providers.LocalStorageProviderAdaptor" not in sys.modules
+    assert registry["local"] is registry["local"]
+    assert registry["local"].provider_id == "local"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX file modes")
+def test_credentials_are_saved_atomically_and_read_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    credentials_file = tmp_path / ".naas" / "credentials"
+    credentials_file.parent.mkdir()
+    credentials_file.write_text(json.dumps({"jwt_token": "token", "storage": {"ws": {"st": {"local": {"root": str(tmp_path / "a")}}}}}))
+    adaptor = LocalStorageProviderAdaptor(root=str(tmp_path / "b"))
+    (tmp_path / "data.csv").write_text("a")
+
+    adaptor.post_workspace_storage_object("ws", "st", str(tmp_path / "data.csv"), "data.csv")
+    assert (tmp_path / "a" / "ws" / "st" / "data.csv").exists()
+
+    # The root is resolved once per storage, until its credentials are saved again
+    credentials_file.write_text(json.dumps({"jwt_token": "token"}))
+    assert adaptor.head_workspace_storage_object("ws", "st", "data.csv")["size"] == 1
+    adaptor.save_naas_credentials("ws", "st", {})
+    assert json.loads(credentials_file.read_text()) == {"jwt_token": "token", "storage": {"ws": {"st": {"local": {"root": str(tmp_path / "b")}}}}}
+    assert credentials_file.stat().st_mode & 0o777 == 0o600
+    adaptor.post_workspace_storage_object("ws", "st", str(tmp_path / "data.csv"), "data.csv")
+    assert (tmp_path / "b" / "ws" / "st" / "data.csv").exists()
+
+
+def test_compressed_copies_are_removed_after_upload(domain, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "tmp"))
+    (tmp_path / "data.csv").write_text("a,b\n1,2\n")
+    provider = domain.storage_provider_adaptors["local"]
+    post_object = provider.post_workspace_storage_object
+
+    def failing_post_object(**kwargs):
+        raise ConnectionError("connection lost")
+
+    monkeypatch.setattr(provider, "post_workspace_storage_object", failing_post_object)
+    with pytest.raises(ConnectionError):
+        domain.post_object("ws", "st", str(tmp_path / "data.csv"), "data.csv", compression="gzip")
+    assert os.listdir(tmp_path / "tmp" / "naas-compressed") == []
+
+    # Resumed uploads keep the compressed copy until they complete
+    with pytest.raises(ConnectionError):
+        domain.post_object("ws", "st", str(tmp_path / "data.csv"), "data.csv", compression="gzip", resume=True)
+    assert len(os.listdir(tmp_path / "tmp" / "naas-compressed")) == 1
+    monkeypatch.setattr(provider, "post_workspace_storage_object", post_object)
+    domain.post_object("ws", "st", str(tmp_path / "data.csv"), "data.csv", compression="gzip", resume=True)
+    assert os.listdir(tmp_path / "tmp" / "naas-compressed") == []
+
+
+def test_zstd_requires_its_extra(domain, tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    (tmp_path / "data.csv").write_text("a,b\n1,2\n")
+
+    with pytest.raises(BadRequest, match=r'pip install "naas-python\[zstd\]"'):
+        domain.post_object("ws", "st", str(tmp_path / "data.csv"), "data.csv", compression="zstd")
+
+
+def test_uploads_written_part_by_part(domain, tmp_path):
+    upload_id = domain.create_upload("ws", "st", "out/data.csv")
+    parts = [domain.upload_part("ws", "st", "out/data.csv", upload_id, 2, b"1,2\n"), domain.upload_part("ws", "st", "out/data.csv", upload_id, 1, b"a,b\n")]
+    domain.complete_upload("ws", "st", "out/data.csv", upload_id, parts)
+    assert domain.read_object("ws", "st", "out/data.csv") == b"a,b\n1,2\n"
+
+    # Interrupted uploads are left for the cleanup
+    upload_id = domain.create_upload("ws", "st", "out/other.csv")
+    domain.upload_part("ws", "st", "out/other.csv", upload_id, 1, b"a,b\n")
+    assert domain.cleanup_uploads("ws", "st") == []
+    assert [upload["key"] for upload in domain.cleanup_uploads("ws", "st", older_than=-60)] == ["out/other.csv"]
+    assert domain.cleanup_uploads("ws", "st", older_than=-60) == []
+    assert [o["key"] for o in domain.iter_objects("ws", "st", "", recursive=True)] == ["out/data.csv"]
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from naas_python.domains.storage.adaptors.secondary.LocalObjectCache import (
+    LocalObjectCache,
+)
+from naas_python.domains.storage.StorageDomain import StorageDomain
+
+
+def _writer(content: bytes, calls: list):
+    def download(path):
+        calls.append(path)
+        with open(path, "wb") as f:
+            f.write(content)
+
+    return download
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LocalObjectCache(cache_dir=str(tmp_path / "cache"), max_size=10, ttl=0)
+
+
+def test_store_then_copy_by_etag(cache, tmp_path):
+    calls = []
+    dst = tmp_path / "copy.csv"
+    assert cache.store("ws", "st", "data.csv", "etag-1", _writer(b"abc", calls), str(dst)) == {"etag": "etag-1", "size": 3, "metadata": {}}
+    assert dst.read_bytes() == b"abc"
+
+    dst.unlink()
+    assert cache.copy_to("ws", "st", "data.csv", str(dst), etag="etag-1")["etag"] == "etag-1"
+    assert dst.read_bytes() == b"abc"
+    assert cache.copy_to("ws", "st", "data.csv", str(tmp_path / "other.csv"), etag="etag-2") is None
+    # Outside the freshness window an ETag is required
+    assert cache.copy_to("ws", "st", "data.csv", str(tmp_path / "other.csv")) is None
+    assert not (tmp_path / "other.csv").exists()
+
+    cache.store("ws", "st", "data.csv", "etag-1", _writer(b"abc", calls), str(dst))
+    assert len(calls) == 1
+
+
+def test_copy_inside_freshness_window(tmp_path):
+    cache = LocalObjectCache(cache_dir=str(tmp_path / "cache"), max_size=10, ttl=60)
+    cache.store("ws", "st", "data.csv", "etag-1", _writer(b"abc", []), str(tmp_path / "a.csv"), metadata={"encoding": "gzip"})
+
+    assert cache.copy_to("ws", "st", "data.csv", str(tmp_path / "b.csv")) == {"etag": "etag-1", "size": 3, "metadata": {"encoding": "gzip"}}
+    assert (tmp_path / "b.csv").read_bytes() == b"abc"
+
+
+def test_lru_eviction(cache, tmp_path):
+    dst = str(tmp_path / "copy")
+    cache.store("ws", "st", "a", "1", _writer(b"aaaa", []), dst)
+    cache.store("ws", "st", "b", "1", _writer(b"bbbb", []), dst)
+    cache.copy_to("ws", "st", "a", dst, etag="1")
+    cache.store("ws", "st", "c", "1", _writer(b"cccc", []), dst)
+
+    assert cache.copy_to("ws", "st", "a", dst, etag="1") is not None
+    assert cache.copy_to("ws", "st", "b", dst, etag="1") is None
+    assert cache.copy_to("ws", "st", "c", dst, etag="1") is not None
+
+    # Evicted blobs go with their lock file
+    blobs = sorted(os.listdir(tmp_path / "cache" / "blobs"))
+    assert len(blobs) == 2
+    assert sorted(os.listdir(tmp_path / "cache" / "locks")) == [f"{blob}.lock" for blob in blobs]
+
+    cache.clear()
+    assert os.listdir(tmp_path / "cache" / "blobs") == os.listdir(tmp_path / "cache" / "locks") == []
+
+
+def test_domain_get_object_reads_through_cache(cache, tmp_path):
+    class MockProvider:
+        provider_id = "s3"
+        downloads = 0
+
+        def valid_naas_credentials(self, workspace_id, storage_name):
+            return True
+
+        def head_workspace_storage_object(self, workspace_id, storage_name, src_file):
+            return {"etag": "etag-1", "size": 3, "last_modified": None}
+
+        def get_workspace_storage_object(self, workspace_id, storage_name, src_file, dst_file, metrics=None):
+            self.downloads += 1
+            with open(dst_file, "wb") as f:
+                f.write(b"abc")
+
+    provider = MockProvider()
+    domain = StorageDomain(None, storage_provider_adaptors={"s3": provider}, cache=cache)
+
+    responses = []
+    for i in range(2):
+        dst_file = str(tmp_path / f"copy-{i}.csv")
+        responses.append(domain.get_object("ws", "st", "data.csv", dst_file, use_cache=True))
+        assert open(dst_file, "rb").read() == b"abc"
+
+    assert provider.downloads == 1
+    # Served from the cache or not, the response is the same
+    assert responses[0] == responses[1] == {"etag": "etag-1", "size": 3, "metadata": {}}
@@ -0,0 +1,80 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from naas_python.domains.storage.adaptors.secondary.providers.LocalStorageProviderAdaptor import (
+    LocalStorageProviderAdaptor,
+)
+from naas_python.domains.storage.adaptors.secondary.providers.StorageProviderRegistry import (
+    StorageProviderRegistry,
+)
+from naas_python.domains.storage.adaptors.secondary.SQLiteObjectIndex import SQLiteObjectIndex
+from naas_python.domains.storage.StorageDomain import StorageDomain
+
+
+@pytest.fixture
+def domain(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    (tmp_path / ".naas").mkdir()
+    credentials = {"storage": {"ws": {"st": {"local": {"root": str(tmp_path / "root")}}}}}
+    (tmp_path / ".naas" / "credentials").write_text(json.dumps(credentials))
+
+    registry = StorageProviderRegistry()
+    registry.register("local", LocalStorageProviderAdaptor())
+    return StorageDomain(None, storage_provider_adaptors=registry, index=SQLiteObjectIndex(str(tmp_path / "index")))
+
+
+def test_queries_are_answered_from_the_index(domain, tmp_path):
+    (tmp_path / "small.csv").write_text("a")
+    (tmp_path / "large.csv").write_text("a" * 100)
+    domain.post_object("ws", "st", str(tmp_path / "small.csv"), "data/2023/small.csv")
+    domain.post_object("ws", "st", str(tmp_path / "large.csv"), "data/2024/large.csv")
+    domain.post_object("ws", "st", str(tmp_path / "large.csv"), "other/large.txt")
+
+    # The first query builds the index, later writes are applied to it
+    assert [o["key"] for o in domain.query_objects("ws", "st", pattern="data/**/*.csv")] == ["data/2023/small.csv", "data/2024/large.csv"]
+    domain.post_object("ws", "st", str(tmp_path / "small.csv"), "data/2024/new.csv")
+    domain.delete_object_keys("ws", "st", ["other/large.txt"])
+
+    assert [o["key"] for o in domain.query_objects("ws", "st", "data/", min_size=10)] == ["data/2024/large.csv"]
+    assert [o["key"] for o in domain.query_objects("ws", "st", "data/", recursive=False)] == ["data/2023/", "data/2024/"]
+    tomorrow = datetime.now() + timedelta(days=1)
+    assert list(domain.query_objects("ws", "st", modified_after=tomorrow)) == []
+    usage = [(entry["key"], entry["objects"], entry["size"]) for entry in domain.disk_usage("ws", "st", "data/")]
+    assert usage == [("data/2023/", 1, 1), ("data/2024/", 2, 101)]
+
+    # Changes made elsewhere are picked up by refreshing the prefix
+    (tmp_path / "root" / "ws" / "st" / "data" / "2023" / "small.csv").unlink()
+    assert domain.refresh_index("ws", "st", "data/2023/") == {"indexed": 0, "removed": 1}
+    assert [o["key"] for o in domain.query_objects("ws", "st")] == ["data/2024/large.csv", "data/2024/new.csv"]
+
+
+def test_objects_can_be_deleted_while_a_query_is_read(domain, tmp_path, monkeypatch):
+    monkeypatch.setattr("naas_python.domains.storage.adaptors.secondary.SQLiteObjectIndex.QUERY_CHUNK_SIZE", 2)
+    (tmp_path / "file.csv").write_text("a")
+    for index in range(5):
+        domain.post_object("ws", "st", str(tmp_path / "file.csv"), f"data/{index}.csv")
+
+    deleted = []
+    for object in domain.query_objects("ws", "st", "data/"):
+        domain.delete_object_keys("ws", "st", [object["key"]])
+        deleted.append(object["key"])
+
+    assert deleted == [f"data/{index}.csv" for index in range(5)]
+    assert list(domain.query_objects("ws", "st")) == []
+
+
+def test_prefixes_not_refreshed_are_listed_from_the_storage(domain, tmp_path):
+    (tmp_path / "file.csv").write_text("a")
+    domain.post_object("ws", "st", str(tmp_path / "file.csv"), "data/a.csv")
+    domain.post_object("ws", "st", str(tmp_path / "file.csv"), "other/b.csv")
+
+    domain.refresh_index("ws", "st", "data/")
+    assert domain.index.is_indexed("ws", "st", "data/2024/")
+    assert not domain.index.is_indexed("ws", "st", "other/")
+
+    # Queries outside the refreshed prefix do not miss the objects of the storage
+    assert [o["key"] for o in domain.query_objects("ws", "st", pattern="other/*.csv")] == ["other/b.csv"]
+    assert [entry["key"] for entry in domain.disk_usage("ws", "st")] == ["data/", "other/"]
+    assert domain.index.is_indexed("ws", "st", "other/") and domain.index.is_indexed("ws", "st")
@@ -0,0 +1,307 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import moto
+import pytest
+from boto3.s3.transfer import TransferConfig
+
+from naas_python.domains.storage.adaptors.secondary.providers.S3StorageProviderAdaptor import S3StorageProviderAdaptor
+from naas_python.domains.storage.models import TransferMetrics
+
+BUCKET = "naas-storage"
+MB = 1024 * 1024
+
+
+def storage_credentials(access_key_id: str) -> dict:
+    return {
+        "s3": {
+            "REGION_NAME": "us-east-1",
+            "AWS_ACCESS_KEY_ID": access_key_id,
+            "AWS_SECRET_ACCESS_KEY": "secret",
+            "AWS_SESSION_TOKEN": f"token-{access_key_id}",
+            "AWS_SESSION_EXPIRATION_TOKEN": "2999-01-01 00:00:00+0000",
+        }
+    }
+
+
+@pytest.fixture
+def adaptor(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("NAAS_STORAGE_UPLOAD_JOURNAL_DIR", str(tmp_path / "journal"))
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN", "AWS_PROFILE", "AWS_ENDPOINT_URL"):
+        monkeypatch.delenv(name, raising=False)
+
+    (tmp_path / ".naas").mkdir()
+    storages = {"ws": {"st": storage_credentials("key-st"), "other": storage_credentials("key-other"), "shared": storage_credentials("key-st")}}
+    (tmp_path / ".naas" / "credentials").write_text(json.dumps({"jwt_token": "jwt", "storage": storages}))
+
+    # Built before the mock, which sets credentials in the environment
+    adaptor = S3StorageProviderAdaptor()
+    adaptor.naas_bucket = BUCKET
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        yield adaptor
+
+
+def s3_client(adaptor, storage_name: str):
+    return adaptor._S3StorageProviderAdaptor__get_s3_client("ws", storage_name)
+
+
+def test_each_storage_uses_its_own_credentials(adaptor):
+    st, other, shared = s3_client(adaptor, "st"), s3_client(adaptor, "other"), s3_client(adaptor, "shared")
+
+    assert st._request_signer._credentials.access_key == "key-st"
+    assert other._request_signer._credentials.access_key == "key-other"
+    # Storages sharing credentials share a client
+    assert shared is st
+    assert s3_client(adaptor, "st") is st
+
+
+def test_objects_round_trip(adaptor, tmp_path):
+    src = tmp_path / "data.txt"
+    src.write_bytes(b"hello")
+
+    assert adaptor.post_workspace_storage_object("ws", "st", str(src), "in/data.txt") == {"key": "ws/st/in/data.txt", "skipped": False}
+    assert adaptor.head_workspace_storage_object("ws", "st", "in/data.txt")["size"] == 5
+    adaptor.get_workspace_storage_object("ws", "st", "in/data.txt", str(tmp_path / "copy.txt"))
+    assert (tmp_path / "copy.txt").read_bytes() == b"hello"
+
+
+def test_copies_between_storages_use_the_credentials_of_each(adaptor, tmp_path):
+    src = tmp_path / "data.csv"
+    src.write_bytes(b"a,b\n")
+    adaptor.post_workspace_storage_object("ws", "st", str(src), "data.csv")
+    calls = []
+    for storage_name in ("st", "other"):
+        s3_client(adaptor, storage_name).meta.events.register(
+            "before-call.s3", lambda model, storage_name=storage_name, **kwargs: calls.append((storage_name, model.name))
+        )
+
+    adaptor.copy_workspace_storage_object("ws", "st", "data.csv", "shared", "copy.csv")
+    assert calls == [("st", "HeadObject"), ("st", "CopyObject")]
+
+    calls.clear()
+    adaptor.copy_workspace_storage_object("ws", "st", "data.csv", "other", "copy.csv")
+    assert ("st", "GetObject") in calls and ("other", "PutObject") in calls
+    assert {storage_name for storage_name, operation in calls if operation != "GetObject"} == {"other"}
+
+    copy = boto3.client("s3", region_name="us-east-1").get_object(Bucket=BUCKET, Key="ws/other/copy.csv")
+    assert copy["Body"].read() == b"a,b\n"
+    assert copy["ContentType"] == "text/csv"
+
+
+def test_part_timings_are_numbered_from_the_requests(adaptor, tmp_path):
+    adaptor.transfer_config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB)
+    src = tmp_path / "data.bin"
+    src.write_bytes(os.urandom(11 * MB))
+
+    upload_metrics = TransferMetrics()
+    adaptor.post_workspace_storage_object("ws", "st", str(src), "data.bin", metrics=upload_metrics)
+    assert sorted(part.part_number for part in upload_metrics.transfers[0].parts) == [1, 2, 3]
+
+    # Ranges follow the uploaded parts, whatever the configured chunk size
+    adaptor.transfer_config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=8 * MB)
+    download_metrics = TransferMetrics()
+    adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(tmp_path / "copy.bin"), metrics=download_metrics)
+    assert sorted(part.part_number for part in download_metrics.transfers[0].parts) == [1, 2, 3]
+    assert (tmp_path / "copy.bin").read_bytes() == src.read_bytes()
+
+
+def test_concurrent_transfers_of_a_key_keep_their_own_timings(adaptor, tmp_path):
+    adaptor.transfer_config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB)
+    large, small = tmp_path / "large.bin", tmp_path / "small.bin"
+    large.write_bytes(os.urandom(11 * MB))
+    small.write_bytes(os.urandom(MB))
+
+    large_metrics, small_metrics = TransferMetrics(), TransferMetrics()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        uploads = [
+            executor.submit(adaptor.post_workspace_storage_object, "ws", "st", str(src), "data.bin", metrics=metrics)
+            for src, metrics in ((large, large_metrics), (small, small_metrics))
+        ]
+        for upload in uploads:
+            upload.result()
+
+    assert sorted(part.part_number for part in large_metrics.transfers[0].parts) == [1, 2, 3]
+    assert [part.part_number for part in small_metrics.transfers[0].parts] == [1]
+    assert large_metrics.transferred_bytes == 11 * MB
+    assert small_metrics.transferred_bytes == MB
+
+
+def test_listing_follows_the_pages(adaptor):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    keys = ["a.txt", "b.txt", "c.txt", "dir1/x.txt", "dir1/y.txt", "dir2/z.txt", "dir3/sub/w.txt"]
+    for key in keys:
+        s3.put_object(Bucket=BUCKET, Key=f"ws/st/{key}", Body=b"x")
+    s3.put_object(Bucket=BUCKET, Key="ws/other/a.txt", Body=b"x")
+    pages = []
+    s3_client(adaptor, "st").meta.events.register("before-call.s3.ListObjectsV2", lambda **kwargs: pages.append(1))
+
+    entries = list(adaptor.list_workspace_storage_object("ws", "st", "", page_size=2))
+    assert len(pages) > 1
+    assert sorted((entry["type"], entry["key"]) for entry in entries) == [
+        ("directory", "dir1/"), ("directory", "dir2/"), ("directory", "dir3/"),
+        ("file", "a.txt"), ("file", "b.txt"), ("file", "c.txt"),
+    ]
+
+    pages.clear()
+    entries = list(adaptor.list_workspace_storage_object("ws", "st", "", delimiter=None, page_size=2))
+    assert len(pages) == 4
+    assert [entry["key"] for entry in entries] == keys
+    assert entries[-1]["prefix"] == "dir3/sub/" and entries[-1]["name"] == "w.txt"
+
+
+def interrupt_upload_after(adaptor, parts: int):
+    # Fails the upload of the part following the first `parts` ones
+    adaptor.transfer_config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=1)
+    uploaded = []
+
+    def upload_part(params, **kwargs):
+        if len(uploaded) == parts:
+            raise ConnectionError("connection lost")
+        uploaded.append(params["PartNumber"])
+
+    s3_client(adaptor, "st").meta.events.register("before-parameter-build.s3.UploadPart", upload_part)
+    return uploaded
+
+
+def test_interrupted_multipart_uploads_resume(adaptor, tmp_path):
+    src = tmp_path / "data.bin"
+    src.write_bytes(os.urandom(16 * MB))
+    uploaded = interrupt_upload_after(adaptor, 2)
+
+    with pytest.raises(Exception, match="connection lost"):
+        adaptor.post_workspace_storage_object("ws", "st", str(src), "data.bin")
+    upload = adaptor.upload_journal.load(BUCKET, "ws/st/data.bin")
+    assert sorted(upload["parts"]) == [1, 2]
+
+    # Only the missing parts are sent, to the same upload
+    uploaded.clear()
+    s3_client(adaptor, "st").meta.events.register("before-call.s3.CreateMultipartUpload", lambda **kwargs: pytest.fail("new upload"))
+    assert adaptor.post_workspace_storage_object("ws", "st", str(src), "data.bin", resume=True)["skipped"] is False
+    assert uploaded == [3, 4]
+
+    s3 = boto3.client("s3", region_name="us-east-1")
+    assert s3.get_object(Bucket=BUCKET, Key="ws/st/data.bin")["Body"].read() == src.read_bytes()
+    assert adaptor.upload_journal.load(BUCKET, "ws/st/data.bin") is None
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+
+
+def test_abandoned_uploads_are_cleaned_up(adaptor, tmp_path):
+    src = tmp_path / "data.bin"
+    src.write_bytes(os.urandom(11 * MB))
+    interrupt_upload_after(adaptor, 1)
+    with pytest.raises(Exception, match="connection lost"):
+        adaptor.post_workspace_storage_object("ws", "st", str(src), "data.bin")
+    s3 = boto3.client("s3", region_name="us-east-1")
+    upload_id = s3.list_multipart_uploads(Bucket=BUCKET)["Uploads"][0]["UploadId"]
+
+    abandoned = adaptor.cleanup_workspace_storage_uploads("ws", "st", older_than=-60, dry_run=True)
+    assert [(upload["key"], upload["upload_id"]) for upload in abandoned] == [("data.bin", upload_id)]
+    assert len(s3.list_multipart_uploads(Bucket=BUCKET)["Uploads"]) == 1
+    assert adaptor.upload_journal.load(BUCKET, "ws/st/data.bin") is not None
+
+    assert adaptor.cleanup_workspace_storage_uploads("ws", "st", older_than=-60) == abandoned
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert adaptor.upload_journal.load(BUCKET, "ws/st/data.bin") is None
+
+
+def interrupt_download_after(adaptor, ranges: int):
+    # Fails the download of the range following the first `ranges` ones
+    adaptor.transfer_config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=1)
+    downloaded = []
+
+    def get_object(params, **kwargs):
+        if len(downloaded) == ranges:
+            raise ConnectionError("connection lost")
+        downloaded.append(params["Range"])
+
+    s3_client(adaptor, "st").meta.events.register("before-parameter-build.s3.GetObject", get_object)
+    return downloaded
+
+
+@pytest.fixture
+def uploaded(adaptor, tmp_path):
+    # A 4 parts object, downloaded in ranges following its parts
+    adaptor.transfer_config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB)
+    src = tmp_path / "data.bin"
+    src.write_bytes(os.urandom(16 * MB))
+    adaptor.post_workspace_storage_object("ws", "st", str(src), "data.bin")
+    return src.read_bytes()
+
+
+def test_interrupted_downloads_resume(adaptor, uploaded, tmp_path):
+    dst = tmp_path / "copy.bin"
+    downloaded = interrupt_download_after(adaptor, 2)
+
+    with pytest.raises(Exception, match="connection lost"):
+        adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(dst))
+    assert not dst.exists()
+    state = [json.loads(line) for line in (tmp_path / "copy.bin.part.json").read_text().splitlines()]
+    assert sorted(entry["chunk"] for entry in state[1:]) == [0, 1]
+
+    # Only the missing ranges are requested
+    downloaded.clear()
+    adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(dst))
+    assert downloaded == [f"bytes={10 * MB}-{15 * MB - 1}", f"bytes={15 * MB}-{16 * MB - 1}"]
+    assert dst.read_bytes() == uploaded
+    assert sorted(path.name for path in tmp_path.iterdir() if path.name.startswith("copy")) == ["copy.bin"]
+
+
+def test_downloads_restart_when_the_object_changed(adaptor, uploaded, tmp_path):
+    dst = tmp_path / "copy.bin"
+    downloaded = interrupt_download_after(adaptor, 2)
+    with pytest.raises(Exception, match="connection lost"):
+        adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(dst))
+
+    replacement = os.urandom(MB)
+    boto3.client("s3", region_name="us-east-1").put_object(Bucket=BUCKET, Key="ws/st/data.bin", Body=replacement)
+    downloaded.clear()
+    adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(dst))
+    assert downloaded == [f"bytes=0-{MB - 1}"]
+    assert dst.read_bytes() == replacement
+
+
+def test_downloads_fail_when_the_object_changes_meanwhile(adaptor, uploaded, tmp_path):
+    dst = tmp_path / "copy.bin"
+    adaptor.transfer_config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB, max_concurrency=1)
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3_client(adaptor, "st").meta.events.register(
+        "before-parameter-build.s3.GetObject",
+        lambda params, **kwargs: params["Range"].startswith(f"bytes={5 * MB}-") and s3.put_object(Bucket=BUCKET, Key="ws/st/data.bin", Body=b"new"),
+    )
+
+    with pytest.raises(Exception, match="changed during the download"):
+        adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(dst))
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith("copy")] == []
+
+
+def test_downloads_failing_the_checksum_are_discarded(adaptor, uploaded, tmp_path):
+    dst = tmp_path / "copy.bin"
+    downloaded = interrupt_download_after(adaptor, 2)
+    with pytest.raises(Exception, match="connection lost"):
+        adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(dst))
+
+    downloaded.clear()
+    # The digest of a completed range no longer matches its bytes
+    state_file = tmp_path / "copy.bin.part.json"
+    lines = state_file.read_text().splitlines()
+    lines[1] = json.dumps(dict(json.loads(lines[1]), sha256="0" * 64))
+    state_file.write_text("\n".join(lines) + "\n")
+    with pytest.raises(Exception, match="integrity check"):
+        adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(dst))
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith("copy")] == []
+
+
+def test_small_multipart_objects_pass_the_checksum(adaptor, tmp_path):
+    # Below the multipart threshold, as written part by part by the fsspec filesystem
+    parts = [os.urandom(5 * MB), os.urandom(MB)]
+    upload_id = adaptor.create_workspace_storage_upload("ws", "st", "data.bin")
+    uploaded = [adaptor.upload_workspace_storage_part("ws", "st", "data.bin", upload_id, number, data) for number, data in enumerate(parts, start=1)]
+    adaptor.complete_workspace_storage_upload("ws", "st", "data.bin", upload_id, uploaded)
+
+    dst = tmp_path / "copy.bin"
+    adaptor.get_workspace_storage_object("ws", "st", "data.bin", str(dst))
+    assert dst.read_bytes() == b"".join(parts)
@@ -0,0 +1,25 @@
+from naas_python.domains.storage.models import TransferMetrics
+
+
+def test_transfer_metrics_aggregates_transfers():
+    updates = []
+    metrics = TransferMetrics(on_progress=lambda stats: updates.append(stats.transferred_bytes))
+
+    first = metrics.start_transfer("ws/st/a.csv", "upload", total_bytes=10)
+    second = metrics.start_transfer("ws/st/b.csv", "upload", total_bytes=5)
+    metrics.add_bytes(first, 4)
+    metrics.add_bytes(first, 6)
+    metrics.add_bytes(second, 5)
+    metrics.add_part(first, 1, 0.5, retries=2)
+    metrics.finish_transfer(first)
+    metrics.finish_transfer(second)
+
+    assert first.done and second.done
+    assert first.raw["parts"] == [{"part_number": 1, "seconds": 0.5, "retries": 2}]
+    assert updates == [0, 0, 4, 10, 5, 10, 5]
+
+    summary = metrics.summary()
+    assert summary["transfers"] == 2
+    assert summary["transferred_bytes"] == 15
+    assert summary["retries"] == 2
+    assert summary["bytes_per_second"] == 15 / summary["seconds"]
@@ -0,0 +1,25 @@
+from naas_python.domains.storage.adaptors.secondary.providers.upload_journal import (
+    UploadJournal,
+)
+
+
+def test_journal_survives_torn_lines(tmp_path):
+    src_file = tmp_path / "data.bin"
+    src_file.write_bytes(b"x" * 10)
+    journal = UploadJournal(journal_dir=str(tmp_path / "journal"))
+
+    journal.start("bucket", "ws/st/data.bin", "upload-1", 5, UploadJournal.fingerprint(str(src_file)))
+    journal.add_part("bucket", "ws/st/data.bin", 2, '"etag-2"')
+    # A crash in the middle of a write leaves an incomplete last line
+    (journal_file,) = (tmp_path / "journal").iterdir()
+    with open(journal_file, "a") as f:
+        f.write('{"part_number": 1, "et')
+
+    upload = journal.load("bucket", "ws/st/data.bin")
+    assert upload["upload_id"] == "upload-1"
+    assert upload["fingerprint"]["size"] == 10
+    assert upload["parts"] == {2: '"etag-2"'}
+    assert [upload["key"] for upload in journal.uploads()] == ["ws/st/data.bin"]
+
+    journal.remove("bucket", "ws/st/data.bin")
+    assert journal.load("bucket", "ws/st/data.bin") is None